@@ -1,7 +1,21 @@
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
 from players.models import Player, PlayerStats, OpeningStat
-from games.models import Game
-from collections import defaultdict
+from games.models import Game, PGNBlob
+from games.moves import encode_game_moves, store_game_moves
+from games.positions import index_game_positions, max_indexed_ply
+from players.eco import default_eco_table
+from players.pgn_parser import parse_game_pgn, UNKNOWN_OPENING
+from players.leaderboard import apply_leaderboard_delta, rebuild_leaderboard_entries
+from players.history import apply_history_delta, rebuild_history
+from players.repertoire import apply_repertoire_delta, max_repertoire_ply
+from players.cache import invalidate_player
+from utils.data_helpers import get_player_game_aggregates, WON_Q, DRAW_Q
+from .snapshot import append_games_to_snapshot, rebuild_player_snapshot
+from collections import Counter, defaultdict
+from itertools import islice
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,222 +23,490 @@ logger = logging.getLogger(__name__)
 class GameDataProcessor:
     """معالج بيانات المباريات وتحديث الإحصاءات"""
     
-    def __init__(self):
+    # عدد المباريات في كل عملية bulk_create
+    BULK_CHUNK_SIZE = 500
+    
+    def __init__(self, headers_only: bool = False):
+        # headers_only: قراءة رؤوس PGN فقط دون إعادة تشغيل النقلات على الرقعة
+        self.headers_only = headers_only
         self.opening_stats = defaultdict(lambda: {'games': 0, 'wins': 0, 'losses': 0, 'draws': 0})
     
-    def process_games_batch(self, player: Player, games_data: List[Dict]) -> Dict:
-        """معالجة مجموعة من المباريات وتحديث الإحصاءات"""
+    def process_games_batch(self, player: Player, games_data: List[Dict], bulk: bool = True,
+                            incremental: bool = True) -> Dict:
+        """
+        معالجة مجموعة من المباريات وتحديث الإحصاءات
+        
+        bulk=True: إدراج جماعي مع فحص التكرار في الذاكرة (الوضع الافتراضي)
+        bulk=False: معالجة كل مباراة على حدة باستعلامين لكل مباراة
+        incremental=True: تطبيق المباريات الجديدة فقط كفروقات على الإحصاءات
+        incremental=False: إعادة حساب كل الإحصاءات من جميع مباريات اللاعب
+        """
+        return self.process_games_stream(player, games_data, bulk=bulk, incremental=incremental)
+    
+    def process_games_stream(self, player: Player, games: Iterable[Dict], chunk_size: Optional[int] = None,
+                             bulk: bool = True, incremental: bool = True,
+                             on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        استهلاك المباريات من أي مُكرِّر (مثل مولّد الأرشيف الشهري) على دفعات محدودة
+        حتى تبقى الذاكرة ثابتة مهما كان عدد المباريات
+        
+        on_progress: يُستدعى بعد كل دفعة بالأعداد التراكمية (total, processed, skipped)
+        """
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        use_deltas = incremental and self._stats_are_initialized(player)
+        
+        total_count = 0
         processed_count = 0
         skipped_count = 0
         new_openings = 0
         
+        games = iter(games)
+        while True:
+            chunk = list(islice(games, chunk_size))
+            if not chunk:
+                break
+            
+            if bulk:
+                new_games, chunk_skipped = self._bulk_insert_games(player, chunk)
+            else:
+                new_games, chunk_skipped = self._insert_games_one_by_one(player, chunk)
+            
+            total_count += len(chunk)
+            processed_count += len(new_games)
+            skipped_count += chunk_skipped
+            
+            if use_deltas:
+                new_openings += self.apply_stats_delta(player, new_games)
+            
+            if on_progress:
+                on_progress({
+                    'total': total_count,
+                    'processed': processed_count,
+                    'skipped': skipped_count
+                })
+        
+        if not use_deltas:
+            new_openings = self.rebuild_player_stats(player)
+        
+        return {
+            'total': total_count,
+            'processed': processed_count,
+            'skipped': skipped_count,
+            'new_openings': new_openings,
+            'success': processed_count > 0
+        }
+    
+    def _insert_games_one_by_one(self, player: Player, games_data: List[Dict]) -> Tuple[List[Game], int]:
+        """المسار القديم: استعلام exists() ثم create() لكل مباراة"""
+        new_games = []
+        skipped_count = 0
+        
         for game_data in games_data:
             try:
-                success = self._process_single_game(player, game_data)
-                if success:
-                    processed_count += 1
+                game = self._process_single_game(player, game_data)
+                if game:
+                    new_games.append(game)
                 else:
                     skipped_count += 1
             except Exception as e:
                 logger.error(f"خطأ في معالجة مباراة للاعب {player.username}: {e}")
                 skipped_count += 1
         
-        # تحديث إحصاءات الافتتاحات
-        new_openings = self._update_opening_stats(player)
+        return new_games, skipped_count
+    
+    def _bulk_insert_games(self, player: Player, games_data: List[Dict]) -> Tuple[List[Game], int]:
+        """إدراج المباريات الجديدة بـ bulk_create بعد فحص التكرار في الذاكرة"""
+        skipped_count = 0
+        candidates = []
+        
+        for game_data in games_data:
+            try:
+                game = self._build_game(player, game_data)
+            except Exception as e:
+                logger.error(f"خطأ في معالجة مباراة للاعب {player.username}: {e}")
+                game = None
+            
+            if game is None:
+                skipped_count += 1
+            else:
+                candidates.append(game)
+        
+        if not candidates:
+            return [], skipped_count
         
-        # تحديث الإحصاءات العامة
-        self._update_player_stats(player)
+        # مفاتيح unique_together الموجودة مسبقاً في نطاق تواريخ الدفعة (استعلام واحد)
+        existing_keys = self._load_existing_keys(
+            player,
+            min(game.date_played for game in candidates),
+            max(game.date_played for game in candidates)
+        )
         
-        return {
-            'processed': processed_count,
-            'skipped': skipped_count,
-            'new_openings': new_openings,
-            'success': processed_count > 0
-        }
+        new_games = []
+        for game in candidates:
+            key = (game.opponent_name, game.date_played, game.time_control)
+            if key in existing_keys:
+                skipped_count += 1
+                continue
+            # منع التكرار داخل الدفعة نفسها أيضاً
+            existing_keys.add(key)
+            new_games.append(game)
+        
+        inserted = []
+        with transaction.atomic():
+            for start in range(0, len(new_games), self.BULK_CHUNK_SIZE):
+                chunk = new_games[start:start + self.BULK_CHUNK_SIZE]
+                PGNBlob.store_for(chunk)
+                chunk_inserted = self._insert_chunk(player, chunk)
+                skipped_count += len(chunk) - len(chunk_inserted)
+                self._store_game_details(player, chunk_inserted)
+                inserted.extend(chunk_inserted)
+        
+        return inserted, skipped_count
     
-    def _process_single_game(self, player: Player, game_data: Dict) -> bool:
-        """معالجة مباراة واحدة"""
+    def _insert_chunk(self, player: Player, games: List[Game]) -> List[Game]:
+        """
+        إدراج دفعة بـ bulk_create، وإرجاع المباريات التي أُدرجت فعلاً فقط. إن سبق إدراجٌ
+        متزامن (أشهر الأرشيف المتوازية) إلى بعض المفاتيح بعد فحص التكرار، تُعاد الدفعة
+        مباراة مباراة ويُتخطى ما أُدرج قبلنا حتى لا يدخل في الفروقات مرتين
+        """
         try:
-            # التحقق من البيانات الأساسية
-            if not game_data or 'pgn' not in game_data:
-                return False
-            
-            pgn_content = game_data['pgn']
-            if not pgn_content:
-                return False
-            
-            # استخراج معلومات المباراة
-            game_info = self._extract_game_info(pgn_content, player.username)
-            if not game_info:
-                return False
+            with transaction.atomic():
+                return Game.objects.bulk_create(games)
+        except IntegrityError:
+            logger.warning(f"تعارض مع إدراج متزامن لمباريات {player.username}، الإدراج مباراة مباراة")
+        
+        inserted = []
+        for game in games:
+            try:
+                with transaction.atomic():
+                    Game.objects.bulk_create([game])
+            except IntegrityError:
+                continue
+            inserted.append(game)
+        return inserted
+    
+    def _load_existing_keys(self, player: Player, date_from, date_to) -> set:
+        """تحميل مفاتيح (الخصم، التاريخ، زمن التحكم) للمباريات المخزنة"""
+        return set(
+            Game.objects.filter(
+                player=player,
+                date_played__range=(date_from, date_to)
+            ).values_list('opponent_name', 'date_played', 'time_control')
+        )
+    
+    def _build_game(self, player: Player, game_data: Dict) -> Optional[Game]:
+        """بناء كائن مباراة (غير محفوظ) من بيانات Chess.com"""
+        # التحقق من البيانات الأساسية
+        if not game_data or 'pgn' not in game_data:
+            return None
+        
+        pgn_content = game_data['pgn']
+        if not pgn_content:
+            return None
+        
+        # استخراج معلومات المباراة
+        game_info = self._extract_game_info(pgn_content, player.username)
+        if not game_info:
+            return None
+        
+        game = Game(
+            player=player,
+            opponent_name=game_info['opponent'],
+            opponent_rating=game_data.get('opponent_rating') or game_info.get('opponent_rating'),
+            player_rating=game_info.get('player_rating'),
+            pgn_content=pgn_content,
+            result=game_info['result'],
+            date_played=game_info['date'],
+            end_time=game_data.get('end_time'),
+            time_control=game_info['time_control'],
+            player_color=game_info['player_color'],
+            opening_name=game_info.get('opening_name', ''),
+            opening_eco=game_info.get('opening_eco', ''),
+            moves_count=game_info.get('moves_count', 0),
+            game_url=game_data.get('url', '')
+        )
+        # بيانات النقلات لفهرس الوضعيات وشجرة الذخيرة والنقلات المرمزة، تُكتب بعد إدراج المباراة
+        game._positions = game_info.get('positions')
+        game._line = game_info.get('line')
+        game._moves = encode_game_moves(game_info)
+        return game
+    
+    def _store_game_details(self, player: Player, games: List[Game]):
+        """كتابة ما يُشتق من نقلات المباريات المدرجة للتو (داخل معاملة الإدراج نفسها)"""
+        index_game_positions(player, games)
+        apply_repertoire_delta(player, games)
+        store_game_moves(player, games)
+    
+    def _process_single_game(self, player: Player, game_data: Dict) -> Optional[Game]:
+        """معالجة مباراة واحدة وإرجاع المباراة المُنشأة"""
+        try:
+            game = self._build_game(player, game_data)
+            if game is None:
+                return None
             
             # التحقق من عدم تكرار المباراة
             exists = Game.objects.filter(
                 player=player,
-                opponent_name=game_info['opponent'],
-                date_played=game_info['date'],
-                time_control=game_info['time_control']
+                opponent_name=game.opponent_name,
+                date_played=game.date_played,
+                time_control=game.time_control
             ).exists()
             
             if exists:
-                return False
+                return None
             
             # إنشاء سجل المباراة
-            Game.objects.create(
-                player=player,
-                opponent_name=game_info['opponent'],
-                opponent_rating=game_data.get('opponent_rating'),
-                pgn_content=pgn_content,
-                result=game_info['result'],
-                date_played=game_info['date'],
-                time_control=game_info['time_control'],
-                player_color=game_info['player_color'],
-                opening_name=game_info.get('opening_name', ''),
-                opening_eco=game_info.get('opening_eco', ''),
-                moves_count=game_info.get('moves_count', 0),
-                game_url=game_data.get('url', '')
-            )
+            with transaction.atomic():
+                game.save()
+                self._store_game_details(player, [game])
             
-            return True
+            return game
             
         except Exception as e:
             logger.error(f"خطأ في معالجة مباراة واحدة: {e}")
-            return False
+            return None
     
     def _extract_game_info(self, pgn_content: str, username: str):
-        """استخراج معلومات المباراة من PGN"""
-        from players.chess_api import ChessComAPI
-        
-        api = ChessComAPI()
-        game_info = api.parse_pgn_info(pgn_content, username)
+        """استخراج معلومات المباراة من PGN في مرور واحد (الرؤوس، النقلات والافتتاح)"""
+        return parse_game_pgn(
+            pgn_content, username, headers_only=self.headers_only,
+            position_plies=0 if self.headers_only else max_indexed_ply(),
+            line_plies=0 if self.headers_only else max_repertoire_ply(),
+            eco_table=None if self.headers_only else default_eco_table(),
+            record_moves=not self.headers_only
+        )
+    
+    def ensure_stats_initialized(self, player: Player):
+        """بناء الإحصاءات كاملة مرة واحدة إن لم تُبنَ بعد، حتى تكفي الفروقات بعدها"""
+        if not self._stats_are_initialized(player):
+            self.rebuild_player_stats(player)
+    
+    def _stats_are_initialized(self, player: Player) -> bool:
+        """هل سبق بناء الإحصاءات من المباريات؟ (وإلا فالفروقات وحدها غير كافية)"""
+        return PlayerStats.objects.filter(player=player, last_analysis__isnull=False).exists()
+    
+    # ------------------------------------------------------------------
+    # التحديث التدريجي: تطبيق المباريات الجديدة فقط كفروقات ذرية F()
+    # ------------------------------------------------------------------
+    
+    def apply_stats_delta(self, player: Player, new_games: Iterable[Game]) -> int:
+        """تطبيق المباريات المدرجة حديثاً على OpeningStat و PlayerStats، وإرجاع عدد الافتتاحات الجديدة"""
+        new_games = list(new_games)
+        if not new_games:
+            return 0
         
-        if game_info:
-            # إضافة معلومات الافتتاح
-            opening_name, eco_code = api.extract_opening_name(pgn_content)
-            game_info['opening_name'] = opening_name
-            game_info['opening_eco'] = eco_code
+        with transaction.atomic():
+            new_openings = self._apply_opening_deltas(player, new_games)
+            self._apply_player_stats_delta(player, new_games)
+            apply_leaderboard_delta(player, new_games)
+            apply_history_delta(player, new_games)
+            append_games_to_snapshot(player, new_games)
+            invalidate_player(player.username)
         
-        return game_info
+        return new_openings
     
-    def _update_opening_stats(self, player: Player) -> int:
-        """تحديث إحصاءات الافتتاحات"""
-        games = Game.objects.filter(player=player)
-        opening_stats = defaultdict(lambda: {
-            'games': 0, 'wins': 0, 'losses': 0, 'draws': 0, 
-            'as_white': 0, 'as_black': 0
-        })
+    def _apply_opening_deltas(self, player: Player, new_games: List[Game]) -> int:
+        """تحديث إحصاءات الافتتاحات بفروقات المباريات الجديدة"""
+        deltas = defaultdict(Counter)
         
-        # حساب الإحصاءات من المباريات
-        for game in games:
-            if not game.opening_name or game.opening_name == 'غير معروف':
+        for game in new_games:
+            if not game.opening_name or game.opening_name == UNKNOWN_OPENING:
                 continue
             
-            key = (game.opening_name, game.opening_eco)
-            stats = opening_stats[key]
-            
-            stats['games'] += 1
-            
-            # تحديد اللون
-            if game.player_color == 'white':
-                stats['as_white'] += 1
-            else:
-                stats['as_black'] += 1
-            
-            # تحديد النتيجة
-            if game.player_won:
-                stats['wins'] += 1
-            elif game.is_draw:
-                stats['draws'] += 1
-            else:
-                stats['losses'] += 1
+            delta = deltas[(game.opening_name, game.opening_eco)]
+            delta['games_played'] += 1
+            delta['white_games' if game.player_color == 'white' else 'black_games'] += 1
+            delta[self._result_field(game)] += 1
         
-        # تحديث قاعدة البيانات
         new_openings_count = 0
-        for (opening_name, eco_code), stats in opening_stats.items():
-            # تحديد اللون الغالب
-            if stats['as_white'] > stats['as_black']:
-                color_played = 'white'
-            elif stats['as_black'] > stats['as_white']:
-                color_played = 'black'
-            else:
-                color_played = 'both'
+        for (opening_name, eco_code), delta in deltas.items():
+            if self._increment_opening_stat(player, opening_name, eco_code, delta):
+                continue
             
-            opening_stat, created = OpeningStat.objects.get_or_create(
+            try:
+                with transaction.atomic():
+                    OpeningStat.objects.create(
+                        player=player,
+                        opening_name=opening_name,
+                        eco_code=eco_code,
+                        color_played=self._dominant_color(delta['white_games'], delta['black_games']),
+                        **delta
+                    )
+                new_openings_count += 1
+            except IntegrityError:
+                # أُنشئ السجل بالتوازي من عملية أخرى: نطبّق الفرق عليه
+                self._increment_opening_stat(player, opening_name, eco_code, delta)
+        
+        return new_openings_count
+    
+    def _increment_opening_stat(self, player: Player, opening_name: str, eco_code: str,
+                                delta: Counter) -> bool:
+        """زيادة عدادات افتتاح موجود ذرياً، وإرجاع False إن لم يكن موجوداً"""
+        updated = OpeningStat.objects.filter(
+            player=player,
+            opening_name=opening_name,
+            eco_code=eco_code
+        ).update(
+            games_played=F('games_played') + delta['games_played'],
+            wins=F('wins') + delta['wins'],
+            losses=F('losses') + delta['losses'],
+            draws=F('draws') + delta['draws'],
+            white_games=F('white_games') + delta['white_games'],
+            black_games=F('black_games') + delta['black_games'],
+            color_played=self._dominant_color_expression(delta)
+        )
+        return updated > 0
+    
+    @staticmethod
+    def _dominant_color_expression(delta: Counter):
+        """تعبير SQL يحدد اللون الغالب بعد تطبيق الفرق"""
+        diff = delta['white_games'] - delta['black_games']
+        return Case(
+            When(white_games__gt=F('black_games') - diff, then=Value('white')),
+            When(white_games__lt=F('black_games') - diff, then=Value('black')),
+            default=Value('both')
+        )
+    
+    def _apply_player_stats_delta(self, player: Player, new_games: List[Game]):
+        """تحديث إحصاءات اللاعب العامة بفروقات المباريات الجديدة"""
+        delta = Counter()
+        for game in new_games:
+            delta[self._result_field(game)] += 1
+            if game.moves_count > 0:
+                delta['total_moves'] += game.moves_count
+                delta['games_with_moves'] += 1
+        
+        if new_games:
+            PlayerStats.objects.filter(player=player).update(
+                total_games=F('total_games') + len(new_games),
+                wins=F('wins') + delta['wins'],
+                losses=F('losses') + delta['losses'],
+                draws=F('draws') + delta['draws'],
+                total_moves=F('total_moves') + delta['total_moves'],
+                games_with_moves=F('games_with_moves') + delta['games_with_moves']
+            )
+        
+        self._refresh_player_summary(player)
+    
+    # ------------------------------------------------------------------
+    # إعادة البناء الكاملة (للإصلاح أو عند عدم وجود إحصاءات سابقة)
+    # ------------------------------------------------------------------
+    
+    def rebuild_player_stats(self, player: Player, opening_rows: Optional[List[Dict]] = None,
+                             totals: Optional[Dict] = None) -> int:
+        """
+        إعادة حساب إحصاءات الافتتاحات واللاعب من جميع المباريات
+        
+        opening_rows / totals: نتائج aggregate_openings و get_player_game_aggregates
+        (أو snapshot_aggregates) إن حُسبت مسبقاً، حتى لا يُعاد التجميع
+        """
+        if opening_rows is None:
+            opening_rows = self.aggregate_openings(player)
+        if totals is None:
+            totals = get_player_game_aggregates(player)
+        
+        with transaction.atomic():
+            new_openings = self.save_opening_rows(player, opening_rows)
+            self.save_player_totals(player, totals)
+            rebuild_leaderboard_entries(player)
+            rebuild_history(player)
+            rebuild_player_snapshot(player)
+            invalidate_player(player.username)
+        return new_openings
+    
+    def aggregate_openings(self, player: Player) -> List[Dict]:
+        """تجميع مباريات اللاعب حسب الافتتاح في استعلام واحد"""
+        return list(Game.objects.filter(
+            player=player
+        ).exclude(
+            opening_name__in=['', UNKNOWN_OPENING]
+        ).values('opening_name', 'opening_eco').annotate(
+            games=Count('id'),
+            wins=Count('id', filter=WON_Q),
+            draws=Count('id', filter=DRAW_Q),
+            as_white=Count('id', filter=Q(player_color='white')),
+            as_black=Count('id', filter=Q(player_color='black'))
+        ))
+    
+    def save_opening_rows(self, player: Player, rows: List[Dict]) -> int:
+        """
+        كتابة صفوف الافتتاحات المجمّعة (كل افتتاحات اللاعب) وحذف ما لم يعد له مباريات،
+        وإرجاع عدد الافتتاحات الجديدة
+        """
+        new_openings_count = 0
+        kept_ids = []
+        for row in rows:
+            opening_stat, created = OpeningStat.objects.update_or_create(
                 player=player,
-                opening_name=opening_name,
-                eco_code=eco_code,
+                opening_name=row['opening_name'],
+                eco_code=row['opening_eco'],
                 defaults={
-                    'games_played': stats['games'],
-                    'wins': stats['wins'],
-                    'losses': stats['losses'],
-                    'draws': stats['draws'],
-                    'color_played': color_played
+                    'games_played': row['games'],
+                    'wins': row['wins'],
+                    'losses': row['games'] - row['wins'] - row['draws'],
+                    'draws': row['draws'],
+                    'white_games': row['as_white'],
+                    'black_games': row['as_black'],
+                    'color_played': self._dominant_color(row['as_white'], row['as_black'])
                 }
             )
-            
-            if not created:
-                # تحديث الإحصاءات الموجودة
-                opening_stat.games_played = stats['games']
-                opening_stat.wins = stats['wins']
-                opening_stat.losses = stats['losses']
-                opening_stat.draws = stats['draws']
-                opening_stat.color_played = color_played
-                opening_stat.save()
-            else:
+            kept_ids.append(opening_stat.pk)
+            if created:
                 new_openings_count += 1
         
+        OpeningStat.objects.filter(player=player).exclude(pk__in=kept_ids).delete()
         return new_openings_count
     
-    def _update_player_stats(self, player: Player):
-        """تحديث إحصاءات اللاعب العامة"""
-        games = Game.objects.filter(player=player)
-        total_games = games.count()
-        
-        if total_games == 0:
-            return
+    def save_player_totals(self, player: Player, totals: Dict):
+        """كتابة أرقام get_player_game_aggregates في PlayerStats مع الملخص"""
+        PlayerStats.objects.update_or_create(
+            player=player,
+            defaults={
+                'total_games': totals['total_games'],
+                'wins': totals['wins'],
+                'losses': totals['losses'],
+                'draws': totals['draws'],
+                'total_moves': totals['total_moves'],
+                'games_with_moves': totals['games_with_moves']
+            }
+        )
         
-        wins = sum(1 for game in games if game.player_won)
-        draws = sum(1 for game in games if game.is_draw)
-        losses = total_games - wins - draws
+        self._refresh_player_summary(player)
+    
+    def _refresh_player_summary(self, player: Player):
+        """تحديث الافتتاح المفضل وأضعف دفاع ومتوسط طول المباراة"""
+        openings = OpeningStat.objects.filter(player=player)
         
         # البحث عن الافتتاح المفضل
-        favorite_opening = OpeningStat.objects.filter(
-            player=player
-        ).order_by('-games_played').first()
+        favorite_opening = openings.order_by('-games_played').only('opening_name').first()
         
         # البحث عن أضعف دفاع
-        weakest_defense = OpeningStat.objects.filter(
-            player=player,
-            games_played__gte=3
-        ).order_by('win_rate').first()
+        weakest_defense = openings.filter(games_played__gte=3).order_by('win_rate').only('opening_name').first()
         
-        # متوسط طول المباراة
-        total_moves = sum(game.moves_count for game in games if game.moves_count > 0)
-        games_with_moves = games.filter(moves_count__gt=0).count()
-        avg_length = total_moves // games_with_moves if games_with_moves > 0 else 0
-        
-        # تحديث الإحصاءات
-        stats, created = PlayerStats.objects.get_or_create(
-            player=player,
-            defaults={
-                'total_games': total_games,
-                'wins': wins,
-                'losses': losses,
-                'draws': draws,
-                'favorite_opening': favorite_opening.opening_name if favorite_opening else '',
-                'weakest_defense': weakest_defense.opening_name if weakest_defense else '',
-                'average_game_length': avg_length,
-                'last_analysis': datetime.now()
-            }
+        PlayerStats.objects.filter(player=player).update(
+            favorite_opening=favorite_opening.opening_name if favorite_opening else '',
+            weakest_defense=weakest_defense.opening_name if weakest_defense else '',
+            average_game_length=Case(
+                When(games_with_moves__gt=0, then=F('total_moves') / F('games_with_moves')),
+                default=Value(0)
+            ),
+            last_analysis=timezone.now()
         )
-        
-        if not created:
-            stats.total_games = total_games
-            stats.wins = wins
-            stats.losses = losses
-            stats.draws = draws
-            stats.favorite_opening = favorite_opening.opening_name if favorite_opening else ''
-            stats.weakest_defense = weakest_defense.opening_name if weakest_defense else ''
-            stats.average_game_length = avg_length
-            stats.last_analysis = datetime.now()
-            stats.save()
+    
+    @staticmethod
+    def _result_field(game: Game) -> str:
+        """اسم عداد النتيجة المناسب للمباراة"""
+        if game.player_won:
+            return 'wins'
+        if game.is_draw:
+            return 'draws'
+        return 'losses'
+    
+    @staticmethod
+    def _dominant_color(as_white: int, as_black: int) -> str:
+        """تحديد اللون الغالب"""
+        if as_white > as_black:
+            return 'white'
+        if as_black > as_white:
+            return 'black'
+        return 'both'
@@ -0,0 +1,206 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from django.utils import timezone
+from players.models import Player, PlayerSyncState
+from players.chess_api import ArchiveResult, ChessComAPI
+from players.http_cache import archive_month
+from players.cache import invalidate_player
+from .data_processor import GameDataProcessor
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _month_key(value: str) -> Optional[tuple]:
+    """'2024/05' -> (2024, 5)"""
+    try:
+        year, month = value.split('/')
+        return int(year), int(month)
+    except (AttributeError, ValueError):
+        return None
+
+def sync_player_profile(username: str, chess_api: ChessComAPI) -> Optional[Player]:
+    """إنشاء أو تحديث سجل اللاعب من Chess.com (None إن لم يوجد هناك)"""
+    player_info = chess_api.get_player_info(username)
+    if not player_info:
+        return None
+
+    player, created = Player.objects.get_or_create(
+        username=username,
+        defaults={
+            'full_name': player_info.get('name', ''),
+            'country': player_info.get('country', '').split('/')[-1] if player_info.get('country') else 'DZ',
+            'avatar_url': player_info.get('avatar', '')
+        }
+    )
+
+    # تحديث التصنيف الحالي
+    stats_data = chess_api.get_player_stats(username)
+    if stats_data and 'chess_rapid' in stats_data:
+        rating_info = stats_data['chess_rapid'].get('last', {})
+        player.current_rating = rating_info.get('rating')
+        player.save()
+        invalidate_player(username)
+
+    return player
+
+def select_archives(archives, state: PlayerSyncState, months_count: int, full: bool = False):
+    """
+    اختيار الأرشيفات المطلوب جلبها:
+    الأشهر من شهر العلامة فما بعد، أو آخر N أشهر عند غياب العلامة أو طلب مزامنة كاملة
+    """
+    watermark = None if full else _month_key(state.last_archive_month)
+    if watermark is None:
+        return archives[-months_count:]
+    return [url for url in archives if (archive_month(url) or (0, 0)) >= watermark]
+
+class ArchiveStream:
+    """
+    مولّد مباريات الأشهر المتغيرة الأحدث من العلامة، شهراً بشهر،
+    مع عدادات ما جُلب وأحدث وقت انتهاء تم تمريره
+
+    الأشهر التي فشل جلبها لا تُسجَّل كمُدخلة، ولا تتقدم العلامة بعد أول شهر فاشل
+    (last_complete_url و newest_end_time يتوقفان قبله) حتى يُعاد جلبه في المزامنة التالية
+    """
+
+    def __init__(self, archives: Iterable[ArchiveResult], since_end_time: Optional[int] = None,
+                 on_month: Optional[Callable[['ArchiveStream'], None]] = None):
+        self.archives = archives
+        self.since_end_time = since_end_time
+        self.on_month = on_month
+        self.months = 0
+        self.unchanged_months = 0
+        self.games = 0
+        self.already_synced = 0
+        self.newest_end_time = since_end_time or 0
+        self.ingested_urls: List[str] = []
+        self.failed_urls: List[str] = []
+        self.last_complete_url: Optional[str] = None
+
+    def __iter__(self):
+        for archive in self.archives:
+            self.months += 1
+            self.games += len(archive.games)
+            if self.on_month:
+                self.on_month(self)
+
+            if archive.failed:
+                logger.warning(f"تعذر جلب {archive.url}: {archive.error}")
+                self.failed_urls.append(archive.url)
+                continue
+
+            # الأشهر التي لم تتغير منذ إدخالها السابق لا يُعاد إدخالها
+            if not archive.needs_ingest:
+                self.unchanged_months += 1
+            else:
+                self.ingested_urls.append(archive.url)
+                yield from self._new_games(archive)
+
+            if not self.failed_urls:
+                self.last_complete_url = archive.url
+
+    def _new_games(self, archive: ArchiveResult):
+        for game in archive.games:
+            end_time = game.get('end_time') or 0
+            # المساواة تمر ويتكفل فحص التكرار بها
+            if self.since_end_time and end_time < self.since_end_time:
+                self.already_synced += 1
+                continue
+            if not self.failed_urls:
+                self.newest_end_time = max(self.newest_end_time, end_time)
+            yield game
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.failed_urls)
+
+    def summary(self) -> Dict:
+        return {
+            'months_fetched': self.months,
+            'unchanged_months': self.unchanged_months,
+            'total_fetched': self.games,
+            'already_synced': self.already_synced,
+            'failed_months': list(self.failed_urls),
+            'partial': self.partial
+        }
+
+def advance_watermark(state: PlayerSyncState, last_archive_url: Optional[str], newest_end_time: int):
+    """تقديم العلامة بعد نجاح الإدخال"""
+    month = archive_month(last_archive_url) if last_archive_url else None
+    if month:
+        state.last_archive_month = f"{month[0]:04d}/{month[1]:02d}"
+    if newest_end_time:
+        state.last_game_end_time = max(state.last_game_end_time or 0, newest_end_time)
+    state.last_synced_at = timezone.now()
+    state.save()
+
+def ingest_player_games(player: Player, chess_api: ChessComAPI, months_count: int = 3,
+                        full: bool = False, data_processor: Optional[GameDataProcessor] = None,
+                        on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    مزامنة مباريات اللاعب من Chess.com بشكل تدريجي:
+    تُجلب الأرشيفات الأحدث من العلامة فقط، ويُرشَّح شهر العلامة بوقت انتهاء المباراة
+
+    on_progress: يُستدعى مع {months_fetched, months_total, games_processed} أثناء التقدم
+    """
+    data_processor = data_processor or GameDataProcessor()
+    state, _ = PlayerSyncState.objects.get_or_create(player=player)
+
+    archives = chess_api.get_game_archives(player.username)
+    selected = select_archives(archives, state, months_count, full)
+
+    logger.info(f"مزامنة {player.username}: {len(selected)} أشهر"
+                f"{f' منذ {state.last_archive_month}' if state.last_archive_month and not full else ''}")
+
+    progress = {'months_fetched': 0, 'months_total': len(selected), 'games_processed': 0}
+
+    def report_month(stream):
+        progress['months_fetched'] = stream.months
+        if on_progress:
+            on_progress(dict(progress))
+
+    def report_chunk(counts):
+        progress['games_processed'] = counts['total']
+        if on_progress:
+            on_progress(dict(progress))
+
+    stream = ArchiveStream(
+        chess_api.fetch_archives(selected),
+        since_end_time=None if full else state.last_game_end_time,
+        on_month=report_month
+    )
+
+    # معالجة المباريات على دفعات أثناء وصول الأشهر
+    processing_result = data_processor.process_games_stream(player, stream, on_progress=report_chunk)
+    chess_api.mark_archives_ingested(stream.ingested_urls)
+
+    # تقديم العلامة بعد نجاح الإدخال، حتى آخر شهر قبل أول شهر فشل جلبه
+    advance_watermark(state, stream.last_complete_url, stream.newest_end_time)
+    if stream.partial:
+        logger.warning(f"مزامنة جزئية لـ {player.username}: فشل جلب {len(stream.failed_urls)} أشهر")
+
+    return dict(processing_result, has_archives=bool(archives), **stream.summary())
+
+def ingest_archive_month(player: Player, chess_api: ChessComAPI, archive_url: str,
+                         since_end_time: Optional[int] = None,
+                         data_processor: Optional[GameDataProcessor] = None) -> Dict:
+    """إدخال أرشيف شهر واحد (وحدة العمل للمهام الفرعية المتوازية)"""
+    data_processor = data_processor or GameDataProcessor()
+    stream = ArchiveStream(chess_api.fetch_archives([archive_url]), since_end_time=since_end_time)
+
+    processing_result = data_processor.process_games_stream(player, stream)
+    chess_api.mark_archives_ingested(stream.ingested_urls)
+
+    return dict(processing_result, archive_url=archive_url, newest_end_time=stream.newest_end_time,
+                **stream.summary())
+
+def watermark_from_months(month_results: List[Dict]) -> Tuple[Optional[str], int]:
+    """
+    العلامة من نتائج ingest_archive_month بترتيب الأشهر:
+    آخر شهر قبل أول شهر فشل جلبه، وأحدث وقت انتهاء في الأشهر السابقة له
+    """
+    last_archive_url, newest_end_time = None, 0
+    for result in month_results:
+        if result['failed_months']:
+            break
+        last_archive_url = result['archive_url']
+        newest_end_time = max(newest_end_time, result['newest_end_time'])
+    return last_archive_url, newest_end_time
@@ -0,0 +1,115 @@
+import math
+import random
+from datetime import date, timedelta
+from typing import Dict, Optional
+from django.db import connections, transaction
+from players.models import Player
+from games.models import Game, PGNBlob
+from .data_processor import GameDataProcessor
+import logging
+
+logger = logging.getLogger(__name__)
+
+MOCK_OPENINGS = [
+    ('الافتتاح الإيطالي', 'C50'),
+    ('دفاع الصقلي', 'B20'),
+    ('افتتاح الملكة', 'D00'),
+    ('الافتتاح الإسباني', 'C60'),
+    ('دفاع الفرنسي', 'C00'),
+]
+
+# أنماط اللعب الشائعة مع أوزان تقريبية لتكرارها
+MOCK_TIME_CONTROLS = [('60', 2), ('180+2', 4), ('300', 3), ('600', 3), ('900+10', 1)]
+_TIME_CONTROLS, _TIME_CONTROL_WEIGHTS = zip(*MOCK_TIME_CONTROLS)
+
+DRAW_RATE = 0.08
+
+
+def _expected_score(player_rating: int, opponent_rating: int) -> float:
+    """النتيجة المتوقعة حسب صيغة Elo"""
+    return 1 / (1 + math.pow(10, (opponent_rating - player_rating) / 400))
+
+
+def build_mock_game(rng: random.Random, player: Player, index: int, run_token: str,
+                    end_date: date, days: int) -> Game:
+    """بناء مباراة وهمية واحدة (غير محفوظة) بتوزيعات واقعية"""
+    player_rating = player.current_rating or 1500
+    opening_name, eco_code = rng.choice(MOCK_OPENINGS)
+
+    # الخصوم حول تصنيف اللاعب، والمباريات أكثر كثافة في الفترة الأخيرة
+    opponent_rating = min(3200, max(100, int(rng.gauss(player_rating, 150))))
+    days_ago = int(rng.triangular(0, days, 0))
+    player_color = rng.choice(['white', 'black'])
+
+    roll = rng.random()
+    win_probability = _expected_score(player_rating, opponent_rating) * (1 - DRAW_RATE)
+    if roll < DRAW_RATE:
+        result = '1/2-1/2'
+    elif roll < DRAW_RATE + win_probability:
+        result = '1-0' if player_color == 'white' else '0-1'
+    else:
+        result = '0-1' if player_color == 'white' else '1-0'
+
+    return Game(
+        player=player,
+        opponent_name=f"Opponent_{run_token}_{index + 1}",
+        opponent_rating=opponent_rating,
+        player_rating=player_rating,
+        pgn_content=f"[Mock PGN for game {index + 1}]",
+        result=result,
+        date_played=end_date - timedelta(days=days_ago),
+        time_control=rng.choices(_TIME_CONTROLS, weights=_TIME_CONTROL_WEIGHTS)[0],
+        player_color=player_color,
+        opening_name=opening_name,
+        opening_eco=eco_code,
+        moves_count=min(150, max(10, int(rng.gauss(40, 12))))
+    )
+
+
+def generate_mock_games(player: Player, count: int, seed: Optional[int] = None,
+                        days: int = 365, end_date: Optional[date] = None,
+                        chunk_size: int = 2000) -> Dict:
+    """
+    توليد مباريات وهمية بكميات كبيرة: تُبنى في الذاكرة وتُكتب بـ bulk_create على دفعات،
+    وتُطبق إحصاءات الافتتاحات واللاعب كفروقات مجمّعة لكل دفعة
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    # رمز التشغيل يمنع تصادم unique_together مع مباريات توليد سابق
+    run_token = f"{rng.getrandbits(32):08x}"
+
+    processor = GameDataProcessor()
+    processor.ensure_stats_initialized(player)
+    ignore_conflicts = connections[Game.objects.db].features.supports_ignore_conflicts
+
+    # مفاتيح unique_together الموجودة لتخطي ما ولّده تشغيل سابق بنفس البذرة
+    existing_keys = processor._load_existing_keys(player, end_date - timedelta(days=days), end_date)
+
+    created = 0
+    skipped = 0
+    new_openings = 0
+    for start in range(0, count, chunk_size):
+        games = []
+        for index in range(start, min(start + chunk_size, count)):
+            game = build_mock_game(rng, player, index, run_token, end_date, days)
+            key = (game.opponent_name, game.date_played, game.time_control)
+            if key in existing_keys:
+                skipped += 1
+                continue
+            existing_keys.add(key)
+            games.append(game)
+
+        with transaction.atomic():
+            PGNBlob.store_for(games)
+            Game.objects.bulk_create(games, ignore_conflicts=ignore_conflicts)
+            new_openings += processor.apply_stats_delta(player, games)
+        created += len(games)
+
+    logger.info(f"تم توليد {created} مباراة وهمية للاعب {player.username}")
+
+    return {
+        'created': created,
+        'skipped': skipped,
+        'new_openings': new_openings,
+        'seed': seed
+    }
@@ -0,0 +1,255 @@
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from players.models import Player
+from games.models import Game
+import logging
+
+logger = logging.getLogger(__name__)
+
+# صف واحد لكل مباراة: رموز صغيرة بدلاً من نماذج Game كاملة مع PGN
+SNAPSHOT_DTYPE = np.dtype([
+    ('date', '<i4'),             # أيام منذ 1970-01-01
+    ('color', 'u1'),             # 0 أبيض، 1 أسود
+    ('result', 'u1'),            # من منظور اللاعب: 0 خسارة، 1 تعادل، 2 فوز
+    ('eco', '<u2'),              # A00..E99 -> 0..499
+    ('opponent_rating', '<i2'),  # -1 إن لم يكن معروفاً
+    ('moves', '<u2'),
+])
+
+WHITE, BLACK = 0, 1
+LOSS, DRAW, WIN = 0, 1, 2
+UNKNOWN_ECO_CODE = 0xFFFF
+ECO_CODES = 500
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def encode_eco(eco: str) -> int:
+    """'B20' -> 120، وUNKNOWN_ECO_CODE لما ليس رمز ECO صالحاً"""
+    if len(eco or '') == 3 and 'A' <= eco[0] <= 'E' and eco[1:].isdigit():
+        return (ord(eco[0]) - ord('A')) * 100 + int(eco[1:])
+    return UNKNOWN_ECO_CODE
+
+
+def decode_eco(code: int) -> str:
+    if code >= ECO_CODES:
+        return '???'
+    return f"{chr(ord('A') + code // 100)}{code % 100:02d}"
+
+
+def _result_code(player_color: str, result: str) -> int:
+    if result == '1/2-1/2':
+        return DRAW
+    won = (player_color == 'white' and result == '1-0') or (player_color == 'black' and result == '0-1')
+    return WIN if won else LOSS
+
+
+def encode_rows(rows: Iterable[tuple]) -> np.ndarray:
+    """
+    تحويل صفوف (date_played, player_color, result, opening_eco, opponent_rating, moves_count)
+    إلى مصفوفة لقطة
+    """
+    rows = list(rows)
+    snapshot = np.zeros(len(rows), dtype=SNAPSHOT_DTYPE)
+    if not rows:
+        return snapshot
+
+    played, colors, results, ecos, ratings, moves = zip(*rows)
+    snapshot['date'] = [day.toordinal() - _EPOCH_ORDINAL for day in played]
+    snapshot['color'] = [BLACK if color == 'black' else WHITE for color in colors]
+    snapshot['result'] = [_result_code(color, result) for color, result in zip(colors, results)]
+    snapshot['eco'] = [encode_eco(eco) for eco in ecos]
+    snapshot['opponent_rating'] = np.clip([-1 if r is None else int(r) for r in ratings], -1, 32767)
+    snapshot['moves'] = np.clip([m or 0 for m in moves], 0, 65535)
+    return snapshot
+
+
+SNAPSHOT_FIELDS = ('date_played', 'player_color', 'result', 'opening_eco', 'opponent_rating', 'moves_count')
+
+
+def encode_games(games: Iterable[Game]) -> np.ndarray:
+    return encode_rows(tuple(getattr(game, field) for field in SNAPSHOT_FIELDS) for game in games)
+
+
+class GameSnapshot:
+    """
+    لقطة عمودية لمباريات لاعب في ملف ثنائي مضغوط (صفوف SNAPSHOT_DTYPE متتالية):
+    تُلحق بها المباريات الجديدة عند الإدخال وتُقرأ بـ memmap دون نسخ
+
+    ملف .mark المرافق يحفظ أكبر معرف Game تغطيه اللقطة، فيكشف حذف مباراة
+    وإدراج أخرى حتى لو بقي عدد الصفوف مطابقاً
+    """
+
+    def __init__(self, player_id: int, directory: Optional[Path] = None):
+        self.player_id = player_id
+        self.directory = Path(directory or settings.GAME_SNAPSHOT_DIR)
+        self.path = self.directory / f'{player_id}.bin'
+        self.mark_path = self.directory / f'{player_id}.mark'
+
+    def __len__(self) -> int:
+        try:
+            return self.path.stat().st_size // SNAPSHOT_DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> np.ndarray:
+        """المصفوفة كاملة بـ memmap للقراءة فقط (مصفوفة فارغة إن لم توجد)"""
+        rows = len(self)
+        if rows == 0:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+        return np.memmap(self.path, dtype=SNAPSHOT_DTYPE, mode='r', shape=(rows,))
+
+    def max_game_id(self) -> Optional[int]:
+        """أكبر معرف مباراة تغطيه اللقطة، أو None إن غابت العلامة أو تلفت"""
+        try:
+            return int(self.mark_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def append(self, snapshot: np.ndarray, max_game_id: Optional[int] = None):
+        """
+        إلحاق صفوف في كتابة واحدة بوضع O_APPEND حتى لا تتداخل كتابات العمال المتوازية
+
+        max_game_id: أكبر معرف بين المباريات الملحقة؛ None يحذف العلامة فتُعاد
+        بناء اللقطة عند القراءة التالية
+        """
+        if not len(snapshot):
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        created = not self.path.exists()
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, snapshot.astype(SNAPSHOT_DTYPE, copy=False).tobytes())
+        finally:
+            os.close(fd)
+
+        current = self.max_game_id()
+        if max_game_id is None or (current is None and not created):
+            # لا نعرف ما تغطيه اللقطة: غياب العلامة يفرض إعادة البناء
+            self.mark_path.unlink(missing_ok=True)
+        else:
+            self._write_atomic(self.mark_path, str(max(current or 0, max_game_id)).encode())
+
+    def write(self, snapshot: np.ndarray, max_game_id: Optional[int] = None):
+        """استبدال اللقطة كاملة ذرياً ثم علامتها"""
+        self._write_atomic(self.path, snapshot.astype(SNAPSHOT_DTYPE, copy=False).tobytes())
+        self._write_atomic(self.mark_path, str(max_game_id or 0).encode())
+
+    def _write_atomic(self, path: Path, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def rebuild(self) -> np.ndarray:
+        """إعادة بناء اللقطة من قاعدة البيانات (دون تحميل PGN)"""
+        rows = Game.objects.filter(player_id=self.player_id).order_by('date_played').values_list('id', *SNAPSHOT_FIELDS)
+        max_game_id = 0
+
+        def without_ids():
+            nonlocal max_game_id
+            for game_id, *fields in rows.iterator(chunk_size=5000):
+                max_game_id = max(max_game_id, game_id)
+                yield fields
+
+        snapshot = encode_rows(without_ids())
+        self.write(snapshot, max_game_id)
+        return snapshot
+
+
+def append_games_to_snapshot(player: Player, games: Iterable[Game]):
+    """إلحاق المباريات المدرجة حديثاً باللقطة بعد نجاح المعاملة"""
+    games = list(games)
+    snapshot = encode_games(games)
+    ids = [game.pk for game in games]
+    max_game_id = None if None in ids else max(ids, default=None)
+    transaction.on_commit(lambda: GameSnapshot(player.id).append(snapshot, max_game_id))
+
+
+def rebuild_player_snapshot(player: Player):
+    """إعادة بناء لقطة اللاعب بعد نجاح المعاملة"""
+    transaction.on_commit(lambda: GameSnapshot(player.id).rebuild())
+
+
+def load_player_snapshot(player: Player) -> np.ndarray:
+    """
+    لقطة اللاعب للتحليل؛ تُعاد بناؤها إن غابت أو لم يطابق عدد صفوفها وأكبر معرف فيها
+    ما في قاعدة البيانات (إدخال فشل بعد الكتابة، حذف ثم إدراج، أو لاعب سابق لهذه الميزة)
+
+    تعديل حقول مباراة في مكانها لا يغير العدد ولا المعرف، فعلى مساره إعادة البناء
+    صراحة (rebuild_player_snapshot) كما تفعل rebuild_player_stats
+    """
+    snapshot = GameSnapshot(player.id)
+    db = Game.objects.filter(player=player).aggregate(games=Count('id'), max_id=Max('id'))
+    expected_max_id = db['max_id'] or 0
+    if len(snapshot) != db['games'] or snapshot.max_game_id() != expected_max_id:
+        logger.info(
+            f"إعادة بناء لقطة {player.username}: {len(snapshot)} صف حتى المعرف {snapshot.max_game_id()} "
+            f"مقابل {db['games']} مباراة حتى {expected_max_id}"
+        )
+        return snapshot.rebuild()
+    return snapshot.load()
+
+
+def snapshot_aggregates(snapshot: np.ndarray) -> Dict:
+    """نفس أرقام get_player_game_aggregates محسوبة بعمليات متجهة على اللقطة"""
+    # عدّ (اللون، النتيجة) في تمريرة واحدة: الفهرس = اللون × 3 + النتيجة
+    counts = np.bincount(snapshot['color'].astype(np.intp) * 3 + snapshot['result'], minlength=6)
+
+    by_color = {}
+    for name, color in (('white', WHITE), ('black', BLACK)):
+        losses, draws, wins = (int(n) for n in counts[color * 3:color * 3 + 3])
+        games = wins + draws + losses
+        by_color[name] = {
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'win_rate': round((wins / games) * 100, 1) if games > 0 else 0
+        }
+
+    moves = snapshot['moves']
+    with_moves = moves > 0
+    games_with_moves = int(np.count_nonzero(with_moves))
+    total_moves = int(moves.sum(dtype=np.int64))
+    wins = by_color['white']['wins'] + by_color['black']['wins']
+    draws = by_color['white']['draws'] + by_color['black']['draws']
+
+    return {
+        'total_games': len(snapshot),
+        'wins': wins,
+        'draws': draws,
+        'losses': len(snapshot) - wins - draws,
+        'white': by_color['white'],
+        'black': by_color['black'],
+        'total_moves': total_moves,
+        'games_with_moves': games_with_moves,
+        'average_moves': round(total_moves / games_with_moves, 1) if games_with_moves else 0
+    }
+
+
+def snapshot_eco_counts(snapshot: np.ndarray) -> Dict[str, Dict[str, int]]:
+    """عدد المباريات والانتصارات لكل رمز ECO"""
+    eco = snapshot['eco']
+    known = eco < ECO_CODES
+    games = np.bincount(eco[known], minlength=ECO_CODES)
+    wins = np.bincount(eco[known & (snapshot['result'] == WIN)], minlength=ECO_CODES)
+    return {
+        decode_eco(code): {'games': int(games[code]), 'wins': int(wins[code])}
+        for code in np.flatnonzero(games)
+    }
@@ -1,91 +1,102 @@
-from celery import shared_task
+from celery import chord, shared_task
 from celery.utils.log import get_task_logger
-from players.models import Player, PlayerStats, OpeningStat
-from games.models import Game
+from players.models import Player, PlayerStats, PlayerSyncState
+from games.models import PGNBlob
+from players.chess_api import ChessComAPI
+from players.http_cache import default_archive_cache
+from players.leaderboard import refresh_leaderboard_ranks
+from .data_processor import GameDataProcessor
+from .mock_data import generate_mock_games
+from .snapshot import load_player_snapshot, snapshot_aggregates
+from .ingest import (sync_player_profile, select_archives, advance_watermark,
+                     ingest_player_games, ingest_archive_month, watermark_from_months)
+from django.core.cache import cache
+from contextlib import contextmanager
 from datetime import datetime
 import time
-import random
 
 logger = get_task_logger(__name__)
 
+class StageMetrics:
+    """قياس زمن كل مرحلة من مراحل المهمة وعدد الصفوف التي عالجتها"""
+    
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name):
+        record = {'rows': 0}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            self.stages[name] = record
+    
+    def as_dict(self):
+        return {
+            'stages': self.stages,
+            'total_seconds': round(time.perf_counter() - self.started, 4)
+        }
+
 @shared_task(bind=True)
 def analyze_player_background(self, username):
-    """مهمة تحليل اللاعب في الخلفية"""
+    """مهمة تحليل اللاعب في الخلفية: تحميل، تجميع، ثم حفظ مع قياس كل مرحلة"""
     try:
         logger.info(f"بدء تحليل اللاعب: {username}")
         
-        # محاكاة معالجة طويلة
-        total_steps = 5
-        
-        # الخطوة 1: البحث عن اللاعب
-        self.update_state(
-            state='PROGRESS',
-            meta={'current': 1, 'total': total_steps, 'status': 'البحث عن اللاعب...'}
-        )
+        total_steps = 3
+        metrics = StageMetrics()
+        processor = GameDataProcessor()
         
         try:
             player = Player.objects.get(username=username)
         except Player.DoesNotExist:
             raise Exception(f'اللاعب {username} غير موجود في النظام')
         
-        time.sleep(2)  # محاكاة معالجة
-        
-        # الخطوة 2: تحليل المباريات
+        # الخطوة 1: تحميل المباريات (لقطة عمودية بدل نماذج Game)
         self.update_state(
             state='PROGRESS',
-            meta={'current': 2, 'total': total_steps, 'status': 'تحليل المباريات...'}
+            meta={'current': 1, 'total': total_steps, 'status': 'تحميل المباريات...'}
         )
         
-        games = Game.objects.filter(player=player)
-        games_count = games.count()
-        time.sleep(2)
+        with metrics.stage('load_games') as stage:
+            snapshot = load_player_snapshot(player)
+            stage['rows'] = len(snapshot)
         
-        # الخطوة 3: حساب الإحصاءات
+        # الخطوة 2: حساب الإحصاءات
         self.update_state(
             state='PROGRESS',
-            meta={'current': 3, 'total': total_steps, 'status': 'حساب الإحصاءات...'}
+            meta={'current': 2, 'total': total_steps, 'status': 'حساب الإحصاءات...'}
         )
         
-        wins = sum(1 for game in games if game.player_won)
-        draws = sum(1 for game in games if game.is_draw)
-        losses = games_count - wins - draws
-        
-        time.sleep(2)
+        with metrics.stage('aggregate') as stage:
+            totals = snapshot_aggregates(snapshot)
+            opening_rows = processor.aggregate_openings(player)
+            games_count = totals['total_games']
+            wins = totals['wins']
+            draws = totals['draws']
+            losses = totals['losses']
+            win_percentage = round((wins / games_count) * 100, 1) if games_count > 0 else 0
+            stage['rows'] = len(opening_rows)
         
-        # الخطوة 4: تحديث قاعدة البيانات
+        # الخطوة 3: تحديث قاعدة البيانات
         self.update_state(
             state='PROGRESS',
-            meta={'current': 4, 'total': total_steps, 'status': 'تحديث قاعدة البيانات...'}
+            meta={'current': 3, 'total': total_steps, 'status': 'تحديث قاعدة البيانات...'}
         )
         
-        stats, created = PlayerStats.objects.get_or_create(
-            player=player,
-            defaults={
-                'total_games': games_count,
-                'wins': wins,
-                'losses': losses,
-                'draws': draws,
-                'last_analysis': datetime.now()
-            }
-        )
-        
-        if not created:
-            stats.total_games = games_count
-            stats.wins = wins
-            stats.losses = losses
-            stats.draws = draws
-            stats.last_analysis = datetime.now()
-            stats.save()
+        with metrics.stage('persist') as stage:
+            # نفس مسار إعادة البناء في الإدخال: الافتتاحات (مع حذف ما لم يعد موجوداً)،
+            # الإحصاءات، لوحة الصدارة، التجميعات اليومية واللقطة
+            processor.rebuild_player_stats(player, opening_rows=opening_rows, totals=totals)
+            stage['rows'] = len(opening_rows) + 1
         
-        time.sleep(1)
-        
-        # الخطوة 5: اكتمال التحليل
-        self.update_state(
-            state='PROGRESS',
-            meta={'current': 5, 'total': total_steps, 'status': 'اكتمال التحليل...'}
-        )
+        refresh_leaderboard_ranks_task.delay()
         
-        logger.info(f"اكتمل تحليل اللاعب: {username}")
+        result_metrics = metrics.as_dict()
+        logger.info(f"اكتمل تحليل اللاعب: {username} في {result_metrics['total_seconds']} ثانية")
         
         return {
             'status': 'مكتمل',
@@ -95,8 +106,12 @@ def analyze_player_background(self, username):
                 'wins': wins,
                 'losses': losses,
                 'draws': draws,
-                'win_percentage': round((wins / games_count) * 100, 1) if games_count > 0 else 0
-            }
+                'win_percentage': win_percentage,
+                'as_white': totals['white'],
+                'as_black': totals['black'],
+                'openings': len(opening_rows)
+            },
+            'metrics': result_metrics
         }
         
     except Exception as exc:
@@ -107,71 +122,189 @@ def analyze_player_background(self, username):
         )
         raise exc
 
-@shared_task
-def simulate_chess_analysis(player_id, game_count=50):
-    """مهمة محاكاة تحليل مباريات شطرنج معقدة"""
+@shared_task(bind=True)
+def ingest_player_games_task(self, username, months_count=3, full=False, parallel=False):
+    """مهمة جلب وإدخال مباريات اللاعب من Chess.com في الخلفية"""
     try:
-        player = Player.objects.get(id=player_id)
+        logger.info(f"بدء جلب مباريات اللاعب {username}")
+        chess_api = ChessComAPI(cache=default_archive_cache())
         
-        # محاكاة إنشاء مباريات وهمية للاختبار
-        openings = [
-            ('الافتتاح الإيطالي', 'C50'),
-            ('دفاع الصقلي', 'B20'),
-            ('افتتاح الملكة', 'D00'),
-            ('الافتتاح الإسباني', 'C60'),
-            ('دفاع الفرنسي', 'C00')
-        ]
-        
-        results = ['1-0', '0-1', '1/2-1/2']
-        colors = ['white', 'black']
-        
-        for i in range(game_count):
-            opening = random.choice(openings)
-            
-            game = Game.objects.create(
-                player=player,
-                opponent_name=f"Opponent_{i+1}",
-                opponent_rating=random.randint(1200, 2000),
-                pgn_content=f"[Mock PGN for game {i+1}]",
-                result=random.choice(results),
-                date_played=datetime.now().date(),
-                time_control="10+0",
-                player_color=random.choice(colors),
-                opening_name=opening[0],
-                opening_eco=opening[1],
-                moves_count=random.randint(20, 80)
-            )
-            
-            # تحديث إحصاءات الافتتاح
-            opening_stat, created = OpeningStat.objects.get_or_create(
-                player=player,
-                opening_name=opening[0],
-                eco_code=opening[1],
-                defaults={
-                    'games_played': 0,
-                    'wins': 0,
-                    'losses': 0,
-                    'draws': 0,
-                    'color_played': 'both'
+        self.update_state(
+            state='PROGRESS',
+            meta={'current': 0, 'total': 1, 'status': 'جلب معلومات اللاعب...',
+                  'months_fetched': 0, 'games_processed': 0}
+        )
+        
+        player = sync_player_profile(username, chess_api)
+        if player is None:
+            raise Exception(f'لم يتم العثور على اللاعب {username} في Chess.com')
+        
+        if parallel:
+            return _dispatch_month_subtasks(player, chess_api, months_count, full)
+        
+        def report(progress):
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'current': progress['months_fetched'],
+                    'total': progress['months_total'],
+                    'status': f"جلب الأشهر ({progress['months_fetched']}/{progress['months_total']})"
+                              f" - {progress['games_processed']} مباراة",
+                    'months_fetched': progress['months_fetched'],
+                    'games_processed': progress['games_processed']
                 }
             )
-            
-            opening_stat.games_played += 1
-            
-            if game.player_won:
-                opening_stat.wins += 1
-            elif game.is_draw:
-                opening_stat.draws += 1
-            else:
-                opening_stat.losses += 1
-                
-            opening_stat.save()
-        
-        return f"تم إنشاء {game_count} مباراة وهمية للاعب {player.username}"
+        
+        result = ingest_player_games(player, chess_api, months_count, full=full, on_progress=report)
+        
+        logger.info(f"اكتمل جلب مباريات اللاعب {username}: {result['processed']} مباراة جديدة")
+        if result['processed']:
+            refresh_leaderboard_ranks_task.delay()
+        
+        if result['partial']:
+            return {
+                'status': 'مكتمل جزئياً',
+                'message': f"تعذر جلب {len(result['failed_months'])} أشهر، وستُعاد في المزامنة التالية",
+                'processing': result
+            }
+        
+        return {
+            'status': 'مكتمل',
+            'message': f'تم تحليل بيانات اللاعب {username} بنجاح',
+            'processing': result
+        }
         
     except Exception as exc:
+        logger.error(f"خطأ في جلب بيانات اللاعب {username}: {exc}")
+        self.update_state(
+            state='FAILURE',
+            meta={'error': str(exc)}
+        )
         raise exc
 
+def _dispatch_month_subtasks(player, chess_api, months_count, full):
+    """تقسيم الجلب إلى مهمة فرعية لكل شهر حتى يعمل عدة عمال على لاعب واحد"""
+    state, _ = PlayerSyncState.objects.get_or_create(player=player)
+    selected = select_archives(chess_api.get_game_archives(player.username), state, months_count, full)
+    
+    if not selected:
+        return {'status': 'مكتمل', 'message': 'لا توجد أشهر جديدة', 'months_total': 0}
+    
+    # بناء الإحصاءات مرة واحدة قبل التوازي حتى تطبق كل مهمة فرعية فروقاتها فقط
+    GameDataProcessor().ensure_stats_initialized(player)
+    
+    since_end_time = None if full else state.last_game_end_time
+    result = chord(
+        [ingest_archive_month_task.s(player.id, url, since_end_time) for url in selected]
+    )(finalize_player_ingest.s(player.id))
+    
+    # حفظ نتيجة المجموعة حتى يستطيع task_status حساب التقدم منها
+    group_result = result.parent
+    if group_result is not None:
+        group_result.save()
+    
+    return {
+        'status': 'قيد التنفيذ',
+        'message': f'تم توزيع {len(selected)} أشهر على مهام فرعية',
+        'months_total': len(selected),
+        'group_id': group_result.id if group_result is not None else None,
+        'finalize_task_id': result.id
+    }
+
+@shared_task
+def ingest_archive_month_task(player_id, archive_url, since_end_time=None):
+    """مهمة فرعية: إدخال أرشيف شهر واحد"""
+    player = Player.objects.get(id=player_id)
+    chess_api = ChessComAPI(cache=default_archive_cache())
+    return ingest_archive_month(player, chess_api, archive_url, since_end_time)
+
+@shared_task
+def finalize_player_ingest(month_results, player_id):
+    """تجميع نتائج المهام الفرعية وتقديم علامة المزامنة حتى أول شهر فشل جلبه"""
+    state, _ = PlayerSyncState.objects.get_or_create(player_id=player_id)
+    last_archive_url, newest_end_time = watermark_from_months(month_results)
+    advance_watermark(state, last_archive_url, newest_end_time)
+    
+    totals = {}
+    for key in ('total_fetched', 'processed', 'skipped', 'months_fetched', 'unchanged_months'):
+        totals[key] = sum(result[key] for result in month_results)
+    totals['failed_months'] = [url for result in month_results for url in result['failed_months']]
+    totals['partial'] = bool(totals['failed_months'])
+    
+    if totals['processed']:
+        refresh_leaderboard_ranks_task.delay()
+    
+    if totals['partial']:
+        return {
+            'status': 'مكتمل جزئياً',
+            'message': f'تم إدخال {totals["processed"]} مباراة جديدة، وتعذر جلب '
+                       f'{len(totals["failed_months"])} أشهر ستُعاد في المزامنة التالية',
+            'processing': totals
+        }
+    
+    return {
+        'status': 'مكتمل',
+        'message': f'تم إدخال {totals["processed"]} مباراة جديدة',
+        'processing': totals
+    }
+
+@shared_task
+def simulate_chess_analysis(player_id, game_count=50, seed=None):
+    """مهمة توليد مباريات شطرنج وهمية بكميات كبيرة (لاختبارات الحمل)"""
+    player = Player.objects.get(id=player_id)
+    
+    result = generate_mock_games(player, game_count, seed=seed)
+    if result['created']:
+        refresh_leaderboard_ranks_task.delay()
+    
+    return f"تم إنشاء {result['created']} مباراة وهمية للاعب {player.username}"
+
+# مدة منع جدولة إعادة حساب ثانية لنفس اللاعب
+STATS_REFRESH_LOCK_TIMEOUT = 5 * 60
+
+def request_stats_refresh(player) -> bool:
+    """جدولة إعادة حساب إحصاءات اللاعب في الخلفية مرة واحدة مهما تكررت الطلبات"""
+    lock_key = f'stats_refresh:{player.id}'
+    try:
+        if not cache.add(lock_key, True, STATS_REFRESH_LOCK_TIMEOUT):
+            return False
+    except Exception as exc:
+        # بلا قفل قد تتكرر الجدولة، وإعادة الحساب نفسها آمنة التكرار
+        logger.warning(f"تعذر أخذ قفل تحديث إحصاءات اللاعب {player.username}: {exc}")
+    try:
+        refresh_player_stats_task.delay(player.id)
+    except Exception as exc:
+        logger.error(f"تعذرت جدولة تحديث إحصاءات اللاعب {player.username}: {exc}")
+        _release_stats_refresh_lock(player.id)
+        return False
+    return True
+
+def _release_stats_refresh_lock(player_id):
+    try:
+        cache.delete(f'stats_refresh:{player_id}')
+    except Exception as exc:
+        # ينتهي القفل وحده بعد STATS_REFRESH_LOCK_TIMEOUT
+        logger.warning(f"تعذر تحرير قفل تحديث إحصاءات اللاعب {player_id}: {exc}")
+
+@shared_task
+def refresh_player_stats_task(player_id):
+    """إعادة حساب إحصاءات اللاعب والافتتاحات من مبارياته المخزنة"""
+    try:
+        player = Player.objects.get(id=player_id)
+        GameDataProcessor().rebuild_player_stats(player)
+        logger.info(f"تم تحديث إحصاءات اللاعب {player.username}")
+    finally:
+        _release_stats_refresh_lock(player_id)
+    
+    refresh_leaderboard_ranks_task.delay()
+
+@shared_task
+def refresh_leaderboard_ranks_task(time_classes=None):
+    """إعادة حساب ترتيب لوحة الصدارة بعد تغير الإحصاءات"""
+    updated = refresh_leaderboard_ranks(time_classes)
+    logger.info(f"تم تحديث ترتيب {updated} صف في لوحة الصدارة")
+    return updated
+
 @shared_task
 def cleanup_old_analysis():
     """مهمة تنظيف التحليلات القديمة"""
@@ -185,4 +318,19 @@ def cleanup_old_analysis():
     
     logger.info(f"تم العثور على {count} إحصاءات قديمة")
     
+    collect_orphan_pgn_blobs()
+    
     return f"تم تنظيف {count} سجل قديم"
+
+@shared_task
+def collect_orphan_pgn_blobs():
+    """
+    حذف نصوص PGN التي لم تعد أي مباراة تشير إليها
+
+    هذه المهمة هي الجامع الوحيد لها: حذف المباريات (مباشرة أو بحذف اللاعب) لا يلمس
+    PGNBlob لأن النص قد يكون مشتركاً بين مباريات، و PROTECT يمنع حذفه وهو مستخدم.
+    تُجدول يومياً في CELERY_BEAT_SCHEDULE
+    """
+    orphan_blobs, _ = PGNBlob.objects.filter(games__isnull=True).delete()
+    logger.info(f"تم حذف {orphan_blobs} نص PGN غير مستخدم")
+    return orphan_blobs
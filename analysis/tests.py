@@ -1,3 +1,640 @@
-from django.test import TestCase
+import io
+import random
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import chess.pgn
+import numpy as np
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from players.chess_api import ArchiveResult
+from players.history import rebuild_history
+from players.models import (LeaderboardEntry, OpeningStat, PerformanceBucket, Player, PlayerStats,
+                            PlayerSyncState)
+from games.models import Game, GameMoves, GamePosition
+from games.moves import replay, unpack_moves
+from utils.data_helpers import get_player_game_aggregates, player_stats_are_stale, update_player_stats
+from utils.testing import IsolatedStorageTestCase
+from .data_processor import GameDataProcessor
+from .mock_data import DRAW_RATE, build_mock_game, generate_mock_games
+from .ingest import ingest_archive_month, ingest_player_games
+from .tasks import analyze_player_background, finalize_player_ingest
+from .snapshot import GameSnapshot, load_player_snapshot, snapshot_aggregates, snapshot_eco_counts
+from .time_management import load_clock_arrays, parse_time_control, time_management_stats
+
+ARCHIVE_BASE = 'https://api.chess.com/pub/player/ahmed_dz/games'
+
+
+def make_game(opponent, day, end_time, result='1-0', month='2024.03', elo=1500, time_control='180+2',
+              moves='1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5', color='white'):
+    """مباراة بصيغة Chess.com مع PGN بسيط"""
+    white, black = ('ahmed_dz', opponent) if color == 'white' else (opponent, 'ahmed_dz')
+    pgn = (
+        f'[White "{white}"]\n[Black "{black}"]\n[Result "{result}"]\n'
+        f'[Date "{month}.{day:02d}"]\n[TimeControl "{time_control}"]\n[ECO "C50"]\n'
+        f'[WhiteElo "{elo}"]\n[BlackElo "{elo + 100}"]\n\n'
+        f'{moves} {result}\n'
+    )
+    return {'pgn': pgn, 'end_time': end_time, 'url': f'https://www.chess.com/game/{opponent}'}
+
+
+def stats_rows(player):
+    """صفوف OpeningStat و PlayerStats للمقارنة بين الفروقات وإعادة البناء"""
+    openings = list(OpeningStat.objects.filter(player=player).order_by('opening_name').values_list(
+        'opening_name', 'eco_code', 'games_played', 'wins', 'draws', 'losses',
+        'white_games', 'black_games', 'color_played', 'win_rate'
+    ))
+    stats = PlayerStats.objects.filter(player=player).values(
+        'total_games', 'wins', 'draws', 'losses', 'total_moves', 'games_with_moves',
+        'average_game_length', 'favorite_opening', 'weakest_defense'
+    ).get()
+    return openings, stats
+
+
+class FakeChessComAPI:
+    """بديل محلي لـ ChessComAPI يسجل الأرشيفات المطلوبة"""
+
+    def __init__(self, months):
+        self.months = months
+        self.requested = []
+        # الأشهر التي يفشل جلبها (كما يُرجعها fetch_archive بعد استنفاد المحاولات)
+        self.failing = set()
+        self.marked = []
+
+    def get_game_archives(self, username):
+        return [f'{ARCHIVE_BASE}/{month}' for month in self.months]
+
+    def fetch_archives(self, archive_urls, concurrent=True):
+        for url in archive_urls:
+            self.requested.append(url)
+            month = url.split('/games/')[1]
+            if month in self.failing:
+                yield ArchiveResult(url, [], False, False, error='503 Server Error')
+            else:
+                yield ArchiveResult(url, self.months[month], True, False)
+
+    def mark_archives_ingested(self, archive_urls):
+        self.marked.extend(archive_urls)
+
+
+class IncrementalSyncTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def test_second_sync_only_fetches_from_watermark(self):
+        api = FakeChessComAPI({
+            '2024/01': [make_game('a', 5, 100, month='2024.01')],
+            '2024/02': [make_game('b', 5, 200, month='2024.02')],
+            '2024/03': [make_game('c', 5, 300)],
+        })
+        first = ingest_player_games(self.player, api, months_count=3)
+        self.assertEqual(first['processed'], 3)
+
+        state = PlayerSyncState.objects.get(player=self.player)
+        self.assertEqual(state.last_archive_month, '2024/03')
+        self.assertEqual(state.last_game_end_time, 300)
+
+        # الشهر الحالي نما وظهر شهر جديد
+        api.months['2024/03'].append(make_game('d', 20, 400))
+        api.months['2024/04'] = [make_game('e', 2, 500, month='2024.04')]
+        api.requested.clear()
+
+        second = ingest_player_games(self.player, api, months_count=3)
+        self.assertEqual(api.requested, [f'{ARCHIVE_BASE}/2024/03', f'{ARCHIVE_BASE}/2024/04'])
+        self.assertEqual(second['processed'], 2)
+        self.assertEqual(second['already_synced'], 0)
+        self.assertEqual(Game.objects.filter(player=self.player).count(), 5)
+        self.assertEqual(PlayerStats.objects.get(player=self.player).total_games, 5)
+        self.assertEqual(PlayerSyncState.objects.get(player=self.player).last_game_end_time, 500)
+        self.assertEqual(
+            dict(LeaderboardEntry.objects.filter(player=self.player).values_list('time_class', 'total_games')),
+            {'all': 5, 'blitz': 5}
+        )
+
+
+    def test_reports_progress_per_month_and_chunk(self):
+        api = FakeChessComAPI({
+            '2024/02': [make_game('a', 5, 100, month='2024.02'), make_game('b', 6, 110, month='2024.02')],
+            '2024/03': [make_game('c', 5, 300)],
+        })
+        reports = []
+        ingest_player_games(self.player, api, months_count=2, on_progress=reports.append)
+        self.assertEqual(reports[0], {'months_fetched': 1, 'months_total': 2, 'games_processed': 0})
+        self.assertEqual(reports[-1], {'months_fetched': 2, 'months_total': 2, 'games_processed': 3})
+
+    def failing_api(self):
+        api = FakeChessComAPI({
+            '2024/01': [make_game('a', 5, 100, month='2024.01')],
+            '2024/02': [make_game('b', 5, 200, month='2024.02')],
+            '2024/03': [make_game('c', 5, 300)],
+        })
+        api.failing.add('2024/02')
+        return api
+
+    def test_failed_month_is_fetched_again_on_next_sync(self):
+        api = self.failing_api()
+        first = ingest_player_games(self.player, api, months_count=3)
+        self.assertEqual(first['processed'], 2)
+        self.assertTrue(first['partial'])
+        self.assertEqual(first['failed_months'], [f'{ARCHIVE_BASE}/2024/02'])
+        self.assertNotIn(f'{ARCHIVE_BASE}/2024/02', api.marked)
+
+        # العلامة تتوقف قبل الشهر الفاشل
+        state = PlayerSyncState.objects.get(player=self.player)
+        self.assertEqual((state.last_archive_month, state.last_game_end_time), ('2024/01', 100))
+
+        api.failing.clear()
+        api.requested.clear()
+        second = ingest_player_games(self.player, api, months_count=3)
+        self.assertEqual(api.requested, [f'{ARCHIVE_BASE}/2024/{month}' for month in ('01', '02', '03')])
+        self.assertEqual((second['processed'], second['partial']), (1, False))
+        self.assertEqual(Game.objects.filter(player=self.player).count(), 3)
+        state.refresh_from_db()
+        self.assertEqual((state.last_archive_month, state.last_game_end_time), ('2024/03', 300))
+
+    @mock.patch('analysis.tasks.refresh_leaderboard_ranks_task.delay')
+    def test_parallel_months_stop_watermark_at_first_failure(self, delay):
+        api = self.failing_api()
+        results = [ingest_archive_month(self.player, api, url) for url in api.get_game_archives('ahmed_dz')]
+        summary = finalize_player_ingest(results, self.player.id)
+
+        self.assertEqual(summary['processing']['failed_months'], [f'{ARCHIVE_BASE}/2024/02'])
+        self.assertEqual(summary['processing']['processed'], 2)
+        state = PlayerSyncState.objects.get(player=self.player)
+        self.assertEqual((state.last_archive_month, state.last_game_end_time), ('2024/01', 100))
+
+
+class GameSnapshotTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        self.api = FakeChessComAPI({
+            '2024/02': [make_game('a', 5, 100, month='2024.02'), make_game('b', 6, 110, '0-1', '2024.02')],
+            '2024/03': [make_game('c', 5, 300, '1/2-1/2')],
+        })
+
+    def test_ingest_appends_to_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_player_games(self.player, self.api, months_count=2)
+
+        snapshot = GameSnapshot(self.player.id)
+        self.assertEqual(len(snapshot), 3)
+        self.assertEqual(snapshot_aggregates(snapshot.load()), get_player_game_aggregates(self.player))
+        self.assertEqual(snapshot_eco_counts(snapshot.load()), {'C50': {'games': 3, 'wins': 1}})
+
+    def test_out_of_date_snapshot_is_rebuilt(self):
+        # الإدخال دون تنفيذ on_commit يترك اللقطة ناقصة
+        ingest_player_games(self.player, self.api, months_count=2)
+        self.assertEqual(len(GameSnapshot(self.player.id)), 0)
+
+        snapshot = load_player_snapshot(self.player)
+        self.assertEqual(len(snapshot), 3)
+        self.assertEqual(snapshot_aggregates(snapshot), get_player_game_aggregates(self.player))
+
+    def test_replaced_game_with_same_count_is_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_player_games(self.player, self.api, months_count=2)
+
+        # حذف مباراة وإدراج أخرى دون المرور باللقطة: العدد نفسه والمعرف الأكبر تغيّر
+        Game.objects.filter(player=self.player, result='1/2-1/2').delete()
+        Game.objects.create(
+            player=self.player, opponent_name='d', date_played=date(2024, 3, 20), player_color='black',
+            result='0-1', opening_eco='B20', opening_name='Sicilian Defense', moves_count=40,
+        )
+        self.assertEqual(len(GameSnapshot(self.player.id)), 3)
+
+        snapshot = load_player_snapshot(self.player)
+        self.assertEqual(snapshot_aggregates(snapshot), get_player_game_aggregates(self.player))
+        self.assertEqual(snapshot_eco_counts(snapshot), {'C50': {'games': 2, 'wins': 1}, 'B20': {'games': 1, 'wins': 1}})
+
+
+class PerformanceHistoryTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        ingest_player_games(self.player, FakeChessComAPI({
+            '2024/02': [make_game('a', 5, 100, month='2024.02', elo=1480),
+                        make_game('b', 5, 110, '0-1', '2024.02', elo=1490, time_control='600')],
+            '2024/03': [make_game('c', 1, 300, '1/2-1/2', elo=1510),
+                        make_game('d', 9, 310, elo=1530)],
+        }), months_count=2)
+
+    def bucket_rows(self):
+        return list(PerformanceBucket.objects.filter(player=self.player).order_by(
+            'time_class', 'day').values_list('time_class', 'day', 'games', 'wins', 'draws', 'losses',
+                                             'opponent_rating_sum', 'rated_games', 'rating'))
+
+    def test_incremental_buckets_match_full_rebuild(self):
+        incremental = self.bucket_rows()
+        rebuild_history(self.player)
+        self.assertEqual(incremental, self.bucket_rows())
+
+    def test_older_game_ingested_later_keeps_latest_rating(self):
+        # مباراة من يوم 9 انتهت قبل d (310) لكنها تُدرج بعدها، مثل شهر أُعيد جلبه
+        GameDataProcessor().process_games_batch(self.player, [make_game('e', 9, 250, elo=1400)])
+        bucket = PerformanceBucket.objects.get(player=self.player, time_class='all', day=date(2024, 3, 9))
+        self.assertEqual((bucket.games, bucket.rating, bucket.rating_end_time), (2, 1530, 310))
+
+        GameDataProcessor().process_games_batch(self.player, [make_game('f', 9, 320, elo=1545)])
+        bucket.refresh_from_db()
+        self.assertEqual((bucket.games, bucket.rating), (3, 1545))
+
+        incremental = self.bucket_rows()
+        rebuild_history(self.player)
+        self.assertEqual(incremental, self.bucket_rows())
+
+    def test_monthly_history_endpoint(self):
+        response = self.client.get(reverse('player_history', args=[self.player.username]),
+                                   {'period': 'month', 'from': '2024-02-01'})
+        history = response.json()['history']
+        self.assertEqual([point['period_start'] for point in history], ['2024-02-01', '2024-03-01'])
+        self.assertEqual(history[0]['games'], 2)
+        self.assertEqual(history[0]['average_opponent_rating'], 1585)
+        self.assertEqual(history[1]['rating'], 1530)
+        self.assertEqual(history[1]['win_percentage'], 50.0)
+
+    def test_rejects_bad_dates(self):
+        response = self.client.get(reverse('player_history', args=[self.player.username]), {'to': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TimeManagementTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    # ضيق الوقت في 180+2 تحت 18 ثانية: اللاعب يهبط إلى 10 ثم 8 والخصم إلى 5
+    BLITZ = ('1. e4 {[%clk 0:03:00]} e5 {[%clk 0:02:59]} 2. Nf3 {[%clk 0:00:10]} Nc6 {[%clk 0:00:05]} '
+             '3. Bc4 {[%clk 0:00:08]}')
+    RAPID = '1. d4 {[%clk 0:10:00]} d5 {[%clk 0:10:00]} 2. c4 {[%clk 0:09:30]}'
+
+    def setUp(self):
+        super().setUp()
+        ingest_player_games(self.player, FakeChessComAPI({
+            '2024/03': [make_game('a', 5, 100, moves=self.BLITZ),
+                        make_game('b', 6, 110, '0-1', time_control='600', moves=self.RAPID),
+                        make_game('c', 7, 120, '1/2-1/2')],
+        }), months_count=1)
+
+    def test_parse_time_control(self):
+        self.assertEqual(parse_time_control('180+2'), (180, 2))
+        self.assertEqual(parse_time_control('600'), (600, 0))
+        self.assertIsNone(parse_time_control('1/259200'))
+
+    def test_phase_time_trouble_and_scrambles(self):
+        stats = time_management_stats(load_clock_arrays(self.player))
+        # المباراة دون ساعات لا تدخل في التحليل
+        self.assertEqual(stats['games_analyzed'], 2)
+        # الوقت المستهلك: 2 + 172 + 4 في الخاطفة و0 + 30 في السريعة
+        self.assertEqual(stats['phases']['opening'], {'moves': 5, 'average_seconds': 41.6, 'time_share': 100.0})
+        self.assertEqual(stats['phases']['endgame']['moves'], 0)
+        self.assertEqual(stats['time_trouble']['games'], 1)
+        self.assertEqual(stats['time_trouble']['percentage'], 50.0)
+        self.assertEqual(stats['time_trouble']['results']['wins'], 1)
+        self.assertEqual((stats['time_scrambles']['games'], stats['time_scrambles']['losses']), (1, 0))
+
+    def test_endpoint_filters_by_time_class(self):
+        url = reverse('player_time_management', args=[self.player.username])
+        data = self.client.get(url, {'time_class': 'rapid'}).json()
+        self.assertEqual(data['time_management']['games_analyzed'], 1)
+        self.assertEqual(data['time_management']['time_trouble']['games'], 0)
+        self.assertEqual(self.client.get(url, {'time_class': 'daily'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('player_time_management', args=['nobody'])).status_code, 404)
+
+    def test_clock_arrays_load_in_one_query(self):
+        with self.assertNumQueries(1):
+            arrays = load_clock_arrays(self.player)
+        self.assertEqual(len(arrays['result']), 2)
+        self.assertEqual(len(arrays['seconds']), 5 + 3)
+
+    def test_vectorised_stats_over_thousands_of_games(self):
+        games, plies = 5000, 80
+        rng = np.random.default_rng(0)
+        game = np.repeat(np.arange(games), plies)
+        # الساعات تنزل من 180 إلى 1 في المباريات الزوجية، وتبقى فوق 150 في الفردية
+        seconds = np.tile(np.repeat(np.linspace(180, 1, plies // 2), 2), games) + 150.0 * (game % 2)
+        arrays = {
+            'seconds': seconds + rng.random(len(seconds)),
+            'game': game,
+            'ply': np.tile(np.arange(plies), games),
+            'own': np.tile(np.arange(plies) % 2 == 0, games),
+            'base': np.full(games, 180.0),
+            'increment': np.zeros(games),
+            'result': rng.integers(0, 3, games),
+        }
+        stats = time_management_stats(arrays)
+
+        # 40 نقلة للاعب في كل مباراة: 10 افتتاح و20 وسط و10 نهاية
+        self.assertEqual([stats['phases'][phase]['moves'] for phase in ('opening', 'middlegame', 'endgame')],
+                         [10 * games, 20 * games, 10 * games])
+        losses, draws, wins = np.bincount(arrays['result'][::2], minlength=3)
+        expected = {'games': games // 2, 'wins': wins, 'draws': draws, 'losses': losses}
+        for key in ('time_trouble', 'time_scrambles'):
+            results = stats[key]['results'] if key == 'time_trouble' else stats[key]
+            self.assertEqual({field: results[field] for field in expected}, expected)
+        self.assertEqual(stats['time_trouble']['percentage'], 50.0)
+
+
+class BulkInsertTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        self.processor = GameDataProcessor()
+
+    def test_skips_duplicates_within_batch_and_already_stored(self):
+        first = self.processor.process_games_batch(self.player, [
+            make_game('a', 1, 100),
+            make_game('b', 2, 110, moves='1. d4 d5'),
+            make_game('a', 1, 100),
+        ])
+        self.assertEqual((first['total'], first['processed'], first['skipped']), (3, 2, 1))
+
+        second = self.processor.process_games_batch(self.player, [
+            make_game('b', 2, 110, moves='1. d4 d5'),
+            make_game('c', 3, 120, '0-1', moves='1. c4'),
+        ])
+        self.assertEqual((second['total'], second['processed'], second['skipped']), (2, 1, 1))
+        self.assertEqual(Game.objects.filter(player=self.player).count(), 3)
+        self.assertEqual(PlayerStats.objects.get(player=self.player).total_games, 3)
+
+    def test_refetched_ids_attach_positions_and_moves_to_their_games(self):
+        # مباراة مخزنة سابقاً في نطاق تواريخ الدفعة نفسها
+        self.processor.process_games_batch(self.player, [make_game('b', 2, 110, moves='1. d4 d5')])
+        self.processor.process_games_batch(self.player, [
+            make_game('a', 1, 100),
+            make_game('b', 2, 110, moves='1. d4 d5'),
+            make_game('c', 3, 120, '0-1', moves='1. c4'),
+        ])
+
+        self.assertEqual(GameMoves.objects.count(), 3)
+        for game in Game.objects.filter(player=self.player):
+            expected = list(chess.pgn.read_game(io.StringIO(game.pgn_content)).mainline_moves())
+            self.assertEqual(game.positions.count(), len(expected) + 1)
+            stored = [move for _, move in replay(unpack_moves(game.encoded_moves.moves))]
+            self.assertEqual(stored, expected)
+        self.assertEqual(GamePosition.objects.filter(player=self.player).count(), 7 + 3 + 2)
+
+    def test_rows_inserted_concurrently_are_not_counted_twice(self):
+        self.processor.process_games_batch(self.player, [make_game('b', 2, 110, moves='1. d4 d5')])
+        # إدراج متزامن بعد فحص التكرار: الفحص لا يرى المباراة b
+        with mock.patch.object(GameDataProcessor, '_load_existing_keys', return_value=set()):
+            result = self.processor.process_games_batch(self.player, [
+                make_game('a', 1, 100),
+                make_game('b', 2, 110, moves='1. d4 d5'),
+            ])
+
+        self.assertEqual((result['processed'], result['skipped']), (1, 1))
+        self.assertEqual(PlayerStats.objects.get(player=self.player).total_games, 2)
+        self.assertEqual(LeaderboardEntry.objects.get(player=self.player, time_class='all').total_games, 2)
+        self.assertEqual(GameMoves.objects.count(), 2)
+        self.assertEqual(GamePosition.objects.filter(player=self.player).count(), 7 + 3)
+
+        incremental = stats_rows(self.player)
+        self.processor.rebuild_player_stats(self.player)
+        self.assertEqual(stats_rows(self.player), incremental)
+
+
+class StreamingIngestTests(IsolatedStorageTestCase):
+    """process_games_stream مع مولّد أطول من حجم الدفعة"""
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        self.processor = GameDataProcessor()
+        self.pulled = 0
+
+    def games(self, count, fail_after=None):
+        """مولّد يعدّ ما استُهلك منه، ويفشل بعد fail_after مباراة إن حُدد"""
+        for i in range(count):
+            if i == fail_after:
+                raise ConnectionError('انقطع الأرشيف')
+            self.pulled += 1
+            yield make_game(f'opp{i}', i % 28 + 1, 100 + i)
+
+    def test_inserts_per_chunk_without_draining_the_generator(self):
+        reports = []
+        pulled_at_report = []
+
+        def on_progress(report):
+            reports.append(report)
+            pulled_at_report.append(self.pulled)
+
+        inserts = mock.patch.object(GameDataProcessor, '_bulk_insert_games',
+                                    autospec=True, side_effect=GameDataProcessor._bulk_insert_games)
+        with inserts as bulk_insert:
+            result = self.processor.process_games_stream(self.player, self.games(7), chunk_size=3,
+                                                         on_progress=on_progress)
+
+        self.assertEqual([len(call.args[2]) for call in bulk_insert.call_args_list], [3, 3, 1])
+        # كل دفعة تُدرج قبل سحب التالية من المولّد
+        self.assertEqual(pulled_at_report, [3, 6, 7])
+        self.assertEqual([report['processed'] for report in reports], [3, 6, 7])
+        self.assertEqual((result['total'], result['processed'], result['skipped']), (7, 7, 0))
+        self.assertEqual(Game.objects.filter(player=self.player).count(), 7)
+        self.assertEqual(PlayerStats.objects.get(player=self.player).total_games, 7)
+
+    def test_partially_consumed_generator_ingests_the_rest(self):
+        games = self.games(7)
+        next(games), next(games)
+
+        result = self.processor.process_games_stream(self.player, games, chunk_size=3)
+        self.assertEqual((result['total'], result['processed']), (5, 5))
+        self.assertEqual(sorted(Game.objects.filter(player=self.player).values_list('opponent_name', flat=True)),
+                         [f'opp{i}' for i in range(2, 7)])
+
+        # استئناف المولّد نفسه بعد نفاده لا يدرج شيئاً
+        again = self.processor.process_games_stream(self.player, games, chunk_size=3)
+        self.assertEqual((again['total'], again['processed'], again['success']), (0, 0, False))
+
+    def test_chunks_before_a_failing_generator_are_kept(self):
+        with self.assertRaises(ConnectionError):
+            self.processor.process_games_stream(self.player, self.games(7, fail_after=5), chunk_size=3)
+        # الدفعة الأولى أُدرجت، والمباراتان المسحوبتان من الدفعة الناقصة لم تُدرجا
+        self.assertEqual(self.pulled, 5)
+        self.assertEqual(Game.objects.filter(player=self.player).count(), 3)
+
+
+class StatsDeltaTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    ITALIAN = '1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5'
+    SICILIAN = '1. e4 c5 2. Nf3 d6'
+    QUEENS_GAMBIT = '1. d4 d5 2. c4'
+
+    def setUp(self):
+        super().setUp()
+        self.processor = GameDataProcessor()
+
+    def snapshot(self):
+        return stats_rows(self.player)
+
+    def test_deltas_over_several_batches_match_full_rebuild(self):
+        batches = [
+            [make_game('a', 1, 100), make_game('b', 2, 110, '0-1', moves=self.SICILIAN, color='black')],
+            # دفعة تعيد إرسال مباراة مخزنة ومباراة مكررة داخلها
+            [make_game('a', 1, 100), make_game('c', 3, 120, '1/2-1/2'),
+             make_game('d', 4, 130, '0-1', moves=self.QUEENS_GAMBIT),
+             make_game('d', 4, 130, '0-1', moves=self.QUEENS_GAMBIT)],
+            [make_game('e', 5, 140, '1-0', moves=self.SICILIAN, color='black'),
+             make_game('f', 6, 150, '0-1', moves=self.ITALIAN, color='black'),
+             make_game('g', 7, 160, '0-1', moves=self.QUEENS_GAMBIT)],
+        ]
+        results = [self.processor.process_games_batch(self.player, batch) for batch in batches]
+        self.assertEqual([result['processed'] for result in results], [2, 2, 3])
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental[1]['total_games'], 7)
+        self.processor.rebuild_player_stats(self.player)
+        self.assertEqual(self.snapshot(), incremental)
+
+        # إعادة إرسال دفعة كاملة لا تغير شيئاً
+        self.processor.process_games_batch(self.player, batches[2])
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class PlayerAggregatesTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        # مباريات مخزنة دون أي إحصاءات (مثل بيانات أُدرجت قبل التحديث التدريجي)
+        rows = [('white', '1-0', 40), ('white', '1/2-1/2', 30), ('white', '0-1', 0),
+                ('black', '0-1', 20), ('black', '1-0', 10)]
+        for index, (color, result, moves) in enumerate(rows):
+            Game.objects.create(
+                player=self.player, opponent_name=f'opp{index}', result=result, player_color=color,
+                date_played=f'2024-03-{index + 1:02d}', time_control='180+2', moves_count=moves,
+                pgn_content=f'[Result "{result}"]\n\n{result}\n'
+            )
+
+    def test_aggregates_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            totals = get_player_game_aggregates(self.player)
+        self.assertEqual(totals, {
+            'total_games': 5, 'wins': 2, 'draws': 1, 'losses': 2,
+            'white': {'games': 3, 'wins': 1, 'draws': 1, 'losses': 1, 'win_rate': 33.3},
+            'black': {'games': 2, 'wins': 1, 'draws': 0, 'losses': 1, 'win_rate': 50.0},
+            'total_moves': 100, 'games_with_moves': 4, 'average_moves': 25.0
+        })
+
+    def test_update_player_stats_writes_totals_only(self):
+        stats = update_player_stats(self.player)
+        self.assertEqual((stats.total_games, stats.wins, stats.draws, stats.losses), (5, 2, 1, 2))
+        self.assertEqual(stats.average_game_length, 25)
+        # إعادة البناء الكاملة لم تحدث بعد، فالإحصاءات ما زالت تُعد قديمة
+        self.assertTrue(player_stats_are_stale(self.player, stats))
+        self.assertFalse(LeaderboardEntry.objects.filter(player=self.player).exists())
+
+    @mock.patch('analysis.tasks.refresh_player_stats_task.delay')
+    def test_analyze_endpoint_queues_the_full_rebuild(self, delay):
+        response = self.client.post(reverse('analyze_player'), {'username': 'ahmed_dz'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['stats_updated'])
+        self.assertTrue(response.json()['full_refresh_queued'])
+        delay.assert_called_once_with(self.player.id)
+        self.assertFalse(PerformanceBucket.objects.filter(player=self.player).exists())
+
+
+class AnalyzePlayerTaskTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        GameDataProcessor().process_games_batch(self.player, [
+            make_game('a', 1, 100),
+            make_game('b', 2, 110, '0-1', moves='1. d4 d5 2. c4'),
+            make_game('c', 3, 120, '1/2-1/2', moves='1. e4 c5', color='black'),
+        ])
+
+    @mock.patch('analysis.tasks.refresh_leaderboard_ranks_task.delay')
+    @mock.patch('time.sleep')
+    def test_runs_real_stages_and_reports_metrics(self, sleep, refresh):
+        with mock.patch.object(analyze_player_background, 'update_state') as update_state:
+            result = analyze_player_background.apply(args=['ahmed_dz']).get()
+
+        sleep.assert_not_called()
+        self.assertEqual([call.kwargs['meta']['current'] for call in update_state.call_args_list], [1, 2, 3])
+        self.assertEqual(result['stats']['total_games'], 3)
+        self.assertEqual((result['stats']['wins'], result['stats']['draws'], result['stats']['losses']), (1, 1, 1))
+        self.assertEqual((result['stats']['as_white']['games'], result['stats']['as_black']['games']), (2, 1))
+
+        stages = result['metrics']['stages']
+        self.assertEqual(list(stages), ['load_games', 'aggregate', 'persist'])
+        self.assertEqual([stages[name]['rows'] for name in stages], [3, 3, 4])
+        self.assertTrue(all(stage['seconds'] >= 0 for stage in stages.values()))
+        self.assertGreaterEqual(result['metrics']['total_seconds'], sum(s['seconds'] for s in stages.values()))
+        refresh.assert_called_once_with()
+
+    @mock.patch('analysis.tasks.refresh_leaderboard_ranks_task.delay')
+    def test_persist_matches_full_rebuild(self, refresh):
+        # افتتاح لم تعد له مباريات، وتجميعات يومية ناقصة
+        OpeningStat.objects.create(player=self.player, opening_name='قديم', eco_code='A00', games_played=4)
+        PerformanceBucket.objects.filter(player=self.player).delete()
+        with mock.patch.object(analyze_player_background, 'update_state'):
+            analyze_player_background.apply(args=['ahmed_dz']).get()
+
+        self.assertFalse(OpeningStat.objects.filter(player=self.player, opening_name='قديم').exists())
+        after_task = stats_rows(self.player), PerformanceBucket.objects.filter(player=self.player).count()
+        GameDataProcessor().rebuild_player_stats(self.player)
+        self.assertEqual(after_task, (stats_rows(self.player),
+                                      PerformanceBucket.objects.filter(player=self.player).count()))
+        self.assertGreater(after_task[1], 0)
+
+
+class MockDataTests(IsolatedStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.player = Player.objects.create(username='ahmed_dz', current_rating=1500)
+
+    def game_rows(self, player):
+        return list(Game.objects.filter(player=player).order_by('opponent_name').values_list(
+            'opponent_name', 'opponent_rating', 'result', 'date_played', 'time_control',
+            'player_color', 'opening_eco', 'moves_count'
+        ))
+
+    def test_same_seed_generates_same_games(self):
+        other = Player.objects.create(username='fatima_alger', current_rating=1500)
+        end_date = date(2024, 3, 31)
+        generate_mock_games(self.player, 200, seed=7, end_date=end_date)
+        generate_mock_games(other, 200, seed=7, end_date=end_date)
+        self.assertEqual(self.game_rows(self.player), self.game_rows(other))
+
+        # إعادة التشغيل بنفس البذرة لا تكرر المباريات
+        again = generate_mock_games(self.player, 200, seed=7, end_date=end_date)
+        self.assertEqual((again['created'], again['skipped']), (0, 200))
+
+    def test_results_follow_elo(self):
+        rng = random.Random(1)
+        scores = {'weaker': [], 'stronger': []}
+        draws = 0
+        for index in range(5000):
+            game = build_mock_game(rng, self.player, index, 'elo', date(2024, 3, 31), 365)
+            draws += game.is_draw
+            if abs(game.opponent_rating - 1500) >= 100:
+                side = 'weaker' if game.opponent_rating < 1500 else 'stronger'
+                scores[side].append(game.player_won)
+        self.assertAlmostEqual(draws / 5000, DRAW_RATE, delta=0.02)
+        weaker = sum(scores['weaker']) / len(scores['weaker'])
+        stronger = sum(scores['stronger']) / len(scores['stronger'])
+        self.assertGreater(weaker, 0.55)
+        self.assertLess(stronger, 0.45)
+
+    def test_generated_games_are_applied_as_stats_deltas(self):
+        result = generate_mock_games(self.player, 300, seed=3, chunk_size=100)
+        self.assertEqual(result['created'], 300)
+        incremental = stats_rows(self.player)
+        self.assertEqual(incremental[1]['total_games'], 300)
+        GameDataProcessor().rebuild_player_stats(self.player)
+        self.assertEqual(stats_rows(self.player), incremental)
+
+    def test_create_test_data_command(self):
+        call_command('create_test_data', games=20, seed=5, stdout=io.StringIO())
+        players = Player.objects.filter(game__isnull=False).distinct().order_by('username')
+        self.assertEqual([player.username for player in players], ['ahmed_dz', 'fatima_alger', 'youcef_chess'])
+        self.assertEqual(PlayerStats.objects.get(player__username='youcef_chess').total_games, 20)
+
+        # نفس البذرة تولد نفس المباريات فتُتخطى كلها
+        call_command('create_test_data', games=20, seed=5, stdout=io.StringIO())
+        self.assertEqual(Game.objects.count(), 60)
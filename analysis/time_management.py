@@ -0,0 +1,142 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+from games.models import GameMoves
+from games.moves import CLOCK_UNKNOWN, unpack_clocks
+from players.leaderboard import time_class_for
+from players.models import Player
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مراحل المباراة تقريبياً حسب رقم نقلة اللاعب: الافتتاح حتى 10، الوسط حتى 30، ثم النهاية
+PHASES = ('opening', 'middlegame', 'endgame')
+PHASE_LAST_MOVE = (10, 30)
+
+# ضيق الوقت: أقل من 10% من الوقت الأساسي، وبحد أقصى 30 ثانية
+TIME_TROUBLE_FRACTION = 0.1
+TIME_TROUBLE_MAX_SECONDS = 30
+
+LOSS, DRAW, WIN = 0, 1, 2
+
+
+def parse_time_control(time_control: str) -> Optional[Tuple[int, int]]:
+    """'180+2' -> (180, 2) بالثواني، وNone للمباريات اليومية أو غير المفهومة"""
+    if not time_control or '/' in time_control:
+        return None
+    base, _, increment = time_control.partition('+')
+    try:
+        return int(base), int(increment or 0)
+    except ValueError:
+        return None
+
+
+def _result_code(player_color: str, result: str) -> int:
+    if result == '1/2-1/2':
+        return DRAW
+    won = (player_color == 'white' and result == '1-0') or (player_color == 'black' and result == '0-1')
+    return WIN if won else LOSS
+
+
+def load_clock_arrays(player: Player, time_class: str = 'all') -> Dict[str, np.ndarray]:
+    """
+    ساعات كل مباريات اللاعب في مصفوفات متصلة (استعلام واحد، دون PGN):
+    لكل نصف نقلة الساعة بالثواني (NaN إن لم تُعرف)، رقم المباراة، رقم نصف النقلة،
+    وهل هي نقلة اللاعب؛ ولكل مباراة الوقت الأساسي والزيادة والنتيجة
+    """
+    rows = GameMoves.objects.filter(game__player=player).exclude(clocks=b'').values_list(
+        'clocks', 'start_fen', 'game__player_color', 'game__result', 'game__time_control'
+    )
+
+    clocks, bases, increments, results, parities = [], [], [], [], []
+    for data, start_fen, color, result, time_control in rows.iterator(chunk_size=2000):
+        control = parse_time_control(time_control)
+        if control is None or (time_class != 'all' and time_class_for(time_control) != time_class):
+            continue
+        # نصف النقلة الأول للأبيض إلا إن بدأت المباراة من وضعية يلعب فيها الأسود
+        white_first = not start_fen or start_fen.split()[1] == 'w'
+        clocks.append(unpack_clocks(data))
+        bases.append(control[0])
+        increments.append(control[1])
+        results.append(_result_code(color, result))
+        parities.append(0 if (color == 'white') == white_first else 1)
+
+    lengths = np.array([len(c) for c in clocks], dtype=np.int64)
+    game_index = np.repeat(np.arange(len(clocks)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    ply = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+
+    raw = np.concatenate(clocks) if clocks else np.empty(0, dtype=np.uint32)
+    seconds = np.where(raw == CLOCK_UNKNOWN, np.nan, raw / 100.0)
+    parities = np.array(parities, dtype=np.int64)
+
+    return {
+        'seconds': seconds,
+        'game': game_index,
+        'ply': ply,
+        'own': (ply % 2) == parities[game_index],
+        'base': np.array(bases, dtype=np.float64),
+        'increment': np.array(increments, dtype=np.float64),
+        'result': np.array(results, dtype=np.int64),
+    }
+
+
+def _wdl(results: np.ndarray) -> Dict:
+    counts = np.bincount(results, minlength=3)
+    games = int(counts.sum())
+    return {
+        'games': games,
+        'wins': int(counts[WIN]),
+        'draws': int(counts[DRAW]),
+        'losses': int(counts[LOSS]),
+        'win_percentage': round(counts[WIN] / games * 100, 1) if games else 0
+    }
+
+
+def time_management_stats(arrays: Dict[str, np.ndarray]) -> Dict:
+    """
+    إحصاءات إدارة الوقت بعمليات متجهة على كل أنصاف النقلات معاً:
+    الوقت المستهلك لكل مرحلة، تكرار ضيق الوقت، والنتائج في سباقات الوقت
+    """
+    seconds, game, ply, own = arrays['seconds'], arrays['game'], arrays['ply'], arrays['own']
+    games = len(arrays['result'])
+    threshold = np.minimum(arrays['base'] * TIME_TROUBLE_FRACTION, TIME_TROUBLE_MAX_SECONDS)
+
+    # الوقت المستهلك في نقلة = ساعة النقلة السابقة للاعب نفسه (أو الوقت الأساسي) - ساعته الآن + الزيادة
+    previous = np.full(len(seconds), np.nan)
+    previous[2:] = seconds[:-2]
+    previous[ply < 2] = arrays['base'][game[ply < 2]]
+    spent = previous - seconds + arrays['increment'][game]
+    valid = own & ~np.isnan(spent)
+
+    move_number = ply // 2 + 1
+    phase = np.digitize(move_number, np.array(PHASE_LAST_MOVE) + 1)
+    phase_moves = np.bincount(phase[valid], minlength=len(PHASES))
+    phase_seconds = np.bincount(phase[valid], weights=np.clip(spent[valid], 0, None), minlength=len(PHASES))
+    total_seconds = phase_seconds.sum()
+
+    # ضيق الوقت: نزلت ساعة اللاعب تحت الحد في أي نقلة
+    low = seconds < threshold[game]
+    in_trouble = np.bincount(game[own & low], minlength=games) > 0
+
+    # سباق الوقت: الساعتان معاً تحت الحد (ساعة هذه النقلة وساعة الخصم في النقلة السابقة)
+    both_low = np.zeros(len(seconds), dtype=bool)
+    both_low[1:] = low[1:] & low[:-1] & (game[1:] == game[:-1])
+    scramble = np.bincount(game[both_low], minlength=games) > 0
+
+    return {
+        'games_analyzed': games,
+        'phases': {
+            name: {
+                'moves': int(phase_moves[i]),
+                'average_seconds': round(phase_seconds[i] / phase_moves[i], 1) if phase_moves[i] else 0,
+                'time_share': round(phase_seconds[i] / total_seconds * 100, 1) if total_seconds else 0
+            }
+            for i, name in enumerate(PHASES)
+        },
+        'time_trouble': {
+            'games': int(in_trouble.sum()),
+            'percentage': round(in_trouble.sum() / games * 100, 1) if games else 0,
+            'results': _wdl(arrays['result'][in_trouble])
+        },
+        'time_scrambles': _wdl(arrays['result'][scramble])
+    }
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -124,6 +126,30 @@ USE_TZ = True
 STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ذاكرة تخزين استجابات أرشيف Chess.com على القرص
+CHESS_API_CACHE_DIR = BASE_DIR / 'var' / 'chess_api_cache'
+CHESS_API_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 ميغابايت
+
+# اللقطات العمودية لمباريات كل لاعب (analysis/snapshot.py)
+GAME_SNAPSHOT_DIR = BASE_DIR / 'var' / 'snapshots'
+
+# فهرس الوضعيات: بصمات Zobrist لأول هذا العدد من أنصاف النقلات في كل مباراة (games/positions.py)
+POSITION_INDEX_MAX_PLY = 30
+
+# عمق شجرة الذخيرة لكل لاعب بأنصاف النقلات (players/repertoire.py)
+REPERTOIRE_MAX_PLY = 20
+
+# ذاكرة التخزين المؤقت لاستجابات القراءة: يجب أن تكون مشتركة بين عمليات الويب وعمال Celery
+# وأوامر الإدارة، وإلا لا يصل إبطال النسخ (players/cache.py) إلى من يخدم الطلبات.
+# الافتراضي خادم Redis نفسه الذي يستخدمه Celery (قاعدة 1)، ويمكن تغييره بـ REDIS_CACHE_URL
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+}
+
 # إعدادات Celery
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -137,3 +163,12 @@ CELERY_ENABLE_UTC = True
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 دقيقة
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 دقيقة
+
+# المهام الدورية (celery -A config beat)
+CELERY_BEAT_SCHEDULE = {
+    # الجامع الوحيد لنصوص PGN اليتيمة بعد حذف المباريات
+    'collect-orphan-pgn-blobs': {
+        'task': 'analysis.tasks.collect_orphan_pgn_blobs',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Game
+from .models import Game, GameMoves, GamePosition
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
@@ -8,3 +8,16 @@ class GameAdmin(admin.ModelAdmin):
     search_fields = ['player__username', 'opponent_name', 'opening_name']
     readonly_fields = ['player_won', 'is_draw', 'created_at']
     date_hierarchy = 'date_played'
+    # تجنب تحميل جميع نصوص PGN في قائمة اختيار
+    raw_id_fields = ['pgn_blob']
+
+@admin.register(GamePosition)
+class GamePositionAdmin(admin.ModelAdmin):
+    list_display = ['game', 'player', 'ply', 'zobrist']
+    search_fields = ['player__username']
+    raw_id_fields = ['game', 'player']
+
+@admin.register(GameMoves)
+class GameMovesAdmin(admin.ModelAdmin):
+    list_display = ['game', 'ply_count', 'start_fen']
+    raw_id_fields = ['game']
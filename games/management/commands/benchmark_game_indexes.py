@@ -0,0 +1,172 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from games.models import Game
+from players.models import OpeningStat
+
+BENCHMARK_ALIAS = 'index_benchmark'
+
+
+class Command(BaseCommand):
+    help = 'قياس أثر فهارس Game/OpeningStat على الاستعلامات الساخنة في قاعدة SQLite مؤقتة مليئة بالبيانات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1_000_000, help='عدد المباريات المولّدة')
+        parser.add_argument('--players', type=int, default=1000, help='عدد اللاعبين')
+        parser.add_argument('--repeat', type=int, default=20, help='عدد مرات تكرار كل استعلام')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='عدم حذف ملف قاعدة البيانات بعد القياس')
+
+    def handle(self, *args, **options):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connections.settings[BENCHMARK_ALIAS] = dict(
+            connections['default'].settings_dict, NAME=path, TEST={}
+        )
+
+        try:
+            self.stdout.write(f'إنشاء قاعدة البيانات في {path}...')
+            call_command('migrate', database=BENCHMARK_ALIAS, verbosity=0)
+            self._seed(options)
+
+            rng = random.Random(options['seed'])
+            player_ids = [rng.randint(1, options['players']) for _ in range(options['repeat'])]
+
+            self._set_indexes(enabled=False)
+            before = self._measure(player_ids)
+            self._set_indexes(enabled=True)
+            after = self._measure(player_ids)
+
+            self._report(before, after)
+        finally:
+            connections[BENCHMARK_ALIAS].close()
+            if options['keep']:
+                self.stdout.write(f'تم الإبقاء على {path}')
+            else:
+                os.remove(path)
+
+    def _seed(self, options):
+        """ملء الجداول بإدراج خام سريع"""
+        rng = random.Random(options['seed'])
+        now = timezone.now().isoformat()
+        start_date = date.today() - timedelta(days=3 * 365)
+        openings = [('C50', 'الافتتاح الإيطالي'), ('B20', 'دفاع الصقلي'), ('D00', 'افتتاح الملكة'),
+                    ('C60', 'الافتتاح الإسباني'), ('C00', 'دفاع الفرنسي'), ('A00', 'غير معروف')]
+
+        started = time.perf_counter()
+        connection = connections[BENCHMARK_ALIAS]
+        with transaction.atomic(using=BENCHMARK_ALIAS), connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO players_player (id, username, full_name, country, avatar_url, created_at, updated_at) '
+                'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                [(i, f'player_{i}', '', 'DZ', '', now, now) for i in range(1, options['players'] + 1)]
+            )
+
+            batch = []
+            for i in range(options['games']):
+                eco, name = rng.choice(openings)
+                batch.append((
+                    rng.randint(1, options['players']), f'opp_{i}', rng.randint(800, 2400),
+                    rng.choice(['1-0', '0-1', '1/2-1/2']),
+                    (start_date + timedelta(days=rng.randint(0, 3 * 365))).isoformat(),
+                    rng.choice(['60', '180+2', '600']), rng.choice(['white', 'black']),
+                    name, eco, rng.randint(0, 90), '', now
+                ))
+                if len(batch) == 50_000:
+                    self._insert_games(cursor, batch)
+                    batch = []
+            if batch:
+                self._insert_games(cursor, batch)
+
+            cursor.executemany(
+                'INSERT INTO players_openingstat (player_id, opening_name, eco_code, games_played, wins, '
+                'losses, draws, white_games, black_games, color_played) '
+                'VALUES (%s, %s, %s, %s, 0, 0, 0, 0, 0, %s)',
+                [(p, name, eco, rng.randint(1, 500), 'both')
+                 for p in range(1, options['players'] + 1) for eco, name in openings]
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(f'تم توليد {options["games"]} مباراة في {time.perf_counter() - started:.1f} ثانية')
+
+    def _insert_games(self, cursor, batch):
+        cursor.executemany(
+            'INSERT INTO games_game (player_id, opponent_name, opponent_rating, result, '
+            'date_played, time_control, player_color, opening_name, opening_eco, moves_count, game_url, '
+            'created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            batch
+        )
+
+    def _set_indexes(self, enabled):
+        """حذف أو إنشاء الفهارس المعرفة في Meta.indexes"""
+        connection = connections[BENCHMARK_ALIAS]
+        with connection.schema_editor() as editor:
+            for model in (Game, OpeningStat):
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _queries(self, player_id):
+        """الاستعلامات الساخنة في players/views.py و analysis/data_processor.py"""
+        games = Game.objects.using(BENCHMARK_ALIAS).filter(player_id=player_id)
+        won = Q(player_color='white', result='1-0') | Q(player_color='black', result='0-1')
+        return {
+            'recent_games': games.order_by('-date_played')[:10],
+            'color_result_totals': games.values('player_color', 'result').annotate(n=Count('id')),
+            # نفس تجميع GameDataProcessor.aggregate_openings (إعادة البناء الكاملة فقط)
+            'opening_breakdown': games.values('opening_name', 'opening_eco').annotate(
+                n=Count('id'), wins=Count('id', filter=won), as_white=Count('id', filter=Q(player_color='white'))
+            ),
+            'eco_filter': games.filter(opening_eco='B20').order_by('-date_played')[:20],
+            'most_played_openings': OpeningStat.objects.using(BENCHMARK_ALIAS).filter(
+                player_id=player_id).order_by('-games_played')[:5],
+        }
+
+    def _measure(self, player_ids):
+        """
+        زمن قاعدة البيانات وحده لكل استعلام: SQL يُترجم مرة واحدة لكل لاعب خارج القياس
+        حتى لا تطغى كلفة بناء الـ QuerySet على أثر الفهارس
+        """
+        compiled = [
+            {name: queryset.query.get_compiler(BENCHMARK_ALIAS).as_sql()
+             for name, queryset in self._queries(player_id).items()}
+            for player_id in player_ids
+        ]
+        results = {}
+        with connections[BENCHMARK_ALIAS].cursor() as cursor:
+            for name in compiled[0]:
+                started = time.perf_counter()
+                for queries in compiled:
+                    cursor.execute(*queries[name])
+                    cursor.fetchall()
+                elapsed = (time.perf_counter() - started) / len(player_ids)
+                results[name] = {
+                    'ms': elapsed * 1000,
+                    'plan': self._queries(player_ids[0])[name].explain()
+                }
+        return results
+
+    def _report(self, before, after):
+        self.stdout.write('')
+        for name in before:
+            speedup = before[name]['ms'] / after[name]['ms'] if after[name]['ms'] else float('inf')
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {before[name]["ms"]:.2f} ms -> {after[name]["ms"]:.2f} ms (x{speedup:.1f})'
+            ))
+            self.stdout.write(f'  قبل:  {before[name]["plan"]}')
+            self.stdout.write(f'  بعد:  {after[name]["plan"]}')
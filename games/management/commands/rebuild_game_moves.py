@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from players.cache import invalidate_player
+from players.models import Player
+from games.moves import rebuild_player_moves
+
+class Command(BaseCommand):
+    help = 'ترميز نقلات المباريات وساعاتها (GameMoves) من نصوص PGN المخزنة، للمباريات السابقة لهذه الميزة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='أسماء اللاعبين (الكل إن لم تُحدد)')
+
+    def handle(self, *args, **options):
+        players = Player.objects.all()
+        if options['usernames']:
+            players = players.filter(username__in=options['usernames'])
+            if not players.exists():
+                raise CommandError('لم يتم العثور على أي لاعب بهذه الأسماء')
+
+        total = 0
+        for player in players.iterator():
+            written = rebuild_player_moves(player)
+            invalidate_player(player.username)
+            total += written
+            self.stdout.write(f'{player.username}: {written} مباراة')
+
+        self.stdout.write(self.style.SUCCESS(f'تم ترميز نقلات {total} مباراة'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from players.cache import invalidate_player
+from players.models import Player
+from games.positions import max_indexed_ply, rebuild_player_positions
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس الوضعيات (بصمات Zobrist) من نصوص PGN المخزنة، للمباريات السابقة لهذه الميزة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='أسماء اللاعبين (الكل إن لم تُحدد)')
+        parser.add_argument('--max-ply', type=int, default=None,
+                            help='آخر نصف نقلة تُفهرس (الافتراضي POSITION_INDEX_MAX_PLY)')
+
+    def handle(self, *args, **options):
+        players = Player.objects.all()
+        if options['usernames']:
+            players = players.filter(username__in=options['usernames'])
+            if not players.exists():
+                raise CommandError('لم يتم العثور على أي لاعب بهذه الأسماء')
+
+        max_ply = options['max_ply'] if options['max_ply'] is not None else max_indexed_ply()
+        for player in players.iterator():
+            written = rebuild_player_positions(player, max_ply)
+            invalidate_player(player.username)
+            self.stdout.write(f'{player.username}: {written} وضعية')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'اكتمل بناء فهرس الوضعيات حتى نصف النقلة {max_ply}')
+        )
@@ -0,0 +1,82 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analysis.data_processor import GameDataProcessor
+from games.models import Game
+from players.eco import reclassify_rows
+from players.models import OpeningStat, Player
+
+
+class Command(BaseCommand):
+    help = 'إعادة تصنيف افتتاحات المباريات المخزنة من نقلاتها بجدول ECO المرفق، موزعة على عدة عمليات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='أسماء اللاعبين (الكل إن لم تُحدد)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='عدد العمليات (1 = في العملية الحالية)')
+        parser.add_argument('--batch-size', type=int, default=500, help='عدد المباريات في كل مهمة')
+
+    def handle(self, *args, **options):
+        games = Game.objects.filter(pgn_blob__isnull=False)
+        if options['usernames']:
+            players = Player.objects.filter(username__in=options['usernames'])
+            if not players.exists():
+                raise CommandError('لم يتم العثور على أي لاعب بهذه الأسماء')
+            games = games.filter(player__in=players)
+
+        rows = games.order_by('id').values_list(
+            'id', 'player_id', 'opening_eco', 'opening_name', 'pgn_blob__data'
+        ).iterator(chunk_size=options['batch_size'])
+        batches = self._batches(rows, options['batch_size'])
+
+        changed_players = set()
+        changed_games = 0
+        for changes in self._classify(batches, options['workers']):
+            Game.objects.bulk_update(
+                [Game(id=game_id, opening_eco=eco_code, opening_name=opening_name[:100])
+                 for game_id, _, eco_code, opening_name in changes],
+                ['opening_eco', 'opening_name']
+            )
+            changed_players.update(player_id for _, player_id, _, _ in changes)
+            changed_games += len(changes)
+
+        # إحصاءات الافتتاحات مفاتيحها الأسماء القديمة: تُحذف وتُبنى من جديد
+        processor = GameDataProcessor()
+        for player in Player.objects.filter(id__in=changed_players).iterator():
+            with transaction.atomic():
+                OpeningStat.objects.filter(player=player).delete()
+                processor.rebuild_player_stats(player)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'تغير تصنيف {changed_games} مباراة لـ {len(changed_players)} لاعب'
+        ))
+
+    @staticmethod
+    def _batches(rows, size):
+        """دفعات جاهزة للإرسال إلى العمليات (bytes بدل memoryview القابلة للتسلسل)"""
+        while True:
+            batch = [row[:4] + (bytes(row[4]),) for row in islice(rows, size)]
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def _classify(batches, workers):
+        """تصنيف الدفعات بالتوازي مع نافذة محدودة من المهام المعلقة، وبترتيبها"""
+        if workers <= 1:
+            yield from map(reclassify_rows, batches)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque(executor.submit(reclassify_rows, batch) for batch in islice(batches, workers * 2))
+            while pending:
+                changes = pending.popleft().result()
+                batch = next(batches, None)
+                if batch is not None:
+                    pending.append(executor.submit(reclassify_rows, batch))
+                yield changes
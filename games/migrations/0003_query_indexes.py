@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0002_alter_game_unique_together_game_game_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', '-date_played'], name='game_player_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', 'player_color', 'result'], name='game_player_color_result_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', 'opening_eco', '-date_played'], name='game_player_eco_idx'),
+        ),
+    ]
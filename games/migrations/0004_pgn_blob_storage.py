@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:13
+
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_pgn_to_blobs(apps, schema_editor):
+    """نقل نصوص PGN من جدول المباريات إلى PGNBlob مضغوطة"""
+    Game = apps.get_model('games', 'Game')
+    PGNBlob = apps.get_model('games', 'PGNBlob')
+    db_alias = schema_editor.connection.alias
+
+    games = Game.objects.using(db_alias).exclude(pgn_content='').only('id', 'pgn_content')
+    batch = []
+    for game in games.iterator(chunk_size=1000):
+        raw = game.pgn_content.encode('utf-8')
+        game.pgn_blob_id = hashlib.sha256(raw).hexdigest()
+        batch.append((game, PGNBlob(sha256=game.pgn_blob_id, data=zlib.compress(raw, 6), size=len(raw))))
+        if len(batch) == 1000:
+            _save_batch(Game, PGNBlob, db_alias, batch)
+            batch = []
+    if batch:
+        _save_batch(Game, PGNBlob, db_alias, batch)
+
+
+def _save_batch(Game, PGNBlob, db_alias, batch):
+    PGNBlob.objects.using(db_alias).bulk_create([blob for _, blob in batch], ignore_conflicts=True)
+    Game.objects.using(db_alias).bulk_update([game for game, _ in batch], ['pgn_blob'])
+
+
+def restore_pgn_content(apps, schema_editor):
+    """العكس: إعادة النصوص إلى عمود pgn_content"""
+    Game = apps.get_model('games', 'Game')
+    db_alias = schema_editor.connection.alias
+
+    games = Game.objects.using(db_alias).filter(pgn_blob__isnull=False).select_related('pgn_blob')
+    batch = []
+    for game in games.iterator(chunk_size=1000):
+        game.pgn_content = zlib.decompress(bytes(game.pgn_blob.data)).decode('utf-8')
+        batch.append(game)
+        if len(batch) == 1000:
+            Game.objects.using(db_alias).bulk_update(batch, ['pgn_content'])
+            batch = []
+    Game.objects.using(db_alias).bulk_update(batch, ['pgn_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PGNBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='البصمة')),
+                ('data', models.BinaryField(verbose_name='PGN مضغوط')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='الحجم قبل الضغط')),
+            ],
+            options={
+                'verbose_name': 'نص PGN',
+                'verbose_name_plural': 'نصوص PGN',
+            },
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='pgn_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='games', to='games.pgnblob', verbose_name='نص PGN'),
+        ),
+        # قيمة افتراضية حتى يمكن إعادة إضافة العمود عند التراجع عن الترحيل
+        migrations.AlterField(
+            model_name='game',
+            name='pgn_content',
+            field=models.TextField(default='', verbose_name='محتوى PGN'),
+        ),
+        migrations.RunPython(move_pgn_to_blobs, restore_pgn_content),
+        migrations.RemoveField(
+            model_name='game',
+            name='pgn_content',
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import re
+import zlib
+
+from django.db import migrations, models
+
+ELO_RE = {
+    'white': re.compile(r'\[WhiteElo "(\d+)"\]'),
+    'black': re.compile(r'\[BlackElo "(\d+)"\]'),
+}
+
+
+def backfill_player_rating(apps, schema_editor):
+    """قراءة تصنيف اللاعب من رؤوس PGN المخزنة"""
+    Game = apps.get_model('games', 'Game')
+    db_alias = schema_editor.connection.alias
+
+    games = Game.objects.using(db_alias).filter(pgn_blob__isnull=False).select_related('pgn_blob')
+    batch = []
+    for game in games.only('id', 'player_color', 'pgn_blob__data').iterator(chunk_size=1000):
+        pgn = zlib.decompress(bytes(game.pgn_blob.data)).decode('utf-8')
+        match = ELO_RE.get(game.player_color, ELO_RE['white']).search(pgn)
+        if match:
+            game.player_rating = int(match.group(1))
+            batch.append(game)
+        if len(batch) == 1000:
+            Game.objects.using(db_alias).bulk_update(batch, ['player_rating'])
+            batch = []
+    Game.objects.using(db_alias).bulk_update(batch, ['player_rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_pgn_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='player_rating',
+            field=models.IntegerField(blank=True, null=True, verbose_name='تصنيف اللاعب'),
+        ),
+        migrations.RunPython(backfill_player_rating, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_game_player_rating'),
+        ('players', '0008_performancebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GamePosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zobrist', models.BigIntegerField(verbose_name='بصمة Zobrist')),
+                ('ply', models.PositiveSmallIntegerField(verbose_name='نصف النقلة')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='games.game', verbose_name='المباراة')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='players.player', verbose_name='اللاعب')),
+            ],
+            options={
+                'verbose_name': 'وضعية مباراة',
+                'verbose_name_plural': 'وضعيات المباريات',
+                'indexes': [models.Index(fields=['player', 'zobrist'], name='position_player_zobrist_idx')],
+            },
+        ),
+    ]
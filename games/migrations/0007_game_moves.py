@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0006_game_position_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameMoves',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='encoded_moves', serialize=False, to='games.game', verbose_name='المباراة')),
+                ('moves', models.BinaryField(verbose_name='النقلات (uint16)')),
+                ('clocks', models.BinaryField(blank=True, default=b'', verbose_name='الساعات (uint32، أجزاء المئة من الثانية)')),
+                ('start_fen', models.CharField(blank=True, max_length=100, verbose_name='وضعية البداية')),
+            ],
+            options={
+                'verbose_name': 'نقلات مرمزة',
+                'verbose_name_plural': 'نقلات مرمزة',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0007_game_moves'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_player_eco_idx',
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', 'opening_eco', 'opening_name', 'player_color', 'result'], name='game_player_opening_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0008_game_opening_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='end_time',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='وقت انتهاء المباراة'),
+        ),
+    ]
@@ -1,6 +1,54 @@
+import hashlib
+import zlib
+from typing import Iterable
 from django.db import models
 from players.models import Player
 
+class PGNBlob(models.Model):
+    """نص PGN مضغوطاً بـ zlib ومعنوناً ببصمة SHA-256 لمحتواه (النصوص المتطابقة تُخزن مرة واحدة)"""
+    sha256 = models.CharField(max_length=64, primary_key=True, verbose_name="البصمة")
+    data = models.BinaryField(verbose_name="PGN مضغوط")
+    size = models.PositiveIntegerField(default=0, verbose_name="الحجم قبل الضغط")
+    
+    class Meta:
+        verbose_name = "نص PGN"
+        verbose_name_plural = "نصوص PGN"
+    
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def from_text(cls, text: str) -> 'PGNBlob':
+        raw = text.encode('utf-8')
+        return cls(sha256=hashlib.sha256(raw).hexdigest(), data=zlib.compress(raw, 6), size=len(raw))
+    
+    @classmethod
+    def store_for(cls, games: Iterable['Game']) -> int:
+        """حفظ نصوص PGN المعلقة لمجموعة مباريات قبل إدراجها (قبل bulk_create)"""
+        pending = {}
+        for game in games:
+            text = getattr(game, '_pending_pgn', None)
+            if text is not None and game.pgn_blob_id not in pending:
+                pending[game.pgn_blob_id] = text
+        
+        if not pending:
+            return 0
+        cls.objects.bulk_create(
+            [cls.from_text(text) for text in pending.values()],
+            ignore_conflicts=True
+        )
+        for game in games:
+            game._pending_pgn = None
+        return len(pending)
+    
+    @property
+    def text(self) -> str:
+        return zlib.decompress(bytes(self.data)).decode('utf-8')
+    
+    def __str__(self):
+        return self.sha256[:12]
+
 class Game(models.Model):
     RESULT_CHOICES = [
         ('1-0', 'فوز الأبيض'),
@@ -16,9 +64,16 @@ class Game(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE, verbose_name="اللاعب")
     opponent_name = models.CharField(max_length=50, verbose_name="اسم الخصم")
     opponent_rating = models.IntegerField(null=True, blank=True, verbose_name="تصنيف الخصم")
-    pgn_content = models.TextField(verbose_name="محتوى PGN")
+    player_rating = models.IntegerField(null=True, blank=True, verbose_name="تصنيف اللاعب")
+    # النص في جدول منفصل مضغوط حتى تبقى صفوف المباريات صغيرة؛ يُقرأ عبر pgn_content
+    pgn_blob = models.ForeignKey(
+        PGNBlob, null=True, blank=True, on_delete=models.PROTECT,
+        related_name='games', verbose_name="نص PGN"
+    )
     result = models.CharField(max_length=7, choices=RESULT_CHOICES, verbose_name="النتيجة")
     date_played = models.DateField(verbose_name="تاريخ اللعب")
+    # وقت الانتهاء (ثوانٍ منذ 1970) من أرشيف Chess.com؛ فارغ للمباريات الأقدم والوهمية
+    end_time = models.BigIntegerField(null=True, blank=True, verbose_name="وقت انتهاء المباراة")
     time_control = models.CharField(max_length=20, blank=True, verbose_name="زمن التحكم")
     player_color = models.CharField(max_length=5, choices=COLOR_CHOICES, verbose_name="لون اللاعب")
     opening_name = models.CharField(max_length=100, blank=True, verbose_name="اسم الافتتاح")
@@ -31,6 +86,33 @@ class Game(models.Model):
         verbose_name = "مباراة"
         verbose_name_plural = "المباريات"
         unique_together = ['player', 'opponent_name', 'date_played', 'time_control']
+        indexes = [
+            # آخر المباريات: filter(player).order_by('-date_played')
+            models.Index(fields=['player', '-date_played'], name='game_player_date_idx'),
+            # التجميع حسب اللون والنتيجة
+            models.Index(fields=['player', 'player_color', 'result'], name='game_player_color_result_idx'),
+            # تجميع الافتتاحات في إعادة البناء (aggregate_openings) من الفهرس وحده دون قراءة الصفوف،
+            # والترشيح حسب رمز ECO
+            models.Index(fields=['player', 'opening_eco', 'opening_name', 'player_color', 'result'],
+                         name='game_player_opening_idx'),
+        ]
+    
+    @property
+    def pgn_content(self) -> str:
+        """نص PGN، يُحمَّل ويُفك ضغطه عند الطلب فقط"""
+        pending = getattr(self, '_pending_pgn', None)
+        if pending is not None:
+            return pending
+        return self.pgn_blob.text if self.pgn_blob_id else ''
+    
+    @pgn_content.setter
+    def pgn_content(self, text: str):
+        self.pgn_blob_id = PGNBlob.digest(text) if text else None
+        self._pending_pgn = text or None
+    
+    def save(self, *args, **kwargs):
+        PGNBlob.store_for([self])
+        super().save(*args, **kwargs)
     
     @property
     def player_won(self):
@@ -48,3 +130,46 @@ class Game(models.Model):
     
     def __str__(self):
         return f"{self.player.username} vs {self.opponent_name} ({self.date_played})"
+
+
+class GameMoves(models.Model):
+    """
+    الخط الرئيسي مرمزاً للتحليل دون PGN (games/moves.py): رمز 16 بت لكل نقلة،
+    والوقت المتبقي بعد كل نقلة في 32 بت
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True,
+                                related_name='encoded_moves', verbose_name="المباراة")
+    moves = models.BinaryField(verbose_name="النقلات (uint16)")
+    clocks = models.BinaryField(blank=True, default=b'', verbose_name="الساعات (uint32، أجزاء المئة من الثانية)")
+    # وضعية البداية إن لم تكن الافتراضية (رأس FEN)
+    start_fen = models.CharField(max_length=100, blank=True, verbose_name="وضعية البداية")
+    
+    class Meta:
+        verbose_name = "نقلات مرمزة"
+        verbose_name_plural = "نقلات مرمزة"
+    
+    @property
+    def ply_count(self) -> int:
+        return len(self.moves) // 2
+    
+    def __str__(self):
+        return f"{self.game_id} ({self.ply_count})"
+
+
+class GamePosition(models.Model):
+    """وضعية بلغتها مباراة في أنصاف نقلاتها الأولى، مفهرسة ببصمة Zobrist"""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='positions', verbose_name="المباراة")
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, verbose_name="اللاعب")
+    zobrist = models.BigIntegerField(verbose_name="بصمة Zobrist")
+    ply = models.PositiveSmallIntegerField(verbose_name="نصف النقلة")
+    
+    class Meta:
+        verbose_name = "وضعية مباراة"
+        verbose_name_plural = "وضعيات المباريات"
+        indexes = [
+            # "مبارياتي التي بلغت هذه الوضعية": بحث مساواة واحد في الفهرس
+            models.Index(fields=['player', 'zobrist'], name='position_player_zobrist_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.game_id} @ {self.ply}"
@@ -0,0 +1,140 @@
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import chess
+import chess.pgn
+import numpy as np
+from django.db import transaction
+from players.models import Player
+from players.pgn_parser import GameInfoVisitor, decode_move
+from .models import Game, GameMoves
+from .positions import resolve_game_ids
+import logging
+
+logger = logging.getLogger(__name__)
+
+# رموز النقلات (encode_move) والوقت المتبقي بعد كل نقلة بأجزاء المئة من الثانية
+MOVE_DTYPE = np.dtype('<u2')
+CLOCK_DTYPE = np.dtype('<u4')
+CLOCK_UNKNOWN = 0xFFFFFFFF
+
+
+def pack_moves(codes: Iterable[int]) -> bytes:
+    return np.asarray(list(codes), dtype=MOVE_DTYPE).tobytes()
+
+
+def pack_clocks(clocks: Iterable[Optional[int]]) -> bytes:
+    """الساعات بعد كل نقلة (CLOCK_UNKNOWN لما لا ساعة له)؛ فارغة إن لم تحمل المباراة أي [%clk]"""
+    clocks = [CLOCK_UNKNOWN if clock is None else min(clock, CLOCK_UNKNOWN - 1) for clock in clocks]
+    if all(clock == CLOCK_UNKNOWN for clock in clocks):
+        return b''
+    return np.asarray(clocks, dtype=CLOCK_DTYPE).tobytes()
+
+
+def unpack_moves(data: bytes) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=MOVE_DTYPE)
+
+
+def unpack_clocks(data: bytes) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=CLOCK_DTYPE)
+
+
+def encode_game_moves(game_info: Dict) -> Optional[Dict]:
+    """حقول GameMoves من نتيجة parse_game_pgn(record_moves=True)، أو None إن لم تُسجل نقلات"""
+    codes = game_info.get('move_codes')
+    if not codes:
+        return None
+    return {
+        'moves': pack_moves(codes),
+        'clocks': pack_clocks(game_info.get('clocks') or []),
+        'start_fen': game_info.get('start_fen') or ''
+    }
+
+
+def replay(codes: np.ndarray, start_fen: str = '') -> Iterator[Tuple[chess.Board, chess.Move]]:
+    """
+    إعادة تشغيل الخط الرئيسي من الرموز دون تحليل PGN: يُولَّد (الرقعة قبل النقلة، النقلة)
+    والرقعة نفسها تتقدم بعد كل خطوة
+    """
+    board = chess.Board(start_fen or chess.STARTING_FEN)
+    for code in codes.tolist():
+        move = decode_move(code)
+        yield board, move
+        board.push(move)
+
+
+def store_game_moves(player: Player, games: Iterable[Game]) -> int:
+    """
+    حفظ النقلات المرمزة أثناء تحليل PGN (game._moves) للمباريات المدرجة حديثاً،
+    وإرجاع عدد المباريات المحفوظة
+    """
+    games = [game for game in games if getattr(game, '_moves', None)]
+    if not games:
+        return 0
+
+    resolve_game_ids(player, games)
+    rows = [GameMoves(game_id=game.pk, **game._moves) for game in games if game.pk is not None]
+    GameMoves.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    for game in games:
+        game._moves = None
+    return len(rows)
+
+
+def rebuild_player_moves(player: Player, batch_size: int = 500) -> int:
+    """إعادة ترميز نقلات مباريات اللاعب من نصوص PGN المخزنة، وإرجاع عدد المباريات"""
+    games = Game.objects.filter(player=player, pgn_blob__isnull=False).select_related('pgn_blob').only(
+        'id', 'pgn_blob', 'pgn_blob__data'
+    ).order_by('id')
+
+    written = 0
+    with transaction.atomic():
+        GameMoves.objects.filter(game__player=player).delete()
+        rows = []
+        for game in games.iterator(chunk_size=batch_size):
+            try:
+                visitor = chess.pgn.read_game(io.StringIO(game.pgn_content),
+                                              Visitor=lambda: GameInfoVisitor(record_moves=True))
+            except Exception as e:
+                logger.error(f"خطأ في قراءة نقلات المباراة {game.id}: {e}")
+                continue
+            if visitor is None:
+                continue
+            fields = encode_game_moves({
+                'move_codes': visitor.move_codes,
+                'clocks': visitor.clocks,
+                'start_fen': visitor.headers.get('FEN', '')
+            })
+            if fields:
+                rows.append(GameMoves(game_id=game.id, **fields))
+            if len(rows) >= batch_size:
+                GameMoves.objects.bulk_create(rows)
+                written += len(rows)
+                rows = []
+        GameMoves.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def iter_player_moves(player: Player, chunk_size: int = 2000) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """(معرف المباراة، رموز النقلات، الساعات) لكل مباريات اللاعب المرمزة، بقراءة متدفقة"""
+    rows = GameMoves.objects.filter(game__player=player).order_by('game_id').values_list(
+        'game_id', 'moves', 'clocks'
+    )
+    for game_id, moves, clocks in rows.iterator(chunk_size=chunk_size):
+        yield game_id, unpack_moves(moves), unpack_clocks(clocks)
+
+
+def player_move_arrays(player: Player) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    كل نقلات اللاعب في مصفوفات متصلة للتحليل المتجه: الرموز، معرف المباراة لكل نقلة،
+    ورقم نصف النقلة داخل مباراتها
+    """
+    codes: List[np.ndarray] = []
+    game_ids: List[np.ndarray] = []
+    plies: List[np.ndarray] = []
+    for game_id, moves, _ in iter_player_moves(player):
+        codes.append(moves)
+        game_ids.append(np.full(len(moves), game_id, dtype=np.int64))
+        plies.append(np.arange(len(moves)))
+    if not codes:
+        return np.empty(0, MOVE_DTYPE), np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(codes), np.concatenate(game_ids), np.concatenate(plies)
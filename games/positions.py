@@ -0,0 +1,126 @@
+import io
+from typing import Dict, Iterable, List, Optional, Tuple
+import chess
+import chess.pgn
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from players.models import Player
+from players.pgn_parser import GameInfoVisitor, zobrist_key
+from utils.data_helpers import WON_Q, DRAW_Q
+from .models import Game, GamePosition
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def max_indexed_ply() -> int:
+    return getattr(settings, 'POSITION_INDEX_MAX_PLY', 30)
+
+
+def fen_key(fen: str) -> int:
+    """بصمة وضعية FEN، مع ValueError إن كانت غير صالحة"""
+    board = chess.Board(fen)
+    if not board.is_valid():
+        raise ValueError(f'وضعية غير قانونية: {fen}')
+    return zobrist_key(board)
+
+
+def pgn_positions(pgn_content: str, max_ply: Optional[int] = None) -> List[Tuple[int, int]]:
+    """أزواج (نصف النقلة، البصمة) لوضعيات الخط الرئيسي حتى max_ply"""
+    visitor = chess.pgn.read_game(
+        io.StringIO(pgn_content),
+        Visitor=lambda: GameInfoVisitor(position_plies=max_indexed_ply() if max_ply is None else max_ply)
+    )
+    if visitor is None:
+        return []
+    return [(ply, key) for key, ply in visitor.positions.items()]
+
+
+def resolve_game_ids(player: Player, games: List[Game]):
+    """
+    bulk_create مع ignore_conflicts لا يعيد المعرفات في كل القواعد:
+    نقرؤها باستعلام واحد بالمفتاح الفريد (الخصم، التاريخ، زمن التحكم)
+    """
+    missing = [game for game in games if game.pk is None]
+    if not missing:
+        return
+    ids = {
+        (opponent, played, time_control): pk
+        for pk, opponent, played, time_control in Game.objects.filter(
+            player=player,
+            date_played__range=(min(g.date_played for g in missing), max(g.date_played for g in missing))
+        ).values_list('id', 'opponent_name', 'date_played', 'time_control')
+    }
+    for game in missing:
+        game.pk = ids.get((game.opponent_name, game.date_played, game.time_control))
+
+
+def index_game_positions(player: Player, games: Iterable[Game]) -> int:
+    """
+    حفظ الوضعيات المجمعة أثناء تحليل PGN (game._positions) للمباريات المدرجة حديثاً،
+    وإرجاع عدد الصفوف المكتوبة
+    """
+    games = [game for game in games if getattr(game, '_positions', None)]
+    if not games:
+        return 0
+
+    resolve_game_ids(player, games)
+    rows = [
+        GamePosition(game_id=game.pk, player=player, zobrist=key, ply=ply)
+        for game in games if game.pk is not None
+        for ply, key in game._positions
+    ]
+    GamePosition.objects.bulk_create(rows, batch_size=2000)
+    for game in games:
+        game._positions = None
+    return len(rows)
+
+
+def rebuild_player_positions(player: Player, max_ply: Optional[int] = None, batch_size: int = 500) -> int:
+    """إعادة بناء فهرس وضعيات اللاعب بإعادة تشغيل نصوص PGN المخزنة"""
+    games = Game.objects.filter(player=player, pgn_blob__isnull=False).select_related('pgn_blob').only(
+        'id', 'pgn_blob', 'pgn_blob__data'
+    ).order_by('id')
+
+    written = 0
+    with transaction.atomic():
+        GamePosition.objects.filter(player=player).delete()
+        rows = []
+        for game in games.iterator(chunk_size=batch_size):
+            try:
+                positions = pgn_positions(game.pgn_content, max_ply)
+            except Exception as e:
+                logger.error(f"خطأ في قراءة نقلات المباراة {game.id}: {e}")
+                continue
+            rows.extend(GamePosition(game_id=game.id, player=player, zobrist=key, ply=ply)
+                        for ply, key in positions)
+            if len(rows) >= 5000:
+                GamePosition.objects.bulk_create(rows)
+                written += len(rows)
+                rows = []
+        GamePosition.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def games_reaching_position(player: Player, key: int, limit: int = 20) -> Dict:
+    """
+    مباريات اللاعب التي بلغت الوضعية ونتائجها: بحث مساواة في فهرس
+    (player, zobrist) ثم ربط بالمباريات، دون إعادة تشغيل أي PGN
+    """
+    games = Game.objects.filter(player=player, positions__player=player, positions__zobrist=key)
+    totals = games.aggregate(
+        total=Count('id'),
+        wins=Count('id', filter=WON_Q),
+        draws=Count('id', filter=DRAW_Q)
+    )
+    recent = list(games.select_related('player').order_by('-date_played', '-id')[:limit])
+    return {
+        'total_games': totals['total'],
+        'wins': totals['wins'],
+        'draws': totals['draws'],
+        'losses': totals['total'] - totals['wins'] - totals['draws'],
+        'win_percentage': round(totals['wins'] / totals['total'] * 100, 1) if totals['total'] else 0,
+        'games': recent
+    }
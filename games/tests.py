@@ -1,3 +1,175 @@
-from django.test import TestCase
+import io
+import zlib
+from datetime import date
 
-# Create your tests here.
+import chess
+import chess.pgn
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+
+from analysis.data_processor import GameDataProcessor
+from analysis.tasks import collect_orphan_pgn_blobs
+from players.cache import get_version, player_scope
+from utils.testing import IsolatedStorageTestCase
+from .models import Game, GameMoves, GamePosition, PGNBlob
+from .moves import CLOCK_UNKNOWN, player_move_arrays, rebuild_player_moves, replay, unpack_clocks, unpack_moves
+from .positions import fen_key, rebuild_player_positions
+
+PGN = '[White "ahmed_dz"]\n[Black "opp"]\n[Result "1-0"]\n\n1. e4 e5 2. Nf3 Nc6 1-0\n'
+
+
+class PGNBlobStorageTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def make_game(self, opponent, pgn=PGN):
+        return Game(player=self.player, opponent_name=opponent, result='1-0', player_color='white',
+                    date_played=date(2024, 3, 1), pgn_content=pgn)
+
+    def test_pgn_is_stored_compressed_and_loaded_lazily(self):
+        self.make_game('a').save()
+        blob = PGNBlob.objects.get()
+        self.assertEqual(zlib.decompress(bytes(blob.data)).decode(), PGN)
+        self.assertEqual(blob.size, len(PGN.encode()))
+
+        game = Game.objects.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(game.pgn_content, PGN)
+
+    def test_bulk_insert_deduplicates_identical_pgn(self):
+        games = [self.make_game('a'), self.make_game('b'), self.make_game('c', pgn=PGN + ' ')]
+        PGNBlob.store_for(games)
+        Game.objects.bulk_create(games)
+        self.assertEqual(PGNBlob.objects.count(), 2)
+        self.assertEqual(Game.objects.get(opponent_name='b').pgn_content, PGN)
+
+    def test_orphan_blobs_are_collected_by_the_scheduled_task(self):
+        shared, unique = self.make_game('a'), self.make_game('c', pgn=PGN + ' ')
+        for game in (shared, self.make_game('b'), unique):
+            game.save()
+
+        # حذف المباريات لا يلمس النصوص، حتى نص المباراة الوحيدة التي كانت تستخدمه
+        shared.delete()
+        unique.delete()
+        self.assertEqual(PGNBlob.objects.count(), 2)
+
+        self.assertEqual(collect_orphan_pgn_blobs(), 1)
+        self.assertEqual(list(PGNBlob.objects.values_list('sha256', flat=True)), [PGNBlob.digest(PGN)])
+        self.assertEqual(Game.objects.get().pgn_content, PGN)
+
+        self.assertIn('analysis.tasks.collect_orphan_pgn_blobs',
+                      [entry['task'] for entry in settings.CELERY_BEAT_SCHEDULE.values()])
+
+    def test_pgn_endpoint(self):
+        game = self.make_game('a')
+        game.save()
+        response = self.client.get(reverse('game_pgn', args=[game.id]))
+        self.assertEqual(response.json()['pgn'], PGN)
+        self.assertEqual(self.client.get(reverse('game_pgn', args=[game.id + 1])).status_code, 404)
+
+
+def game_data(opponent, day, moves, result='1-0', color='white'):
+    white, black = ('ahmed_dz', opponent) if color == 'white' else (opponent, 'ahmed_dz')
+    pgn = (f'[White "{white}"]\n[Black "{black}"]\n[Result "{result}"]\n'
+           f'[Date "2024.03.{day:02d}"]\n[TimeControl "180+2"]\n\n{moves} {result}\n')
+    return {'pgn': pgn, 'url': f'https://www.chess.com/game/{opponent}'}
+
+
+def fen_after(*sans):
+    board = chess.Board()
+    for san in sans:
+        board.push_san(san)
+    return board.fen()
+
+
+class PositionIndexTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        GameDataProcessor().process_games_batch(self.player, [
+            game_data('a', 1, '1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5'),
+            # تحويل إلى نفس الوضعية بترتيب نقلات مختلف
+            game_data('b', 2, '1. Nf3 Nc6 2. e4 e5 3. Bb5', '0-1', 'black'),
+            game_data('c', 3, '1. d4 d5 2. c4', '1/2-1/2'),
+        ])
+
+    def lookup(self, fen, **params):
+        return self.client.get(reverse('player_positions', args=[self.player.username]), {'fen': fen, **params})
+
+    def test_transposed_games_share_a_position(self):
+        data = self.lookup(fen_after('e4', 'e5', 'Nf3', 'Nc6')).json()
+        self.assertEqual([game['opponent_name'] for game in data['games']], ['b', 'a'])
+        self.assertEqual((data['total_games'], data['wins'], data['draws'], data['losses']), (2, 2, 0, 0))
+
+        data = self.lookup(chess.STARTING_FEN).json()
+        self.assertEqual((data['total_games'], data['wins'], data['draws'], data['losses']), (3, 2, 1, 0))
+
+    def test_only_indexes_up_to_max_ply(self):
+        with self.settings(POSITION_INDEX_MAX_PLY=2):
+            GameDataProcessor().process_games_batch(self.player, [
+                game_data('d', 4, '1. e4 e5 2. Nf3 Nc6', '0-1'),
+            ], bulk=False)
+        game = Game.objects.get(opponent_name='d')
+        self.assertEqual(sorted(game.positions.values_list('ply', flat=True)), [0, 1, 2])
+        self.assertEqual(GamePosition.objects.filter(zobrist=fen_key(fen_after('e4', 'e5', 'Nf3', 'Nc6'))).count(), 2)
+
+    def test_rebuild_matches_ingest(self):
+        rows = lambda: sorted(GamePosition.objects.values_list('game_id', 'ply', 'zobrist'))
+        indexed = rows()
+        self.assertEqual(len(indexed), 7 + 6 + 4)
+        rebuild_player_positions(self.player)
+        self.assertEqual(rows(), indexed)
+
+    def test_rejects_invalid_fen(self):
+        self.assertEqual(self.lookup('not a fen').status_code, 400)
+        self.assertEqual(self.lookup('').status_code, 400)
+
+
+class GameMovesTests(IsolatedStorageTestCase):
+    player_username = 'ahmed_dz'
+
+    MOVES = ('1. e4 {[%clk 0:03:00]} f5 {[%clk 0:02:59.5]} 2. exf5 {[%clk 0:02:58.1]} g6 '
+             '3. fxg6 {[%clk 0:02:50]} Nf6 {[%clk 0:02:40]} 4. gxh7 (4. g7 Rg8) Rg8 {[%clk 0:02:30]} '
+             '5. hxg8=Q+ {[%clk 0:02:45]}')
+
+    def setUp(self):
+        super().setUp()
+        GameDataProcessor().process_games_batch(self.player, [
+            game_data('a', 1, self.MOVES),
+            game_data('b', 2, '1. d4 d5', '1/2-1/2'),
+        ])
+
+    def test_ingest_stores_packed_moves_and_clocks(self):
+        stored = GameMoves.objects.get(game__opponent_name='a')
+        codes = unpack_moves(stored.moves)
+        self.assertEqual((codes.dtype.itemsize, stored.ply_count), (2, 9))
+
+        # المولِّد يدفع النقلة الأخيرة بعد إرجاعها، فالرقعة في النهاية هي الوضعية الأخيرة
+        for board, move in replay(codes):
+            pass
+        pgn_board = chess.pgn.read_game(io.StringIO(game_data('a', 1, self.MOVES)['pgn'])).end().board()
+        self.assertEqual(board.fen(), pgn_board.fen())
+        self.assertEqual(move.promotion, chess.QUEEN)
+
+        clocks = unpack_clocks(stored.clocks)
+        self.assertEqual(clocks[:3].tolist(), [18000, 17950, 17810])
+        self.assertEqual(clocks[3], CLOCK_UNKNOWN)
+        self.assertEqual(GameMoves.objects.get(game__opponent_name='b').clocks, b'')
+
+    def test_rebuild_matches_ingest_and_flattens_history(self):
+        rows = lambda: sorted((m.game_id, bytes(m.moves), bytes(m.clocks)) for m in GameMoves.objects.all())
+        stored = rows()
+        self.assertEqual(rebuild_player_moves(self.player), 2)
+        self.assertEqual(rows(), stored)
+
+        codes, game_ids, plies = player_move_arrays(self.player)
+        self.assertEqual(len(codes), 11)
+        self.assertEqual(plies.tolist(), list(range(9)) + [0, 1])
+        self.assertEqual(len(set(game_ids.tolist())), 2)
+
+    def test_rebuild_command_invalidates_cached_responses(self):
+        before = get_version(player_scope(self.player.username))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_game_moves', self.player.username, stdout=io.StringIO())
+        self.assertNotEqual(get_version(player_scope(self.player.username)), before)
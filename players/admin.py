@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Player, PlayerStats, OpeningStat
+from .models import (Player, PlayerStats, OpeningStat, PlayerSyncState, LeaderboardEntry,
+                     PerformanceBucket, RepertoireNode)
 
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
@@ -19,3 +20,30 @@ class OpeningStatAdmin(admin.ModelAdmin):
     list_display = ['player', 'opening_name', 'eco_code', 'games_played', 'win_rate']
     list_filter = ['eco_code', 'color_played']
     search_fields = ['opening_name', 'player__username']
+
+@admin.register(PlayerSyncState)
+class PlayerSyncStateAdmin(admin.ModelAdmin):
+    list_display = ['player', 'last_archive_month', 'last_game_end_time', 'last_synced_at']
+    search_fields = ['player__username']
+    readonly_fields = ['last_synced_at']
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ['rank', 'player', 'time_class', 'country', 'total_games', 'win_percentage']
+    list_filter = ['time_class', 'country']
+    search_fields = ['player__username']
+    readonly_fields = ['win_percentage', 'rank', 'updated_at']
+
+@admin.register(PerformanceBucket)
+class PerformanceBucketAdmin(admin.ModelAdmin):
+    list_display = ['player', 'time_class', 'day', 'games', 'wins', 'draws', 'losses', 'rating']
+    list_filter = ['time_class']
+    search_fields = ['player__username']
+    date_hierarchy = 'day'
+
+@admin.register(RepertoireNode)
+class RepertoireNodeAdmin(admin.ModelAdmin):
+    list_display = ['player', 'color', 'ply', 'san', 'games', 'wins', 'draws', 'losses']
+    list_filter = ['color']
+    search_fields = ['player__username']
+    raw_id_fields = ['player', 'parent']
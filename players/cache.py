@@ -0,0 +1,117 @@
+import hashlib
+import time
+from functools import wraps
+from typing import Callable, Optional
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مدة بقاء الاستجابة المخزنة؛ الصلاحية الفعلية يحددها رقم النسخة
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+LEADERBOARD_SCOPE = 'leaderboard'
+
+
+def player_scope(username: str) -> str:
+    return f'player:{username}'
+
+
+def _version_key(scope: str) -> str:
+    return f'cache_version:{scope}'
+
+
+def get_version(scope: str) -> Optional[int]:
+    """
+    رقم النسخة الحالي للنطاق. يبدأ من طابع زمني لا من 1 حتى لا تعود
+    استجابات قديمة للحياة إن حُذف مفتاح النسخة وحده من الذاكرة
+
+    يُرجع None إن تعذر الوصول إلى الذاكرة المؤقتة
+    """
+    key = _version_key(scope)
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key, 0)
+    except Exception as e:
+        logger.warning(f"تعذر قراءة نسخة النطاق {scope} من الذاكرة المؤقتة: {str(e)}")
+        return None
+    return version
+
+
+def bump_version(scope: str):
+    """إبطال كل الاستجابات المخزنة للنطاق بتغيير رقم نسخته"""
+    key = _version_key(scope)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    except Exception as e:
+        logger.error(f"تعذر إبطال استجابات النطاق {scope}: {str(e)}")
+
+
+def invalidate_player(username: str):
+    """إبطال استجابات اللاعب ولوحة الصدارة بعد نجاح المعاملة الحالية"""
+    def bump():
+        bump_version(player_scope(username))
+        bump_version(LEADERBOARD_SCOPE)
+    transaction.on_commit(bump)
+
+
+def invalidate_leaderboard():
+    """إبطال استجابات لوحة الصدارة بعد نجاح المعاملة الحالية"""
+    transaction.on_commit(lambda: bump_version(LEADERBOARD_SCOPE))
+
+
+def cached_view(scope: Callable[..., str]):
+    """
+    تخزين استجابات GET الناجحة حسب نسخة النطاق ومعاملات الطلب، مع ETag:
+    إن طابق If-None-Match النسخة الحالية يُرد 304 دون قراءة قاعدة البيانات
+
+    scope: دالة تأخذ معاملات المسار وتُرجع اسم النطاق، مثل player_scope
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scope_name = scope(*args, **kwargs)
+            version = get_version(scope_name)
+            if version is None:
+                # الذاكرة المؤقتة غير متاحة: خدمة الطلب من قاعدة البيانات مباشرة
+                return view(request, *args, **kwargs)
+
+            query = request.META.get('QUERY_STRING', '')
+            fingerprint = hashlib.md5(
+                f'{view.__name__}:{scope_name}:{version}:{query}'.encode()
+            ).hexdigest()
+            etag = f'"{fingerprint}"'
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            key = f'view:{fingerprint}'
+            try:
+                data = cache.get(key)
+            except Exception as e:
+                logger.warning(f"تعذر قراءة الاستجابة المخزنة {key}: {str(e)}")
+                data = None
+            if data is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                try:
+                    cache.set(key, data, RESPONSE_CACHE_TIMEOUT)
+                except Exception as e:
+                    logger.warning(f"تعذر تخزين الاستجابة {key}: {str(e)}")
+
+            return Response(data, headers=headers)
+        return wrapper
+    return decorator
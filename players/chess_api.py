@@ -1,30 +1,158 @@
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import math
+import threading
 import time
-from typing import List, Dict, Optional
-import chess.pgn
-import io
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional
 import logging
 
+from .eco import default_eco_table, read_classified
+from .http_cache import ArchiveCache, is_archive_immutable
+from .pgn_parser import parse_game_pgn, resolve_opening, UNKNOWN_OPENING, UNKNOWN_ECO
+
 logger = logging.getLogger(__name__)
 
+class TokenBucket:
+    """محدد معدل طلبات (token bucket) مشترك بين الخيوط"""
+    
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """الانتظار حتى يتوفر رمز ثم استهلاكه"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait)
+
+class ArchiveResult(NamedTuple):
+    """نتيجة جلب أرشيف شهري"""
+    url: str
+    games: List[Dict]
+    changed: bool  # False عند الرد من الذاكرة (شهر مكتمل أو 304)
+    ingested: bool  # هل أُدخل هذا المحتوى نفسه إلى قاعدة البيانات سابقاً؟
+    error: Optional[str] = None  # سبب فشل الجلب؛ القائمة الفارغة عندها لا تعني شهراً فارغاً
+    
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+    
+    @property
+    def needs_ingest(self) -> bool:
+        """الأرشيف تغيّر أو لم يُدخل بعد"""
+        return self.changed or not self.ingested
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After بالثواني أو كتاريخ HTTP -> ثوانٍ غير سالبة، أو None إن تعذرت قراءته"""
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return max(seconds, 0.0)
+    # nan و inf والقيم السالبة ليست مدداً صالحة
+    if not math.isfinite(seconds) or seconds < 0:
+        return None
+    return seconds
+
+
 class ChessComAPI:
     """كلاس متقدم للتعامل مع Chess.com API"""
     
     BASE_URL = "https://api.chess.com/pub"
     
-    def __init__(self):
+    # رموز الحالة التي يُعاد عندها الطلب مع تأخير متزايد
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, base_url: Optional[str] = None, max_workers: int = 4,
+                 requests_per_second: float = 5.0, burst: int = 2,
+                 max_retries: int = 3, backoff_factor: float = 0.5, timeout: float = 15,
+                 cache: Optional[ArchiveCache] = None, max_backoff: float = 60):
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        # سقف أي انتظار قبل إعادة المحاولة، مهما طلب Retry-After
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        # ذاكرة تخزين دائمة لاستجابات الأرشيف الشهري (اختيارية)
+        self.cache = cache
+        # محدد معدل واحد مشترك بين جميع خيوط الجلب
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(max_workers, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'DZ Chess Analyzer/1.0 (contact@dzchess.ai)'
         })
     
+    def _get(self, url: str, headers: Optional[Dict] = None) -> requests.Response:
+        """طلب GET مع Rate Limiting وإعادة المحاولة عند 429/5xx"""
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            
+            if response is not None and (
+                response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries
+            ):
+                response.raise_for_status()
+                return response
+            
+            delay = self._retry_delay(response, attempt)
+            logger.warning(f"إعادة محاولة {url} بعد {delay:.2f} ثانية (المحاولة {attempt + 1})")
+            time.sleep(delay)
+            attempt += 1
+    
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int) -> float:
+        """
+        مدة الانتظار قبل إعادة المحاولة: Retry-After (ثوانٍ أو تاريخ HTTP) إن كان صالحاً
+        وإلا تأخير أسي، وفي الحالتين لا تتجاوز max_backoff
+        """
+        delay = None
+        if response is not None and response.headers.get('Retry-After'):
+            delay = parse_retry_after(response.headers['Retry-After'])
+            if delay is None:
+                logger.warning(f"قيمة Retry-After غير صالحة: {response.headers['Retry-After']!r}")
+        if delay is None:
+            delay = self.backoff_factor * (2 ** attempt)
+        return min(delay, self.max_backoff)
+    
     def get_player_info(self, username: str) -> Optional[Dict]:
         """جلب معلومات اللاعب الأساسية"""
         try:
-            response = self.session.get(f"{self.BASE_URL}/player/{username}")
-            response.raise_for_status()
-            return response.json()
+            return self._get(f"{self.base_url}/player/{username}").json()
         except requests.RequestException as e:
             logger.error(f"خطأ في جلب معلومات اللاعب {username}: {e}")
             return None
@@ -32,9 +160,7 @@ class ChessComAPI:
     def get_player_stats(self, username: str) -> Optional[Dict]:
         """جلب إحصاءات اللاعب (تصنيفات مختلف الأنماط)"""
         try:
-            response = self.session.get(f"{self.BASE_URL}/player/{username}/stats")
-            response.raise_for_status()
-            return response.json()
+            return self._get(f"{self.base_url}/player/{username}/stats").json()
         except requests.RequestException as e:
             logger.error(f"خطأ في جلب إحصاءات اللاعب {username}: {e}")
             return None
@@ -42,8 +168,7 @@ class ChessComAPI:
     def get_game_archives(self, username: str) -> List[str]:
         """جلب قائمة أرشيف المباريات الشهرية"""
         try:
-            response = self.session.get(f"{self.BASE_URL}/player/{username}/games/archives")
-            response.raise_for_status()
+            response = self._get(f"{self.base_url}/player/{username}/games/archives")
             return response.json().get('archives', [])
         except requests.RequestException as e:
             logger.error(f"خطأ في جلب أرشيف المباريات للاعب {username}: {e}")
@@ -51,109 +176,126 @@ class ChessComAPI:
     
     def get_monthly_games(self, archive_url: str) -> List[Dict]:
         """جلب مباريات شهر محدد مع Rate Limiting"""
+        return self.fetch_archive(archive_url).games
+    
+    def fetch_archive(self, archive_url: str) -> ArchiveResult:
+        """
+        جلب أرشيف شهري مع التخزين الشرطي:
+        الأشهر المكتملة تُقرأ من الذاكرة مباشرة، والشهر الحالي يُعاد التحقق منه
+        بـ If-None-Match / If-Modified-Since
+        """
+        entry = self.cache.get(archive_url) if self.cache else None
+        
+        if entry and entry.get('immutable'):
+            return ArchiveResult(archive_url, entry['games'], False, entry.get('ingested', False))
+        
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
         try:
-            # تأخير لتجنب Rate Limiting
-            time.sleep(0.2)
-            response = self.session.get(archive_url)
-            response.raise_for_status()
-            return response.json().get('games', [])
-        except requests.RequestException as e:
+            response = self._get(archive_url, headers=headers or None)
+            
+            if response.status_code == 304 and entry:
+                return ArchiveResult(archive_url, entry['games'], False, entry.get('ingested', False))
+            
+            games = response.json().get('games', [])
+        except (requests.RequestException, ValueError) as e:
             logger.error(f"خطأ في جلب المباريات من {archive_url}: {e}")
-            return []
+            return ArchiveResult(archive_url, [], False, False, error=str(e))
+        
+        if self.cache:
+            self.cache.set(archive_url, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'immutable': is_archive_immutable(archive_url),
+                'ingested': False,
+                'games': games
+            })
+        
+        return ArchiveResult(archive_url, games, True, False)
     
-    def get_recent_games(self, username: str, months_count: int = 3) -> List[Dict]:
-        """جلب المباريات الأخيرة للاعب"""
+    def fetch_archives(self, archive_urls: List[str], concurrent: bool = True) -> Iterator[ArchiveResult]:
+        """
+        توليد الأرشيفات شهراً بشهر بترتيبها، مع جلب بالتوازي ضمن نافذة محدودة
+        (لا يبقى في الذاكرة أكثر من max_workers شهراً قيد الانتظار)
+        """
+        if not concurrent or len(archive_urls) <= 1:
+            for url in archive_urls:
+                yield self.fetch_archive(url)
+            return
+        
+        urls = iter(archive_urls)
+        workers = min(self.max_workers, len(archive_urls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque(executor.submit(self.fetch_archive, url) for url in islice(urls, workers))
+            while pending:
+                result = pending.popleft().result()
+                next_url = next(urls, None)
+                if next_url is not None:
+                    pending.append(executor.submit(self.fetch_archive, next_url))
+                if not result.failed:
+                    logger.info(f"تم جلب {len(result.games)} مباراة من {result.url}"
+                                f"{'' if result.changed else ' (من الذاكرة)'}")
+                yield result
+    
+    def iter_recent_archives(self, username: str, months_count: int = 3,
+                             concurrent: bool = True) -> Iterator[ArchiveResult]:
+        """توليد آخر N أرشيفات شهرية للاعب بترتيبها"""
         archives = self.get_game_archives(username)
         if not archives:
-            return []
+            return
         
         # أخذ آخر N أشهر
         recent_archives = archives[-months_count:]
-        all_games = []
-        
         logger.info(f"جلب مباريات {username} من {len(recent_archives)} أشهر")
         
-        for archive_url in recent_archives:
-            monthly_games = self.get_monthly_games(archive_url)
-            all_games.extend(monthly_games)
-            logger.info(f"تم جلب {len(monthly_games)} مباراة من {archive_url}")
-        
-        return all_games
+        yield from self.fetch_archives(recent_archives, concurrent)
     
-    def parse_pgn_info(self, pgn_content: str, target_username: str) -> Optional[Dict]:
+    def get_recent_archives(self, username: str, months_count: int = 3,
+                            concurrent: bool = True) -> List[ArchiveResult]:
+        """جلب آخر N أرشيفات شهرية (بالتوازي افتراضياً مع الحفاظ على ترتيب الأرشيف)"""
+        return list(self.iter_recent_archives(username, months_count, concurrent))
+    
+    def iter_recent_games(self, username: str, months_count: int = 3,
+                          concurrent: bool = True) -> Iterator[Dict]:
+        """توليد مباريات اللاعب شهراً بشهر دون تجميعها كلها في الذاكرة"""
+        for result in self.iter_recent_archives(username, months_count, concurrent):
+            yield from result.games
+    
+    def get_recent_games(self, username: str, months_count: int = 3,
+                         concurrent: bool = True) -> List[Dict]:
+        """جلب المباريات الأخيرة للاعب"""
+        return list(self.iter_recent_games(username, months_count, concurrent))
+    
+    def mark_archives_ingested(self, archive_urls: List[str]):
+        """تسجيل أن هذه الأرشيفات أُدخلت حتى تُتخطى إن لم تتغير لاحقاً"""
+        if not self.cache:
+            return
+        for url in archive_urls:
+            self.cache.mark_ingested(url)
+    
+    def parse_pgn_info(self, pgn_content: str, target_username: str,
+                       headers_only: bool = False) -> Optional[Dict]:
         """تحليل معلومات PGN واستخراج البيانات المهمة"""
-        try:
-            pgn_io = io.StringIO(pgn_content)
-            game = chess.pgn.read_game(pgn_io)
-            
-            if not game:
-                return None
-            
-            headers = game.headers
-            
-            # تحديد لون اللاعب المستهدف
-            white_player = headers.get('White', '').lower()
-            black_player = headers.get('Black', '').lower()
-            target_username_lower = target_username.lower()
-            
-            if target_username_lower in white_player:
-                player_color = 'white'
-                opponent = headers.get('Black', 'مجهول')
-            elif target_username_lower in black_player:
-                player_color = 'black'
-                opponent = headers.get('White', 'مجهول')
-            else:
-                return None
-            
-            # تحويل التاريخ
-            date_str = headers.get('Date', '')
-            try:
-                date_obj = datetime.strptime(date_str, '%Y.%m.%d').date()
-            except (ValueError, TypeError):
-                date_obj = datetime.now().date()
-            
-            # استخراج معلومات إضافية
-            time_control = headers.get('TimeControl', '')
-            termination = headers.get('Termination', '')
-            opening = headers.get('ECO', '')
-            
-            # حساب عدد النقلات
-            moves_count = len(list(game.mainline_moves()))
-            
-            # تحديد النتيجة النهائية
-            result = headers.get('Result', '1/2-1/2')
-            
-            return {
-                'opponent': opponent,
-                'result': result,
-                'date': date_obj,
-                'time_control': time_control,
-                'player_color': player_color,
-                'termination': termination,
-                'opening_eco': opening,
-                'moves_count': moves_count,
-                'pgn_content': pgn_content
-            }
-            
-        except Exception as e:
-            logger.error(f"خطأ في تحليل PGN: {e}")
-            return None
+        return parse_game_pgn(pgn_content, target_username, headers_only=headers_only,
+                              eco_table=None if headers_only else default_eco_table())
     
     def extract_opening_name(self, pgn_content: str) -> tuple[str, str]:
-        """استخراج اسم الافتتاح ورمز ECO"""
+        """استخراج اسم الافتتاح ورمز ECO من النقلات، ومن الرؤوس إن لم يُعرف الخط"""
         try:
-            pgn_io = io.StringIO(pgn_content)
-            game = chess.pgn.read_game(pgn_io)
-            
-            if not game:
-                return "غير معروف", "???"
+            # الرؤوس والتصنيف من المرور نفسه، فلا تُقرأ المباراة مرة ثانية للاحتياط بالرؤوس
+            visitor = read_classified(pgn_content)
             
-            headers = game.headers
-            eco_code = headers.get('ECO', '???')
-            opening_name = headers.get('Opening', 'غير معروف')
+            if visitor is None:
+                return UNKNOWN_OPENING, UNKNOWN_ECO
             
+            eco_code, opening_name = resolve_opening(visitor)
             return opening_name, eco_code
             
         except Exception as e:
             logger.error(f"خطأ في استخراج الافتتاح: {e}")
-            return "غير معروف", "???"
+            return UNKNOWN_OPENING, UNKNOWN_ECO
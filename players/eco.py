@@ -0,0 +1,109 @@
+import csv
+import io
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import chess
+import chess.pgn
+from .pgn_parser import ECO_CODE_RE, GameInfoVisitor, resolve_opening, zobrist_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+# جدول ECO المرفق: أعمدة eco و name و pgn (نفس صيغة جداول lichess المفتوحة)
+ECO_TABLE_PATH = Path(__file__).resolve().parent / 'data' / 'eco.tsv'
+
+Opening = Tuple[str, str]
+
+
+class EcoTable:
+    """
+    جدول ECO مجمّع في خريطة بصمة Zobrist -> (الرمز، الاسم) لوضعية نهاية كل خط:
+    التصنيف بحث في القاموس لكل وضعية أثناء إعادة تشغيل النقلات، ويلتقط التحويلات أيضاً
+    """
+
+    def __init__(self, openings: Dict[int, Opening], max_ply: int, code_plies: Optional[Dict[str, int]] = None):
+        self.openings = openings
+        # لا فائدة من البحث بعد أعمق خط في الجدول
+        self.max_ply = max_ply
+        # أقل عمق (بأنصاف النقلات) يظهر عنده كل رمز في الجدول
+        self.code_plies = code_plies or {}
+
+    def __len__(self) -> int:
+        return len(self.openings)
+
+    def get(self, key: int) -> Optional[Opening]:
+        return self.openings.get(key)
+
+    def header_is_more_precise(self, header_eco: str, table_eco: str, table_ply: int) -> bool:
+        """
+        هل رمز رأس ECO أدق من تطابق الجدول؟ نعم إن كان الجدول يطابق عائلته فقط
+        (E90 مقابل E97 في الرأس) أو بلغ وضعية أقل عمقاً من أول خطوط رمز الرأس
+        (B20 عند نصف النقلة 2 مقابل B90 في الرأس)
+        """
+        if header_eco == table_eco or not ECO_CODE_RE.match(header_eco):
+            return False
+        if header_eco.startswith(table_eco.rstrip('0')):
+            return True
+        return self.code_plies.get(header_eco, 0) > table_ply
+
+    @classmethod
+    def from_tsv(cls, path: Path) -> 'EcoTable':
+        openings = {}
+        code_plies = {}
+        max_ply = 0
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                board = chess.Board()
+                for token in row['pgn'].split():
+                    if not token.endswith('.'):
+                        board.push_san(token)
+                # عند تطابق وضعيتين يبقى الخط الأول في الجدول
+                openings.setdefault(zobrist_key(board), (row['eco'], row['name']))
+                code_plies[row['eco']] = min(code_plies.get(row['eco'], board.ply()), board.ply())
+                max_ply = max(max_ply, board.ply())
+        return cls(openings, max_ply, code_plies)
+
+
+@lru_cache(maxsize=None)
+def default_eco_table() -> EcoTable:
+    """الجدول المرفق، يُجمَّع مرة واحدة لكل عملية"""
+    table = EcoTable.from_tsv(ECO_TABLE_PATH)
+    logger.info(f"تم تحميل جدول ECO: {len(table)} وضعية حتى نصف النقلة {table.max_ply}")
+    return table
+
+
+def classify_pgn(pgn_content: str, table: Optional[EcoTable] = None) -> Optional[Opening]:
+    """
+    تصنيف مباراة من نقلاتها: أعمق وضعية في الجدول بلغها الخط الرئيسي (ما لم يكن
+    رمز رأس ECO أدق منها)، أو None إن لم تبلغ أي وضعية فيه
+    """
+    visitor = read_classified(pgn_content, table)
+    if visitor is None or not visitor.opening:
+        return None
+    return resolve_opening(visitor)
+
+
+def read_classified(pgn_content: str, table: Optional[EcoTable] = None) -> Optional[GameInfoVisitor]:
+    """مرور واحد على المباراة يجمع رؤوسها وتصنيف الجدول معاً (None إن لم تكن فيها مباراة)"""
+    if table is None:
+        table = default_eco_table()
+    return chess.pgn.read_game(io.StringIO(pgn_content), Visitor=lambda: GameInfoVisitor(eco_table=table))
+
+
+def reclassify_rows(rows: List[tuple]) -> List[tuple]:
+    """
+    عامل إعادة التصنيف (يُشغَّل في عملية منفصلة، فلا يلمس قاعدة البيانات):
+    صفوف (game_id, player_id, eco, name, PGN مضغوط) -> المباريات التي تغير تصنيفها فقط
+    """
+    changed = []
+    for game_id, player_id, eco_code, opening_name, data in rows:
+        try:
+            opening = classify_pgn(zlib.decompress(data).decode('utf-8'))
+        except Exception as e:
+            logger.error(f"خطأ في تصنيف المباراة {game_id}: {e}")
+            continue
+        if opening and opening != (eco_code, opening_name):
+            changed.append((game_id, player_id) + opening)
+    return changed
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, F, IntegerField, Q, Value, When
+from games.models import Game
+from .leaderboard import time_class_for
+from .models import PerformanceBucket, Player
+import logging
+
+logger = logging.getLogger(__name__)
+
+# حقول المباراة اللازمة للتجميع، بترتيب الصفوف التي تأخذها rollup_rows
+HISTORY_FIELDS = ('date_played', 'time_control', 'player_color', 'result', 'opponent_rating', 'player_rating',
+                  'end_time')
+
+COUNTER_FIELDS = ('games', 'wins', 'draws', 'losses', 'opponent_rating_sum', 'rated_games')
+
+PERIODS = ('day', 'week', 'month')
+
+
+def _empty_bucket() -> Dict:
+    return dict.fromkeys(COUNTER_FIELDS, 0) | {'rating': None, 'rating_end_time': None}
+
+
+def _result_field(player_color: str, result: str) -> str:
+    if result == '1/2-1/2':
+        return 'draws'
+    won = (player_color == 'white' and result == '1-0') or (player_color == 'black' and result == '0-1')
+    return 'wins' if won else 'losses'
+
+
+def rollup_rows(rows: Iterable[tuple]) -> Dict[Tuple[str, date], Dict]:
+    """
+    تجميع صفوف HISTORY_FIELDS إلى {(الفئة الزمنية, اليوم): عدادات}؛
+    التصنيف المسجل هو تصنيف المباراة الأحدث انتهاءً (وعند غياب وقت الانتهاء
+    أو تساويه: آخر مباراة في الترتيب المعطى)
+    """
+    buckets = defaultdict(_empty_bucket)
+    for played, time_control, color, result, opponent_rating, player_rating, end_time in rows:
+        for time_class in ('all', time_class_for(time_control)):
+            if not time_class:
+                continue
+            bucket = buckets[(time_class, played)]
+            bucket['games'] += 1
+            bucket[_result_field(color, result)] += 1
+            if opponent_rating:
+                bucket['opponent_rating_sum'] += opponent_rating
+                bucket['rated_games'] += 1
+            if player_rating and (end_time or 0) >= (bucket['rating_end_time'] or 0):
+                bucket['rating'] = player_rating
+                bucket['rating_end_time'] = end_time
+    return buckets
+
+
+def apply_history_delta(player: Player, new_games: Iterable[Game]):
+    """إضافة المباريات المدرجة حديثاً إلى التجميعات اليومية"""
+    rows = (tuple(getattr(game, field) for field in HISTORY_FIELDS) for game in new_games)
+    for (time_class, day), delta in rollup_rows(rows).items():
+        if _increment_bucket(player, time_class, day, delta):
+            continue
+        try:
+            with transaction.atomic():
+                PerformanceBucket.objects.create(player=player, time_class=time_class, day=day, **delta)
+        except IntegrityError:
+            _increment_bucket(player, time_class, day, delta)
+
+
+def _increment_bucket(player: Player, time_class: str, day: date, delta: Dict) -> bool:
+    """
+    زيادة عدادات اليوم ذرياً، وإرجاع False إن لم يكن موجوداً؛ التصنيف لا يُستبدل
+    إلا بتصنيف مباراة انتهت بعد (أو مع) المباراة المسجلة، بنفس قاعدة rollup_rows
+    """
+    updates = {field: F(field) + delta[field] for field in COUNTER_FIELDS}
+    if delta['rating'] is not None:
+        newer = Q(rating_end_time__isnull=True) | Q(rating_end_time__lte=delta['rating_end_time'] or 0)
+        updates['rating'] = Case(
+            When(newer, then=Value(delta['rating'])), default=F('rating'), output_field=IntegerField()
+        )
+        updates['rating_end_time'] = Case(
+            When(newer, then=Value(delta['rating_end_time'])), default=F('rating_end_time'),
+            output_field=BigIntegerField()
+        )
+    updated = PerformanceBucket.objects.filter(player=player, time_class=time_class, day=day).update(**updates)
+    return updated > 0
+
+
+def rebuild_history(player: Player):
+    """إعادة بناء التجميعات اليومية للاعب من جميع مبارياته"""
+    rows = Game.objects.filter(player=player).order_by(
+        'date_played', F('end_time').asc(nulls_first=True), 'id'
+    ).values_list(*HISTORY_FIELDS)
+    buckets = rollup_rows(rows.iterator(chunk_size=5000))
+
+    with transaction.atomic():
+        PerformanceBucket.objects.filter(player=player).delete()
+        PerformanceBucket.objects.bulk_create(
+            [PerformanceBucket(player=player, time_class=time_class, day=day, **counts)
+             for (time_class, day), counts in buckets.items()],
+            batch_size=1000
+        )
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'week':
+        return date.fromordinal(day.toordinal() - day.weekday())
+    return day
+
+
+def performance_history(player: Player, time_class: str = 'all', period: str = 'day',
+                        date_from: Optional[date] = None, date_to: Optional[date] = None) -> List[Dict]:
+    """
+    سلسلة الأداء الزمنية من التجميعات اليومية (قراءة نطاق واحدة عبر الفهرس الفريد)،
+    مع دمج الأيام في أسابيع أو أشهر عند الطلب
+    """
+    buckets = PerformanceBucket.objects.filter(player=player, time_class=time_class)
+    if date_from:
+        buckets = buckets.filter(day__gte=date_from)
+    if date_to:
+        buckets = buckets.filter(day__lte=date_to)
+
+    series = {}
+    for bucket in buckets.order_by('day').values('day', 'rating', *COUNTER_FIELDS):
+        start = _period_start(bucket['day'], period)
+        point = series.setdefault(start, _empty_bucket())
+        for field in COUNTER_FIELDS:
+            point[field] += bucket[field]
+        if bucket['rating'] is not None:
+            point['rating'] = bucket['rating']
+
+    return [
+        {
+            'period_start': start,
+            'games': point['games'],
+            'wins': point['wins'],
+            'draws': point['draws'],
+            'losses': point['losses'],
+            'win_percentage': round(point['wins'] / point['games'] * 100, 1) if point['games'] else 0,
+            'average_opponent_rating': (
+                round(point['opponent_rating_sum'] / point['rated_games']) if point['rated_games'] else None
+            ),
+            'rating': point['rating']
+        }
+        for start, point in series.items()
+    ]
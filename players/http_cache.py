@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# .../games/2024/05 في نهاية رابط الأرشيف الشهري
+_ARCHIVE_MONTH_RE = re.compile(r'/games/(\d{4})/(\d{2})/?$')
+
+# مهلة بعد نهاية الشهر قبل اعتبار أرشيفه نهائياً (مباريات تنتهي بعد منتصف الليل)
+IMMUTABLE_GRACE = timedelta(hours=6)
+
+
+def archive_month(archive_url: str) -> Optional[tuple]:
+    """استخراج (السنة، الشهر) من رابط الأرشيف"""
+    match = _ARCHIVE_MONTH_RE.search(archive_url)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def is_archive_immutable(archive_url: str, now: Optional[datetime] = None) -> bool:
+    """الأشهر المكتملة لا تتغير أبداً؛ الشهر الحالي ما زال ينمو"""
+    month = archive_month(archive_url)
+    if month is None:
+        return False
+
+    year, month_number = month
+    if month_number == 12:
+        month_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        month_end = datetime(year, month_number + 1, 1, tzinfo=timezone.utc)
+
+    now = now or datetime.now(timezone.utc)
+    return now >= month_end + IMMUTABLE_GRACE
+
+
+class ArchiveCache:
+    """ذاكرة تخزين دائمة على القرص لاستجابات أرشيف Chess.com، مفتاحها رابط الأرشيف"""
+
+    def __init__(self, directory, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[Dict]:
+        """قراءة سجل مخزن (وتحديث وقت الاستخدام لأغراض الإخلاء)"""
+        path = self._path(url)
+        try:
+            with open(path, encoding='utf-8') as handle:
+                entry = json.load(handle)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"سجل تخزين تالف للرابط {url}: {e}")
+            return None
+
+    def set(self, url: str, entry: Dict):
+        """كتابة سجل بشكل ذري ثم إخلاء الأقدم عند تجاوز الحجم"""
+        entry = dict(entry, url=url, stored_at=time.time())
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                json.dump(entry, handle, ensure_ascii=False)
+            os.replace(tmp_path, self._path(url))
+        except OSError as e:
+            logger.warning(f"تعذر تخزين الرابط {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._evict()
+
+    def mark_ingested(self, url: str):
+        """تسجيل أن محتوى هذا الأرشيف أُدخل إلى قاعدة البيانات"""
+        entry = self.get(url)
+        if entry and not entry.get('ingested'):
+            entry['ingested'] = True
+            self.set(url, entry)
+
+    def _evict(self):
+        """حذف السجلات الأقل استخداماً حتى يعود الحجم تحت الحد"""
+        with self.lock:
+            files = []
+            total = 0
+            for path in self.directory.glob('*.json'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(files):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+def default_archive_cache() -> Optional[ArchiveCache]:
+    """إنشاء ذاكرة التخزين من إعدادات Django (None إن كانت معطلة)"""
+    from django.conf import settings
+
+    directory = getattr(settings, 'CHESS_API_CACHE_DIR', None)
+    if not directory:
+        return None
+    return ArchiveCache(
+        directory,
+        max_bytes=getattr(settings, 'CHESS_API_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    )
@@ -0,0 +1,214 @@
+import base64
+import json
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from games.models import Game
+from utils.data_helpers import WON_Q, DRAW_Q
+from .cache import invalidate_leaderboard
+from .models import LeaderboardEntry, Player
+import logging
+
+logger = logging.getLogger(__name__)
+
+# الحد الأدنى من المباريات للظهور في الترتيب
+LEADERBOARD_MIN_GAMES = 10
+
+# ترتيب كامل (بلا تعادل) يطابق فهارس LeaderboardEntry
+LEADERBOARD_ORDERING = ('-win_percentage', '-total_games', 'player_id')
+
+TIME_CLASSES = [choice for choice, _ in LeaderboardEntry.TIME_CLASS_CHOICES]
+
+
+def time_class_for(time_control: str) -> Optional[str]:
+    """
+    تصنيف زمن التحكم بنفس حدود Chess.com (المدة التقديرية = الأساس + 40 × الزيادة):
+    '180+2' -> 'blitz'، '1/86400' -> 'daily'، وNone لما لا يمكن تصنيفه
+    """
+    if not time_control or time_control == '-':
+        return None
+    if '/' in time_control:
+        return 'daily'
+    try:
+        base, _, increment = time_control.partition('+')
+        estimated = int(base) + 40 * int(increment or 0)
+    except ValueError:
+        return None
+    if estimated < 180:
+        return 'bullet'
+    if estimated < 600:
+        return 'blitz'
+    return 'rapid'
+
+
+def _game_result(game) -> str:
+    if game.player_won:
+        return 'wins'
+    if game.is_draw:
+        return 'draws'
+    return 'losses'
+
+
+def apply_leaderboard_delta(player: Player, new_games: Iterable) -> None:
+    """
+    إضافة المباريات المدرجة حديثاً إلى صفوف اللاعب في لوحة الصدارة
+
+    العدادات ونسبة الفوز (وبالتالي ترتيب الصفحات) تتحدث فوراً، أما رقم rank المخزن
+    فمتسق لاحقاً: لا يتغير إلا في refresh_leaderboard_ranks (مهمة تُجدول بعد كل إدخال)
+    """
+    deltas = defaultdict(Counter)
+    for game in new_games:
+        result = _game_result(game)
+        for time_class in ('all', time_class_for(game.time_control)):
+            if time_class:
+                deltas[time_class]['total_games'] += 1
+                deltas[time_class][result] += 1
+
+    for time_class, delta in deltas.items():
+        if _increment_entry(player, time_class, delta):
+            continue
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(
+                    player=player, time_class=time_class, country=player.country, **delta
+                )
+        except IntegrityError:
+            _increment_entry(player, time_class, delta)
+
+
+def _increment_entry(player: Player, time_class: str, delta: Counter) -> bool:
+    """زيادة عدادات صف موجود ذرياً، وإرجاع False إن لم يكن موجوداً"""
+    updated = LeaderboardEntry.objects.filter(player=player, time_class=time_class).update(
+        country=player.country,
+        total_games=F('total_games') + delta['total_games'],
+        wins=F('wins') + delta['wins'],
+        losses=F('losses') + delta['losses'],
+        draws=F('draws') + delta['draws']
+    )
+    return updated > 0
+
+
+def count_games_by_time_class(games) -> Dict[str, Counter]:
+    """عدادات المباريات لكل فئة زمنية (و'all') في استعلام تجميعي واحد حسب زمن التحكم"""
+    rows = games.values('time_control').annotate(
+        total=Count('id'),
+        won=Count('id', filter=WON_Q),
+        drawn=Count('id', filter=DRAW_Q)
+    )
+
+    totals = defaultdict(Counter)
+    for row in rows:
+        for time_class in ('all', time_class_for(row['time_control'])):
+            if time_class:
+                totals[time_class]['total_games'] += row['total']
+                totals[time_class]['wins'] += row['won']
+                totals[time_class]['draws'] += row['drawn']
+                totals[time_class]['losses'] += row['total'] - row['won'] - row['drawn']
+    return totals
+
+
+def rebuild_leaderboard_entries(player: Player) -> None:
+    """إعادة حساب صفوف اللاعب في لوحة الصدارة من جميع مبارياته"""
+    totals = count_games_by_time_class(Game.objects.filter(player=player))
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(player=player).exclude(time_class__in=list(totals)).delete()
+        for time_class, counts in totals.items():
+            LeaderboardEntry.objects.update_or_create(
+                player=player,
+                time_class=time_class,
+                defaults=dict(counts, country=player.country)
+            )
+
+
+def refresh_leaderboard_ranks(time_classes: Optional[List[str]] = None, batch_size: int = 1000) -> int:
+    """
+    إعادة حساب الترتيب المخزن لكل فئة زمنية بقراءة واحدة مرتبة عبر الفهرس،
+    مع كتابة الصفوف التي تغير ترتيبها فقط. يُرجع عدد الصفوف المحدثة
+    """
+    updated = 0
+    for time_class in time_classes or TIME_CLASSES:
+        entries = LeaderboardEntry.objects.filter(time_class=time_class)
+        changed = []
+        rank = 0
+        for pk, current_rank, total_games in entries.order_by(*LEADERBOARD_ORDERING).values_list(
+                'pk', 'rank', 'total_games').iterator(chunk_size=batch_size):
+            if total_games >= LEADERBOARD_MIN_GAMES:
+                rank += 1
+                new_rank = rank
+            else:
+                new_rank = None
+            if new_rank != current_rank:
+                changed.append(LeaderboardEntry(pk=pk, rank=new_rank))
+
+        LeaderboardEntry.objects.bulk_update(changed, ['rank'], batch_size=batch_size)
+        updated += len(changed)
+        logger.info(f"ترتيب {time_class}: {rank} لاعب، {len(changed)} تغيير")
+
+    if updated:
+        invalidate_leaderboard()
+    return updated
+
+
+def encode_cursor(entry: LeaderboardEntry) -> str:
+    """مؤشر الصفحة التالية: موضع آخر صف في الترتيب"""
+    position = [entry.win_percentage, entry.total_games, entry.player_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int, int]:
+    """فك المؤشر، مع ValueError إن كان غير صالح"""
+    try:
+        win_percentage, total_games, player_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(win_percentage), int(total_games), int(player_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('مؤشر غير صالح') from e
+
+
+def leaderboard_page(time_class: str = 'all', country: Optional[str] = None,
+                     cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[LeaderboardEntry], Optional[str]]:
+    """
+    صفحة من لوحة الصدارة بترقيم المؤشر (keyset): قراءة واحدة تبدأ من موضع المؤشر
+    في الفهرس بدل OFFSET، فتبقى بنفس السرعة في أي عمق
+    """
+    entries = LeaderboardEntry.objects.filter(
+        time_class=time_class, total_games__gte=LEADERBOARD_MIN_GAMES
+    )
+    if country:
+        entries = entries.filter(country=country)
+
+    if cursor:
+        win_percentage, total_games, player_id = decode_cursor(cursor)
+        entries = entries.filter(
+            Q(win_percentage__lt=win_percentage)
+            | Q(win_percentage=win_percentage, total_games__lt=total_games)
+            | Q(win_percentage=win_percentage, total_games=total_games, player_id__gt=player_id)
+        )
+
+    rows = list(
+        entries.select_related('player').only(
+            'rank', 'country', 'total_games', 'wins', 'losses', 'draws', 'win_percentage',
+            'player__username', 'player__current_rating'
+        ).order_by(*LEADERBOARD_ORDERING)[:limit + 1]
+    )
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def legacy_leaderboards(limit: int = 10) -> Tuple[List[Player], List[LeaderboardEntry]]:
+    """
+    لوحتا الشكل القديم (v1): الأعلى تصنيفاً، والأكثر انتصارات بين من لعبوا
+    LEADERBOARD_MIN_GAMES مباراة على الأقل (من الجدول المحسوب مسبقاً)
+    """
+    by_rating = list(
+        Player.objects.filter(current_rating__isnull=False).select_related('playerstats')
+        .order_by('-current_rating', 'id')[:limit]
+    )
+    by_wins = list(
+        LeaderboardEntry.objects.filter(time_class='all', total_games__gte=LEADERBOARD_MIN_GAMES)
+        .select_related('player').only('wins', 'total_games', 'win_percentage', 'player__username')
+        .order_by('-wins', 'player_id')[:limit]
+    )
+    return by_rating, by_wins
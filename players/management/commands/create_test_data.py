@@ -1,14 +1,22 @@
 from django.core.management.base import BaseCommand
 from players.models import Player, PlayerStats, OpeningStat
 from games.models import Game
+from analysis.mock_data import generate_mock_games
 from datetime import date, timedelta
 import random
 
 class Command(BaseCommand):
     help = 'إنشاء بيانات اختبار للموقع'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=0,
+                            help='عدد المباريات الوهمية لكل لاعب (0 = إحصاءات عشوائية فقط)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='بذرة المولد العشوائي لنتائج قابلة للتكرار')
+
     def handle(self, *args, **options):
         self.stdout.write('بدء إنشاء بيانات الاختبار...')
+        rng = random.Random(options['seed'])
         
         # إنشاء لاعبين
         players_data = [
@@ -31,6 +39,17 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f'تم إنشاء اللاعب: {player.username}')
         
+        # توليد مباريات حقيقية في قاعدة البيانات مع إحصاءاتها المجمّعة
+        if options['games'] > 0:
+            for player in players:
+                result = generate_mock_games(player, options['games'], seed=rng.getrandbits(32))
+                self.stdout.write(f'تم توليد {result["created"]} مباراة للاعب: {player.username}')
+            
+            self.stdout.write(
+                self.style.SUCCESS('تم إنشاء بيانات الاختبار بنجاح!')
+            )
+            return
+        
         # إنشاء إحصاءات للاعبين
         openings = [
             {'name': 'الافتتاح الإيطالي', 'eco': 'C50'},
@@ -44,21 +63,21 @@ class Command(BaseCommand):
             stats, created = PlayerStats.objects.get_or_create(
                 player=player,
                 defaults={
-                    'total_games': random.randint(50, 200),
-                    'wins': random.randint(20, 80),
-                    'losses': random.randint(15, 60),
-                    'draws': random.randint(5, 30),
-                    'favorite_opening': random.choice(openings)['name'],
-                    'average_game_length': random.randint(35, 65)
+                    'total_games': rng.randint(50, 200),
+                    'wins': rng.randint(20, 80),
+                    'losses': rng.randint(15, 60),
+                    'draws': rng.randint(5, 30),
+                    'favorite_opening': rng.choice(openings)['name'],
+                    'average_game_length': rng.randint(35, 65)
                 }
             )
             
             # إحصاءات الافتتاحات
             for opening in openings:
-                games_played = random.randint(5, 25)
-                wins = random.randint(0, games_played)
+                games_played = rng.randint(5, 25)
+                wins = rng.randint(0, games_played)
                 remaining = games_played - wins
-                losses = random.randint(0, remaining)
+                losses = rng.randint(0, remaining)
                 draws = remaining - losses
                 
                 OpeningStat.objects.get_or_create(
@@ -70,7 +89,7 @@ class Command(BaseCommand):
                         'wins': wins,
                         'losses': losses,
                         'draws': draws,
-                        'color_played': random.choice(['white', 'black', 'both'])
+                        'color_played': rng.choice(['white', 'black', 'both'])
                     }
                 )
         
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from players.models import Player
+from players.leaderboard import refresh_leaderboard_ranks
+from analysis.data_processor import GameDataProcessor
+
+class Command(BaseCommand):
+    help = 'إعادة بناء إحصاءات اللاعبين والافتتاحات بالكامل من المباريات المخزنة (للإصلاح)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='أسماء اللاعبين (الكل إن لم تُحدد)')
+
+    def handle(self, *args, **options):
+        players = Player.objects.all()
+        if options['usernames']:
+            players = players.filter(username__in=options['usernames'])
+            if not players.exists():
+                raise CommandError('لم يتم العثور على أي لاعب بهذه الأسماء')
+
+        processor = GameDataProcessor()
+        for player in players.iterator():
+            processor.rebuild_player_stats(player)
+            self.stdout.write(f'تمت إعادة بناء إحصاءات اللاعب: {player.username}')
+
+        updated = refresh_leaderboard_ranks()
+        self.stdout.write(f'تم تحديث ترتيب {updated} صف في لوحة الصدارة')
+
+        self.stdout.write(
+            self.style.SUCCESS('اكتملت إعادة بناء الإحصاءات')
+        )
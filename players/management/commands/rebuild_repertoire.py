@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from players.cache import invalidate_player
+from players.models import Player
+from players.repertoire import max_repertoire_ply, rebuild_repertoire
+
+class Command(BaseCommand):
+    help = 'إعادة بناء شجرة ذخيرة اللاعبين من نصوص PGN المخزنة (للمباريات السابقة لهذه الميزة أو بعد تغيير العمق)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='أسماء اللاعبين (الكل إن لم تُحدد)')
+        parser.add_argument('--max-ply', type=int, default=None,
+                            help='عمق الشجرة بأنصاف النقلات (الافتراضي REPERTOIRE_MAX_PLY)')
+
+    def handle(self, *args, **options):
+        players = Player.objects.all()
+        if options['usernames']:
+            players = players.filter(username__in=options['usernames'])
+            if not players.exists():
+                raise CommandError('لم يتم العثور على أي لاعب بهذه الأسماء')
+
+        max_ply = options['max_ply'] if options['max_ply'] is not None else max_repertoire_ply()
+        for player in players.iterator():
+            nodes = rebuild_repertoire(player, max_ply)
+            invalidate_player(player.username)
+            self.stdout.write(f'{player.username}: {nodes} عقدة')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'اكتملت إعادة بناء شجرة الذخيرة حتى نصف النقلة {max_ply}')
+        )
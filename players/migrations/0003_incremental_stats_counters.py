@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    """تعبئة العدادات الجديدة من المباريات المخزنة"""
+    Game = apps.get_model('games', 'Game')
+    OpeningStat = apps.get_model('players', 'OpeningStat')
+    PlayerStats = apps.get_model('players', 'PlayerStats')
+    db_alias = schema_editor.connection.alias
+
+    for stat in OpeningStat.objects.using(db_alias):
+        counts = Game.objects.using(db_alias).filter(
+            player_id=stat.player_id,
+            opening_name=stat.opening_name,
+            opening_eco=stat.eco_code
+        ).aggregate(
+            white=Count('id', filter=Q(player_color='white')),
+            black=Count('id', filter=Q(player_color='black'))
+        )
+        stat.white_games = counts['white']
+        stat.black_games = counts['black']
+        stat.save(update_fields=['white_games', 'black_games'])
+
+    for stats in PlayerStats.objects.using(db_alias):
+        moves = Game.objects.using(db_alias).filter(
+            player_id=stats.player_id, moves_count__gt=0
+        ).aggregate(total=Sum('moves_count'), games=Count('id'))
+        stats.total_moves = moves['total'] or 0
+        stats.games_with_moves = moves['games']
+        stats.save(update_fields=['total_moves', 'games_with_moves'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0002_playerstats_openingstat'),
+        ('games', '0002_alter_game_unique_together_game_game_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openingstat',
+            name='black_games',
+            field=models.IntegerField(default=0, verbose_name='المباريات بالأسود'),
+        ),
+        migrations.AddField(
+            model_name='openingstat',
+            name='white_games',
+            field=models.IntegerField(default=0, verbose_name='المباريات بالأبيض'),
+        ),
+        migrations.AddField(
+            model_name='playerstats',
+            name='games_with_moves',
+            field=models.IntegerField(default=0, verbose_name='المباريات ذات النقلات'),
+        ),
+        migrations.AddField(
+            model_name='playerstats',
+            name='total_moves',
+            field=models.IntegerField(default=0, verbose_name='مجموع النقلات'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
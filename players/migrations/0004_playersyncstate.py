@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0003_incremental_stats_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_archive_month', models.CharField(blank=True, max_length=7, verbose_name='آخر شهر أرشيف')),
+                ('last_game_end_time', models.BigIntegerField(blank=True, null=True, verbose_name='وقت انتهاء آخر مباراة')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر مزامنة')),
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_state', to='players.player', verbose_name='اللاعب')),
+            ],
+            options={
+                'verbose_name': 'حالة مزامنة',
+                'verbose_name_plural': 'حالات المزامنة',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_playersyncstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='openingstat',
+            index=models.Index(fields=['player', '-games_played'], name='openingstat_player_games_idx'),
+        ),
+    ]
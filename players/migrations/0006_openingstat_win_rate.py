@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:06
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openingstat',
+            name='win_rate',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(games_played=0, then=models.Value(0.0)), default=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('wins', models.FloatField()), '*', models.Value(100)), '/', models.F('games_played')), 1)), output_field=models.FloatField(), verbose_name='معدل الفوز'),
+        ),
+        migrations.AddIndex(
+            model_name='openingstat',
+            index=models.Index(fields=['player', '-win_rate'], name='openingstat_player_winrate_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:08
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+# نسخة مجمدة من منطق players.leaderboard وقت هذه الهجرة:
+# الهجرات لا تستورد كود التطبيق الحي حتى لا تنكسر عند تغيره أو تغير مخطط Game
+WON_Q = models.Q(player_color='white', result='1-0') | models.Q(player_color='black', result='0-1')
+DRAW_Q = models.Q(result='1/2-1/2')
+
+
+def time_class_for(time_control):
+    if not time_control or time_control == '-':
+        return None
+    if '/' in time_control:
+        return 'daily'
+    try:
+        base, _, increment = time_control.partition('+')
+        estimated = int(base) + 40 * int(increment or 0)
+    except ValueError:
+        return None
+    if estimated < 180:
+        return 'bullet'
+    if estimated < 600:
+        return 'blitz'
+    return 'rapid'
+
+
+def count_games_by_time_class(games):
+    """عدادات المباريات لكل فئة زمنية (و'all') في استعلام تجميعي واحد حسب زمن التحكم"""
+    rows = games.values('time_control').annotate(
+        total=models.Count('id'),
+        won=models.Count('id', filter=WON_Q),
+        drawn=models.Count('id', filter=DRAW_Q)
+    )
+
+    totals = {}
+    for row in rows:
+        for time_class in ('all', time_class_for(row['time_control'])):
+            if time_class:
+                counts = totals.setdefault(time_class, dict.fromkeys(('total_games', 'wins', 'draws', 'losses'), 0))
+                counts['total_games'] += row['total']
+                counts['wins'] += row['won']
+                counts['draws'] += row['drawn']
+                counts['losses'] += row['total'] - row['won'] - row['drawn']
+    return totals
+
+
+def backfill_leaderboard(apps, schema_editor):
+    """بناء صفوف لوحة الصدارة وترتيبها من المباريات المخزنة"""
+    Game = apps.get_model('games', 'Game')
+    Player = apps.get_model('players', 'Player')
+    LeaderboardEntry = apps.get_model('players', 'LeaderboardEntry')
+    db_alias = schema_editor.connection.alias
+
+    for player in Player.objects.using(db_alias):
+        totals = count_games_by_time_class(Game.objects.using(db_alias).filter(player_id=player.pk))
+        LeaderboardEntry.objects.using(db_alias).bulk_create([
+            LeaderboardEntry(player_id=player.pk, time_class=time_class, country=player.country, **counts)
+            for time_class, counts in totals.items()
+        ])
+
+    for time_class in ('all', 'bullet', 'blitz', 'rapid', 'daily'):
+        entries = LeaderboardEntry.objects.using(db_alias).filter(
+            time_class=time_class, total_games__gte=10
+        ).order_by('-win_percentage', '-total_games', 'player_id')
+        for rank, entry in enumerate(entries, start=1):
+            entry.rank = rank
+            entry.save(update_fields=['rank'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0006_openingstat_win_rate'),
+        ('games', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_class', models.CharField(choices=[('all', 'الكل'), ('bullet', 'رصاصة'), ('blitz', 'خاطف'), ('rapid', 'سريع'), ('daily', 'يومي')], default='all', max_length=10, verbose_name='الفئة الزمنية')),
+                ('country', models.CharField(blank=True, max_length=50, verbose_name='البلد')),
+                ('total_games', models.IntegerField(default=0, verbose_name='إجمالي المباريات')),
+                ('wins', models.IntegerField(default=0, verbose_name='الانتصارات')),
+                ('losses', models.IntegerField(default=0, verbose_name='الهزائم')),
+                ('draws', models.IntegerField(default=0, verbose_name='التعادلات')),
+                ('win_percentage', models.GeneratedField(db_persist=True, expression=models.Case(models.When(then=models.Value(0.0), total_games=0), default=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('wins', models.FloatField()), '*', models.Value(100)), '/', models.F('total_games')), 1)), output_field=models.FloatField(), verbose_name='نسبة الفوز')),
+                ('rank', models.IntegerField(blank=True, null=True, verbose_name='الترتيب')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='players.player', verbose_name='اللاعب')),
+            ],
+            options={
+                'verbose_name': 'صف لوحة الصدارة',
+                'verbose_name_plural': 'لوحة الصدارة',
+                'indexes': [models.Index(fields=['time_class', '-win_percentage', '-total_games', 'player'], name='leaderboard_rank_idx'), models.Index(fields=['time_class', 'country', '-win_percentage', '-total_games', 'player'], name='leaderboard_country_rank_idx')],
+                'unique_together': {('player', 'time_class')},
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# نسخة مجمدة من منطق players.history وplayers.leaderboard وقت هذه الهجرة:
+# الهجرات لا تستورد كود التطبيق الحي حتى لا تنكسر عند تغيره أو تغير مخطط Game
+HISTORY_FIELDS = ('date_played', 'time_control', 'player_color', 'result', 'opponent_rating', 'player_rating')
+
+COUNTER_FIELDS = ('games', 'wins', 'draws', 'losses', 'opponent_rating_sum', 'rated_games')
+
+
+def time_class_for(time_control):
+    if not time_control or time_control == '-':
+        return None
+    if '/' in time_control:
+        return 'daily'
+    try:
+        base, _, increment = time_control.partition('+')
+        estimated = int(base) + 40 * int(increment or 0)
+    except ValueError:
+        return None
+    if estimated < 180:
+        return 'bullet'
+    if estimated < 600:
+        return 'blitz'
+    return 'rapid'
+
+
+def result_field(player_color, result):
+    if result == '1/2-1/2':
+        return 'draws'
+    won = (player_color == 'white' and result == '1-0') or (player_color == 'black' and result == '0-1')
+    return 'wins' if won else 'losses'
+
+
+def rollup_rows(rows):
+    """{(الفئة الزمنية, اليوم): عدادات}، والتصنيف تصنيف آخر مباراة في الترتيب المعطى"""
+    buckets = {}
+    for played, time_control, color, result, opponent_rating, player_rating in rows:
+        for time_class in ('all', time_class_for(time_control)):
+            if not time_class:
+                continue
+            bucket = buckets.setdefault((time_class, played), dict.fromkeys(COUNTER_FIELDS, 0) | {'rating': None})
+            bucket['games'] += 1
+            bucket[result_field(color, result)] += 1
+            if opponent_rating:
+                bucket['opponent_rating_sum'] += opponent_rating
+                bucket['rated_games'] += 1
+            if player_rating:
+                bucket['rating'] = player_rating
+    return buckets
+
+
+def backfill_history(apps, schema_editor):
+    """بناء التجميعات اليومية من المباريات المخزنة"""
+    Game = apps.get_model('games', 'Game')
+    Player = apps.get_model('players', 'Player')
+    PerformanceBucket = apps.get_model('players', 'PerformanceBucket')
+    db_alias = schema_editor.connection.alias
+
+    for player_id in Player.objects.using(db_alias).values_list('id', flat=True):
+        rows = Game.objects.using(db_alias).filter(player_id=player_id).order_by(
+            'date_played', 'id').values_list(*HISTORY_FIELDS)
+        PerformanceBucket.objects.using(db_alias).bulk_create(
+            [PerformanceBucket(player_id=player_id, time_class=time_class, day=day, **counts)
+             for (time_class, day), counts in rollup_rows(rows.iterator()).items()],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0007_leaderboardentry'),
+        ('games', '0005_game_player_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_class', models.CharField(choices=[('all', 'الكل'), ('bullet', 'رصاصة'), ('blitz', 'خاطف'), ('rapid', 'سريع'), ('daily', 'يومي')], default='all', max_length=10, verbose_name='الفئة الزمنية')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('games', models.IntegerField(default=0, verbose_name='المباريات')),
+                ('wins', models.IntegerField(default=0, verbose_name='الانتصارات')),
+                ('draws', models.IntegerField(default=0, verbose_name='التعادلات')),
+                ('losses', models.IntegerField(default=0, verbose_name='الهزائم')),
+                ('opponent_rating_sum', models.BigIntegerField(default=0, verbose_name='مجموع تصنيفات الخصوم')),
+                ('rated_games', models.IntegerField(default=0, verbose_name='المباريات ذات التصنيف')),
+                ('rating', models.IntegerField(blank=True, null=True, verbose_name='تصنيف اللاعب في آخر مباراة')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='performance_buckets', to='players.player', verbose_name='اللاعب')),
+            ],
+            options={
+                'verbose_name': 'أداء يومي',
+                'verbose_name_plural': 'الأداء اليومي',
+                'unique_together': {('player', 'time_class', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
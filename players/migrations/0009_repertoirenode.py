@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0008_performancebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepertoireNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.CharField(choices=[('white', 'أبيض'), ('black', 'أسود')], max_length=5, verbose_name='لون اللاعب')),
+                ('move', models.CharField(blank=True, max_length=5, verbose_name='النقلة (UCI)')),
+                ('san', models.CharField(blank=True, max_length=10, verbose_name='النقلة (SAN)')),
+                ('ply', models.PositiveSmallIntegerField(default=0, verbose_name='نصف النقلة')),
+                ('games', models.IntegerField(default=0, verbose_name='المباريات')),
+                ('wins', models.IntegerField(default=0, verbose_name='الانتصارات')),
+                ('draws', models.IntegerField(default=0, verbose_name='التعادلات')),
+                ('losses', models.IntegerField(default=0, verbose_name='الهزائم')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='players.repertoirenode', verbose_name='العقدة الأم')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repertoire_nodes', to='players.player', verbose_name='اللاعب')),
+            ],
+            options={
+                'verbose_name': 'عقدة ذخيرة',
+                'verbose_name_plural': 'شجرة الذخيرة',
+                'constraints': [models.UniqueConstraint(fields=('parent', 'move'), name='repertoire_unique_child'), models.UniqueConstraint(condition=models.Q(('parent__isnull', True)), fields=('player', 'color'), name='repertoire_unique_root')],
+            },
+        ),
+    ]
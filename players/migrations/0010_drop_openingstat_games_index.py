@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0009_repertoirenode'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='openingstat',
+            name='openingstat_player_games_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0010_drop_openingstat_games_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancebucket',
+            name='rating_end_time',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='وقت انتهاء مباراة التصنيف'),
+        ),
+    ]
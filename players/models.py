@@ -1,4 +1,14 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Round
+
+
+def win_rate_expression(wins: str, games: str):
+    """نسبة الفوز المئوية مقربة لرقم عشري واحد، محسوبة في قاعدة البيانات"""
+    return Case(
+        When(**{games: 0}, then=Value(0.0)),
+        default=Round(Cast(wins, FloatField()) * 100 / F(games), 1),
+    )
 
 class Player(models.Model):
     username = models.CharField(max_length=50, unique=True, verbose_name="اسم المستخدم")
@@ -26,6 +36,9 @@ class PlayerStats(models.Model):
     favorite_opening = models.CharField(max_length=100, blank=True, verbose_name="الافتتاح المفضل")
     weakest_defense = models.CharField(max_length=100, blank=True, verbose_name="أضعف دفاع")
     average_game_length = models.IntegerField(default=0, verbose_name="متوسط طول المباراة")
+    # عدادات تراكمية لحساب متوسط طول المباراة بشكل تدريجي
+    total_moves = models.IntegerField(default=0, verbose_name="مجموع النقلات")
+    games_with_moves = models.IntegerField(default=0, verbose_name="المباريات ذات النقلات")
     last_analysis = models.DateTimeField(null=True, blank=True, verbose_name="آخر تحليل")
     
     class Meta:
@@ -57,24 +70,168 @@ class OpeningStat(models.Model):
     wins = models.IntegerField(default=0, verbose_name="الانتصارات")
     losses = models.IntegerField(default=0, verbose_name="الهزائم")
     draws = models.IntegerField(default=0, verbose_name="التعادلات")
+    # عدادات حسب اللون لتحديد اللون الغالب بشكل تدريجي
+    white_games = models.IntegerField(default=0, verbose_name="المباريات بالأبيض")
+    black_games = models.IntegerField(default=0, verbose_name="المباريات بالأسود")
     color_played = models.CharField(
         max_length=5, 
         choices=[('white', 'أبيض'), ('black', 'أسود'), ('both', 'كلاهما')],
         default='both',
         verbose_name="اللون المُلعب"
     )
+    # معدل الفوز محسوب ومخزن في قاعدة البيانات ليمكن الترشيح والترتيب والفهرسة به
+    win_rate = models.GeneratedField(
+        expression=win_rate_expression('wins', 'games_played'),
+        output_field=FloatField(),
+        db_persist=True,
+        verbose_name="معدل الفوز"
+    )
     
     class Meta:
         verbose_name = "إحصاءات افتتاح"
         verbose_name_plural = "إحصاءات الافتتاحات"
         unique_together = ['player', 'opening_name', 'eco_code']
+        # لا فهرس على games_played: صفوف اللاعب قليلة ويكفيها فهرس unique_together،
+        # بينما كل إدخال يغير games_played فيكلف تحديث فهرس إضافي
+        indexes = [
+            # أفضل وأسوأ الافتتاحات
+            models.Index(fields=['player', '-win_rate'], name='openingstat_player_winrate_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.opening_name} ({self.eco_code})"
+
+class PlayerSyncState(models.Model):
+    """علامة المزامنة التدريجية مع Chess.com: آخر ما أُدخل بالكامل للاعب"""
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, related_name='sync_state', verbose_name="اللاعب")
+    last_archive_month = models.CharField(max_length=7, blank=True, verbose_name="آخر شهر أرشيف")  # YYYY/MM
+    last_game_end_time = models.BigIntegerField(null=True, blank=True, verbose_name="وقت انتهاء آخر مباراة")
+    last_synced_at = models.DateTimeField(null=True, blank=True, verbose_name="آخر مزامنة")
+    
+    class Meta:
+        verbose_name = "حالة مزامنة"
+        verbose_name_plural = "حالات المزامنة"
+    
+    def __str__(self):
+        return f"مزامنة {self.player.username} ({self.last_archive_month or '-'})"
+
+class LeaderboardEntry(models.Model):
+    """
+    صف لوحة الصدارة المحسوبة مسبقاً: عدادات اللاعب لكل فئة زمنية
+    مع نسبة فوز مخزنة وترتيب يُعاد حسابه دورياً
+    """
+    TIME_CLASS_CHOICES = [
+        ('all', 'الكل'),
+        ('bullet', 'رصاصة'),
+        ('blitz', 'خاطف'),
+        ('rapid', 'سريع'),
+        ('daily', 'يومي'),
+    ]
+    
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='leaderboard_entries', verbose_name="اللاعب")
+    time_class = models.CharField(max_length=10, choices=TIME_CLASS_CHOICES, default='all', verbose_name="الفئة الزمنية")
+    # نسخة من بلد اللاعب ليُرشَّح بها دون ربط
+    country = models.CharField(max_length=50, blank=True, verbose_name="البلد")
+    total_games = models.IntegerField(default=0, verbose_name="إجمالي المباريات")
+    wins = models.IntegerField(default=0, verbose_name="الانتصارات")
+    losses = models.IntegerField(default=0, verbose_name="الهزائم")
+    draws = models.IntegerField(default=0, verbose_name="التعادلات")
+    win_percentage = models.GeneratedField(
+        expression=win_rate_expression('wins', 'total_games'),
+        output_field=FloatField(),
+        db_persist=True,
+        verbose_name="نسبة الفوز"
+    )
+    # متسق لاحقاً: يُعاد حسابه في refresh_leaderboard_ranks لا عند كل تحديث للعدادات
+    rank = models.IntegerField(null=True, blank=True, verbose_name="الترتيب")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "صف لوحة الصدارة"
+        verbose_name_plural = "لوحة الصدارة"
+        unique_together = ['player', 'time_class']
+        indexes = [
+            models.Index(fields=['time_class', '-win_percentage', '-total_games', 'player'],
+                         name='leaderboard_rank_idx'),
+            models.Index(fields=['time_class', 'country', '-win_percentage', '-total_games', 'player'],
+                         name='leaderboard_country_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.time_class} (#{self.rank or '-'})"
+
+class PerformanceBucket(models.Model):
+    """
+    تجميع يومي لأداء اللاعب لكل فئة زمنية (و'all')، يُحدَّث تدريجياً عند الإدخال
+    لرسم الأداء عبر الزمن دون المرور على كل المباريات
+    """
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='performance_buckets', verbose_name="اللاعب")
+    time_class = models.CharField(max_length=10, choices=LeaderboardEntry.TIME_CLASS_CHOICES, default='all', verbose_name="الفئة الزمنية")
+    day = models.DateField(verbose_name="اليوم")
+    games = models.IntegerField(default=0, verbose_name="المباريات")
+    wins = models.IntegerField(default=0, verbose_name="الانتصارات")
+    draws = models.IntegerField(default=0, verbose_name="التعادلات")
+    losses = models.IntegerField(default=0, verbose_name="الهزائم")
+    # مجموع تصنيفات الخصوم وعدد المباريات ذات التصنيف لحساب المتوسط تدريجياً
+    opponent_rating_sum = models.BigIntegerField(default=0, verbose_name="مجموع تصنيفات الخصوم")
+    rated_games = models.IntegerField(default=0, verbose_name="المباريات ذات التصنيف")
+    rating = models.IntegerField(null=True, blank=True, verbose_name="تصنيف اللاعب في آخر مباراة")
+    # وقت انتهاء المباراة التي أُخذ منها rating، حتى لا تستبدله مباراة أقدم تُدرج لاحقاً
+    rating_end_time = models.BigIntegerField(null=True, blank=True, verbose_name="وقت انتهاء مباراة التصنيف")
+    
+    class Meta:
+        verbose_name = "أداء يومي"
+        verbose_name_plural = "الأداء اليومي"
+        # القيد الفريد يخدم أيضاً استعلامات النطاق (player, time_class, day BETWEEN ...)
+        unique_together = ['player', 'time_class', 'day']
+    
+    @property
+    def average_opponent_rating(self):
+        if self.rated_games == 0:
+            return None
+        return round(self.opponent_rating_sum / self.rated_games)
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.time_class} ({self.day})"
+
+class RepertoireNode(models.Model):
+    """
+    عقدة في شجرة نقلات اللاعب (لكل لون شجرة جذرها عقدة بلا نقلة):
+    المباريات ونتائجها لكل تسلسل نقلات من بداية الخط الرئيسي
+    """
+    COLOR_CHOICES = [
+        ('white', 'أبيض'),
+        ('black', 'أسود'),
+    ]
+    
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='repertoire_nodes', verbose_name="اللاعب")
+    color = models.CharField(max_length=5, choices=COLOR_CHOICES, verbose_name="لون اللاعب")
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE,
+                               related_name='children', verbose_name="العقدة الأم")
+    # النقلة المؤدية إلى العقدة (فارغة في الجذر)
+    move = models.CharField(max_length=5, blank=True, verbose_name="النقلة (UCI)")
+    san = models.CharField(max_length=10, blank=True, verbose_name="النقلة (SAN)")
+    ply = models.PositiveSmallIntegerField(default=0, verbose_name="نصف النقلة")
+    games = models.IntegerField(default=0, verbose_name="المباريات")
+    wins = models.IntegerField(default=0, verbose_name="الانتصارات")
+    draws = models.IntegerField(default=0, verbose_name="التعادلات")
+    losses = models.IntegerField(default=0, verbose_name="الهزائم")
+    
+    class Meta:
+        verbose_name = "عقدة ذخيرة"
+        verbose_name_plural = "شجرة الذخيرة"
+        constraints = [
+            # يخدم أيضاً جلب أبناء العقدة عند توسيعها
+            models.UniqueConstraint(fields=['parent', 'move'], name='repertoire_unique_child'),
+            models.UniqueConstraint(fields=['player', 'color'], condition=Q(parent__isnull=True),
+                                    name='repertoire_unique_root'),
+        ]
     
     @property
     def win_rate(self):
-        """حساب معدل الفوز لهذا الافتتاح"""
-        if self.games_played == 0:
+        if self.games == 0:
             return 0
-        return round((self.wins / self.games_played) * 100, 1)
+        return round(self.wins / self.games * 100, 1)
     
     def __str__(self):
-        return f"{self.player.username} - {self.opening_name} ({self.eco_code})"
+        return f"{self.player.username} ({self.color}) {self.san or '-'} @ {self.ply}"
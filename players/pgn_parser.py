@@ -0,0 +1,256 @@
+import io
+import re
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_OPENING = 'غير معروف'
+UNKNOWN_ECO = '???'
+
+# رمز ECO صالح: حرف من A إلى E ثم رقمان
+ECO_CODE_RE = re.compile(r'^[A-E]\d\d$')
+
+# أنماط تقريبية لعدّ النقلات من نص PGN دون إعادة تشغيلها على الرقعة
+_COMMENT_RE = re.compile(r'\{[^}]*\}|;[^\n]*')
+_VARIATION_RE = re.compile(r'\([^()]*\)')
+_SAN_RE = re.compile(
+    r'(?<![\w.])(?:O-O-O|O-O|0-0-0|0-0|[KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=?[QRBN])?|--)[+#]?[!?]*'
+)
+
+
+def zobrist_key(board: chess.Board) -> int:
+    """بصمة Zobrist (Polyglot) للوضعية كعدد صحيح بإشارة 64 بت يناسب BigIntegerField"""
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+def encode_move(move: chess.Move) -> int:
+    """نقلة في 16 بت: المربع المصدر (6 بت) | الهدف (6 بت) << 6 | نوع قطعة الترقية (3 بت) << 12"""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, (code >> 12) or None)
+
+
+def parse_clock(comment: str) -> Optional[int]:
+    """[%clk 0:02:59.9] -> الوقت المتبقي بأجزاء المئة من الثانية، أو None"""
+    match = chess.pgn.CLOCK_REGEX.search(comment)
+    if match is None:
+        return None
+    seconds = int(match['hours']) * 3600 + int(match['minutes']) * 60 + float(match['seconds'])
+    return round(seconds * 100)
+
+
+class GameInfoVisitor(chess.pgn.BaseVisitor):
+    """زائر PGN يجمع الرؤوس ويعدّ نقلات الخط الرئيسي في مرور واحد دون بناء شجرة المباراة"""
+
+    def __init__(self, headers_only: bool = False, position_plies: int = 0, line_plies: int = 0,
+                 eco_table=None, record_moves: bool = False):
+        self.headers_only = headers_only
+        # تسجيل كل نقلات الخط الرئيسي مرمزة مع ساعة [%clk] بعد كل منها
+        self.record_moves = record_moves
+        self.move_codes: List[int] = []
+        self.clocks: List[Optional[int]] = []
+        # عدد أنصاف النقلات الأولى التي تُجمع بصمات وضعياتها ونقلاتها (0 = لا شيء)
+        self.position_plies = position_plies
+        self.line_plies = line_plies
+        # جدول ECO (players/eco.py) لتصنيف الافتتاح من الوضعيات، أو None
+        self.eco_table = eco_table
+        self._hash_plies = max(position_plies, eco_table.max_ply if eco_table else 0)
+        self.headers: Dict[str, str] = {}
+        self.moves_count = 0
+        self.positions: Dict[int, int] = {}
+        self.line: List[Tuple[str, str]] = []
+        self.opening: Optional[Tuple[str, str]] = None
+        # نصف النقلة التي بلغ فيها الخط آخر وضعية معروفة في الجدول
+        self.opening_ply = 0
+        self._san = ''
+        self._last_hashed_ply = -1
+        self.errors: List[Exception] = []
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self):
+        if self.headers_only:
+            return chess.pgn.SKIP
+        return None
+
+    def begin_variation(self):
+        # الخطوط الفرعية لا تدخل في أي إحصاء
+        return chess.pgn.SKIP
+
+    def parse_san(self, board: chess.Board, san: str) -> chess.Move:
+        # الاحتفاظ بنص النقلة كما ورد لتجنب إعادة توليد SAN من الرقعة
+        self._san = san
+        return super().parse_san(board, san)
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        if self.moves_count < self.line_plies:
+            self.line.append((move.uci(), self._san))
+        if self.record_moves:
+            self.move_codes.append(encode_move(move))
+            self.clocks.append(None)
+        self.moves_count += 1
+
+    def visit_comment(self, comment: str) -> None:
+        # تعليق النقلة يأتي بعدها مباشرة، فالساعة للنقلة الأخيرة
+        if self.record_moves and self.clocks:
+            clock = parse_clock(comment)
+            if clock is not None:
+                self.clocks[-1] = clock
+
+    def visit_board(self, board: chess.Board) -> None:
+        # يُستدعى للوضعية الابتدائية وبعد كل نقلة في الخط الرئيسي
+        ply = self.moves_count
+        if ply <= self._last_hashed_ply or ply > self._hash_plies:
+            return
+        self._last_hashed_ply = ply
+        key = zobrist_key(board)
+        if ply <= self.position_plies:
+            # الوضعية المتكررة تُسجل مرة واحدة بأول نصف نقلة بلغتها
+            self.positions.setdefault(key, ply)
+        if self.eco_table is not None:
+            # أعمق وضعية معروفة في الجدول هي التصنيف
+            opening = self.eco_table.get(key)
+            if opening:
+                self.opening, self.opening_ply = opening, ply
+
+    def handle_error(self, error: Exception) -> None:
+        # نفس سلوك GameBuilder: تسجيل الخطأ ومتابعة القراءة
+        self.errors.append(error)
+
+    def result(self) -> 'GameInfoVisitor':
+        return self
+
+
+def count_movetext_plies(pgn_content: str) -> int:
+    """عدّ نقلات الخط الرئيسي من نص PGN مباشرة (يُستخدم في وضع قراءة الرؤوس فقط)"""
+    parts = re.split(r'\r?\n\s*\r?\n', pgn_content.strip(), maxsplit=1)
+    movetext = parts[1] if len(parts) > 1 else parts[0]
+    movetext = _COMMENT_RE.sub(' ', movetext)
+
+    previous = None
+    while previous != movetext:
+        previous = movetext
+        movetext = _VARIATION_RE.sub(' ', movetext)
+
+    return len(_SAN_RE.findall(movetext))
+
+
+def read_opening(headers: Dict[str, str]) -> tuple[str, str]:
+    """استخراج اسم الافتتاح ورمز ECO من رؤوس PGN"""
+    opening_name = headers.get('Opening') or UNKNOWN_OPENING
+    eco_code = headers.get('ECO') or UNKNOWN_ECO
+    return opening_name, eco_code
+
+
+def resolve_opening(visitor: GameInfoVisitor) -> Tuple[str, str]:
+    """
+    (الرمز، الاسم) للمباراة: تصنيف الجدول من الوضعيات، إلا إن كان رمز رأس ECO أدق منه
+    (انظر EcoTable.header_is_more_precise) فيبقى الرأس، ورؤوس Opening/ECO احتياطاً
+    إن لم تبلغ المباراة أي وضعية في الجدول
+    """
+    opening_name, eco_code = read_opening(visitor.headers)
+    if not visitor.opening:
+        return eco_code, opening_name
+    table_eco, table_name = visitor.opening
+    if visitor.eco_table.header_is_more_precise(eco_code, table_eco, visitor.opening_ply):
+        # رؤوس Chess.com تحمل ECO دون Opening غالباً، فيبقى اسم الجدول للعائلة نفسها
+        return eco_code, visitor.headers.get('Opening') or table_name
+    return visitor.opening
+
+
+def _parse_elo(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_game_pgn(pgn_content: str, target_username: str, headers_only: bool = False,
+                   position_plies: int = 0, line_plies: int = 0, eco_table=None,
+                   record_moves: bool = False) -> Optional[Dict]:
+    """
+    تحليل مباراة PGN في مرور واحد: الرؤوس، عدد النقلات والافتتاح معاً.
+
+    عند headers_only=True لا تُعاد النقلات على الرقعة ويُحسب عددها من النص.
+    position_plies: جمع بصمات Zobrist للوضعيات حتى نصف النقلة هذه في 'positions'
+    كأزواج (نصف النقلة، البصمة)
+    line_plies: أول أنصاف نقلات الخط الرئيسي في 'line' كأزواج (UCI، SAN)
+    eco_table: تصنيف الافتتاح من النقلات بدل رؤوس Opening/ECO (تبقى الرؤوس إن كان رمزها
+    أدق من تطابق الجدول، واحتياطاً إن لم تبلغ المباراة أي وضعية فيه)
+    record_moves: كل نقلات الخط الرئيسي مرمزة في 'move_codes' وساعاتها في 'clocks'
+    """
+    try:
+        visitor = chess.pgn.read_game(
+            io.StringIO(pgn_content),
+            Visitor=lambda: GameInfoVisitor(headers_only=headers_only, position_plies=position_plies,
+                                            line_plies=line_plies, eco_table=eco_table,
+                                            record_moves=record_moves)
+        )
+        if visitor is None:
+            return None
+
+        headers = visitor.headers
+
+        # تحديد لون اللاعب المستهدف
+        white_player = headers.get('White', '').lower()
+        black_player = headers.get('Black', '').lower()
+        target_username_lower = target_username.lower()
+
+        if target_username_lower in white_player:
+            player_color = 'white'
+            opponent = headers.get('Black', 'مجهول')
+            player_elo, opponent_elo = headers.get('WhiteElo'), headers.get('BlackElo')
+        elif target_username_lower in black_player:
+            player_color = 'black'
+            opponent = headers.get('White', 'مجهول')
+            player_elo, opponent_elo = headers.get('BlackElo'), headers.get('WhiteElo')
+        else:
+            return None
+
+        # تحويل التاريخ
+        date_str = headers.get('Date', '')
+        try:
+            date_obj = datetime.strptime(date_str, '%Y.%m.%d').date()
+        except (ValueError, TypeError):
+            date_obj = datetime.now().date()
+
+        if headers_only:
+            moves_count = count_movetext_plies(pgn_content)
+        else:
+            moves_count = visitor.moves_count
+
+        eco_code, opening_name = resolve_opening(visitor)
+
+        return {
+            'opponent': opponent,
+            'result': headers.get('Result', '1/2-1/2'),
+            'date': date_obj,
+            'time_control': headers.get('TimeControl', ''),
+            'player_color': player_color,
+            'termination': headers.get('Termination', ''),
+            'opening_name': opening_name,
+            'opening_eco': eco_code,
+            'moves_count': moves_count,
+            'player_rating': _parse_elo(player_elo),
+            'opponent_rating': _parse_elo(opponent_elo),
+            'positions': [(ply, key) for key, ply in visitor.positions.items()],
+            'line': visitor.line,
+            'move_codes': visitor.move_codes,
+            'clocks': visitor.clocks,
+            'start_fen': headers.get('FEN', ''),
+            'pgn_content': pgn_content
+        }
+
+    except Exception as e:
+        logger.error(f"خطأ في تحليل PGN: {e}")
+        return None
@@ -0,0 +1,162 @@
+import io
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import chess.pgn
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+from games.models import Game
+from .models import Player, RepertoireNode
+from .pgn_parser import GameInfoVisitor
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('games', 'wins', 'draws', 'losses')
+
+# عدد العقد في كل تحديث جماعي للعدادات
+UPDATE_BATCH_SIZE = 500
+
+# (اللون، تسلسل نقلات UCI من البداية) -> {'san': ..., العدادات}
+Rollup = Dict[Tuple[str, Tuple[str, ...]], Dict]
+
+
+def max_repertoire_ply() -> int:
+    return getattr(settings, 'REPERTOIRE_MAX_PLY', 20)
+
+
+def _result_field(player_color: str, result: str) -> str:
+    if result == '1/2-1/2':
+        return 'draws'
+    won = (player_color == 'white' and result == '1-0') or (player_color == 'black' and result == '0-1')
+    return 'wins' if won else 'losses'
+
+
+def rollup_lines(lines: Iterable[Tuple[str, str, List[Tuple[str, str]]]]) -> Rollup:
+    """
+    تجميع خطوط (اللون، النتيجة، [(UCI، SAN), ...]) إلى عدادات لكل عقدة،
+    بما فيها جذر كل لون
+    """
+    nodes = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0) | {'san': ''})
+    for color, result, line in lines:
+        field = _result_field(color, result)
+        path = ()
+        root = nodes[(color, path)]
+        root['games'] += 1
+        root[field] += 1
+        for uci, san in line:
+            path += (uci,)
+            node = nodes[(color, path)]
+            node['san'] = node['san'] or san[:10]
+            node['games'] += 1
+            node[field] += 1
+    return nodes
+
+
+def _load_level(player: Player, depth: int, keys: List[Tuple[str, Tuple[str, ...]]],
+                node_ids: Dict) -> Dict:
+    """معرفات العقد الموجودة لمفاتيح مستوى واحد من الشجرة (استعلام واحد)"""
+    if depth == 0:
+        rows = RepertoireNode.objects.filter(player=player, parent__isnull=True).values_list('id', 'color')
+        return {(color, ()): pk for pk, color in rows}
+
+    parents = {node_ids[(color, path[:-1])]: (color, path[:-1]) for color, path in keys}
+    rows = RepertoireNode.objects.filter(parent_id__in=list(parents)).values_list('id', 'parent_id', 'move')
+    found = {}
+    for pk, parent_id, move in rows:
+        color, parent_path = parents[parent_id]
+        found[(color, parent_path + (move,))] = pk
+    return found
+
+
+def apply_rollup(player: Player, nodes: Rollup):
+    """
+    إضافة عدادات مجمعة إلى شجرة اللاعب مستوى بمستوى: إنشاء العقد الناقصة
+    (مع تجاهل ما أنشأته عملية موازية) ثم زيادة العدادات ذرياً بـ F()
+    """
+    by_depth = defaultdict(list)
+    for key in nodes:
+        by_depth[len(key[1])].append(key)
+
+    node_ids = {}
+    for depth in sorted(by_depth):
+        keys = by_depth[depth]
+        level = _load_level(player, depth, keys, node_ids)
+        missing = [key for key in keys if key not in level]
+        if missing:
+            RepertoireNode.objects.bulk_create([
+                RepertoireNode(
+                    player=player, color=color, ply=depth,
+                    parent_id=node_ids[(color, path[:-1])] if depth else None,
+                    move=path[-1] if depth else '', san=nodes[(color, path)]['san']
+                )
+                for color, path in missing
+            ], ignore_conflicts=True)
+            level = _load_level(player, depth, keys, node_ids)
+        node_ids.update(level)
+
+        for start in range(0, len(keys), UPDATE_BATCH_SIZE):
+            batch = {node_ids[key]: nodes[key] for key in keys[start:start + UPDATE_BATCH_SIZE]}
+            RepertoireNode.objects.filter(id__in=list(batch)).update(**{
+                field: F(field) + Case(
+                    *[When(id=pk, then=Value(counts[field])) for pk, counts in batch.items()],
+                    default=Value(0)
+                )
+                for field in COUNTER_FIELDS
+            })
+
+
+def apply_repertoire_delta(player: Player, new_games: Iterable[Game]):
+    """إضافة خطوط المباريات المدرجة حديثاً (game._line من تحليل PGN) إلى الشجرة"""
+    lines = []
+    for game in new_games:
+        line = getattr(game, '_line', None)
+        if line is not None:
+            lines.append((game.player_color, game.result, line))
+            game._line = None
+    if lines:
+        apply_rollup(player, rollup_lines(lines))
+
+
+def _pgn_line(pgn_content: str, max_ply: int) -> List[Tuple[str, str]]:
+    visitor = chess.pgn.read_game(io.StringIO(pgn_content), Visitor=lambda: GameInfoVisitor(line_plies=max_ply))
+    return visitor.line if visitor is not None else []
+
+
+def rebuild_repertoire(player: Player, max_ply: Optional[int] = None) -> int:
+    """إعادة بناء شجرة اللاعب بإعادة تشغيل نصوص PGN المخزنة، وإرجاع عدد العقد"""
+    max_ply = max_repertoire_ply() if max_ply is None else max_ply
+    games = Game.objects.filter(player=player, pgn_blob__isnull=False).select_related('pgn_blob').only(
+        'player_color', 'result', 'pgn_blob', 'pgn_blob__data'
+    )
+
+    def lines():
+        for game in games.iterator(chunk_size=500):
+            try:
+                yield game.player_color, game.result, _pgn_line(game.pgn_content, max_ply)
+            except Exception as e:
+                logger.error(f"خطأ في قراءة نقلات المباراة {game.id}: {e}")
+
+    nodes = rollup_lines(lines())
+    with transaction.atomic():
+        RepertoireNode.objects.filter(player=player).delete()
+        apply_rollup(player, nodes)
+    return len(nodes)
+
+
+def repertoire_branch(player: Player, color: str,
+                      node_id: Optional[int] = None) -> Tuple[Optional[RepertoireNode], List[RepertoireNode]]:
+    """
+    عقدة (الجذر إن لم تُحدد) وأبناؤها المباشرون فقط، مرتبين حسب عدد المباريات،
+    مع has_children لكل منها حتى تُوسَّع الشجرة عند الطلب
+    """
+    nodes = RepertoireNode.objects.filter(player=player, color=color).annotate(
+        has_children=Exists(RepertoireNode.objects.filter(parent=OuterRef('pk')))
+    )
+    if node_id is None:
+        node = nodes.filter(parent__isnull=True).first()
+    else:
+        node = nodes.filter(id=node_id).first()
+    if node is None:
+        return None, []
+    return node, list(nodes.filter(parent=node).order_by('-games', 'move'))
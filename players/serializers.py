@@ -1,9 +1,9 @@
 from rest_framework import serializers
-from .models import Player, PlayerStats, OpeningStat
+from .models import Player, PlayerStats, OpeningStat, LeaderboardEntry, RepertoireNode
 from games.models import Game
 
 class PlayerSerializer(serializers.ModelSerializer):
-    """مسلسل بيانات اللاعب"""
+    """مسلسل بيانات اللاعب (يُمرَّر له Player مع select_related('playerstats') في القوائم)"""
     win_percentage = serializers.SerializerMethodField()
     total_games = serializers.SerializerMethodField()
     
@@ -15,17 +15,15 @@ class PlayerSerializer(serializers.ModelSerializer):
     def get_win_percentage(self, obj):
         """حساب نسبة الفوز"""
         try:
-            stats = obj.playerstats
-            return stats.win_percentage
-        except:
+            return obj.playerstats.win_percentage
+        except PlayerStats.DoesNotExist:
             return 0
     
     def get_total_games(self, obj):
         """حساب إجمالي المباريات"""
         try:
-            stats = obj.playerstats
-            return stats.total_games
-        except:
+            return obj.playerstats.total_games
+        except PlayerStats.DoesNotExist:
             return 0
 
 class PlayerStatsSerializer(serializers.ModelSerializer):
@@ -62,3 +60,23 @@ class GameSerializer(serializers.ModelSerializer):
                  'result', 'date_played', 'time_control', 'player_color',
                  'opening_name', 'opening_eco', 'moves_count', 'game_url',
                  'player_won', 'is_draw']
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """مسلسل صف لوحة الصدارة"""
+    username = serializers.CharField(source='player.username', read_only=True)
+    current_rating = serializers.IntegerField(source='player.current_rating', read_only=True)
+    
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'username', 'country', 'current_rating', 'total_games',
+                 'wins', 'losses', 'draws', 'win_percentage']
+
+class RepertoireNodeSerializer(serializers.ModelSerializer):
+    """مسلسل عقدة شجرة الذخيرة (يُمرَّر له عقد مع has_children من repertoire_branch)"""
+    win_rate = serializers.ReadOnlyField()
+    has_children = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = RepertoireNode
+        fields = ['id', 'move', 'san', 'ply', 'games', 'wins', 'draws', 'losses',
+                 'win_rate', 'has_children']
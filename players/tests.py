@@ -1,3 +1,672 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import chess.pgn
+import requests
+
+from django.core.cache import cache
+from django.core.cache.backends.base import BaseCache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cache import invalidate_player
+from .chess_api import ChessComAPI
+from .eco import classify_pgn, default_eco_table
+from .http_cache import ArchiveCache, is_archive_immutable
+from .leaderboard import refresh_leaderboard_ranks, time_class_for
+from .models import LeaderboardEntry, OpeningStat, Player, PlayerStats, RepertoireNode
+from .pgn_parser import GameInfoVisitor, count_movetext_plies, parse_game_pgn
+from .repertoire import rebuild_repertoire
+from analysis.data_processor import GameDataProcessor
+from analysis.tasks import request_stats_refresh
+from utils.testing import IsolatedStorageTestCase
+from games.models import Game
+
+
+class StubChessComHandler(BaseHTTPRequestHandler):
+    """خادم HTTP محلي يحاكي Chess.com API"""
+
+    # المسار -> قائمة رموز الحالة التي تُرد قبل الاستجابة الناجحة
+    failures = {}
+    hits = defaultdict(int)
+    months = ['2024/01', '2024/02', '2024/03', '2024/04']
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        pending = self.failures.get(self.path, [])
+        if self.hits[self.path] <= len(pending):
+            self.send_response(pending[self.hits[self.path] - 1])
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+
+        if self.path.endswith('/games/archives'):
+            base = f'http://{self.headers["Host"]}/player/stub/games'
+            body = {'archives': [f'{base}/{month}' for month in self.months]}
+        elif '/games/' in self.path:
+            month = self.path.split('/games/')[1]
+            etag = f'"{month}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = {'games': [{'url': f'game-{month}-{i}'} for i in range(2)]}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if '/games/' in self.path and not self.path.endswith('/archives'):
+            self.send_header('ETag', f'"{self.path.split("/games/")[1]}"')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ChessComAPIFetchTests(SimpleTestCase):
+    """اختبارات الجلب المتوازي مقابل خادم محلي"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubChessComHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubChessComHandler.hits.clear()
+        StubChessComHandler.failures = {}
+        StubChessComHandler.months = ['2024/01', '2024/02', '2024/03', '2024/04']
+
+    def make_api(self, **kwargs):
+        options = {'max_workers': 4, 'requests_per_second': 1000, 'backoff_factor': 0}
+        options.update(kwargs)
+        return ChessComAPI(base_url=self.base_url, **options)
+
+    def test_concurrent_fetch_preserves_archive_order(self):
+        games = self.make_api().get_recent_games('stub', months_count=3)
+        self.assertEqual(
+            [game['url'] for game in games],
+            [f'game-2024/{month}-{i}' for month in ('02', '03', '04') for i in range(2)]
+        )
+
+    def test_retries_on_rate_limit_and_server_errors(self):
+        StubChessComHandler.failures = {
+            '/player/stub/games/2024/03': [429, 503],
+        }
+        games = self.make_api().get_recent_games('stub', months_count=2)
+        self.assertEqual(len(games), 4)
+        self.assertEqual(StubChessComHandler.hits['/player/stub/games/2024/03'], 3)
+
+    def test_gives_up_after_max_retries(self):
+        StubChessComHandler.failures = {
+            '/player/stub/games/2024/04': [500, 500, 500],
+        }
+        archives = self.make_api(max_retries=2).get_recent_archives('stub', months_count=1)
+        self.assertEqual(archives[0].games, [])
+        # الفشل ظاهر ولا يبدو كشهر فارغ
+        self.assertTrue(archives[0].failed)
+        self.assertEqual(StubChessComHandler.hits['/player/stub/games/2024/04'], 3)
+
+    def test_retry_after_is_validated_and_clamped(self):
+        api = self.make_api(backoff_factor=0.5, max_backoff=30)
+
+        def delay(retry_after, attempt=2):
+            response = requests.Response()
+            if retry_after is not None:
+                response.headers['Retry-After'] = retry_after
+            return api._retry_delay(response, attempt)
+
+        self.assertEqual(delay('3'), 3)
+        self.assertEqual(delay('86400'), 30)
+        # قيم غير صالحة تعود إلى التأخير الأسي: 0.5 × 2²
+        for invalid in ('soon', '-5', 'nan', 'inf', ''):
+            with self.subTest(retry_after=invalid):
+                self.assertEqual(delay(invalid), 2)
+        self.assertEqual(delay(None, attempt=10), 30)
+
+        # تاريخ HTTP: المدة حتى ذلك الوقت، وتاريخ مضى يعني إعادة فورية
+        soon = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+        self.assertAlmostEqual(delay(soon), 20, delta=2)
+        self.assertEqual(delay('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        far = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+        self.assertEqual(delay(far), 30)
+
+    def test_cached_archives_are_not_downloaded_again(self):
+        now = datetime.now(timezone.utc)
+        current_month = f'{now.year}/{now.month:02d}'
+        StubChessComHandler.months = ['2024/03', '2024/04', current_month]
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+
+        api = self.make_api(cache=ArchiveCache(cache_dir.name))
+        first = api.get_recent_archives('stub', months_count=3)
+        self.assertTrue(all(archive.needs_ingest for archive in first))
+        api.mark_archives_ingested([archive.url for archive in first])
+
+        StubChessComHandler.hits.clear()
+        second = api.get_recent_archives('stub', months_count=3)
+
+        # الأشهر المكتملة من القرص دون طلب، والشهر الحالي يُعاد التحقق منه (304)
+        self.assertEqual(StubChessComHandler.hits['/player/stub/games/2024/03'], 0)
+        self.assertEqual(StubChessComHandler.hits[f'/player/stub/games/{current_month}'], 1)
+        self.assertEqual([archive.games for archive in second], [archive.games for archive in first])
+        self.assertFalse(any(archive.needs_ingest for archive in second))
+
+    def test_cache_evicts_least_recently_used_entries(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache = ArchiveCache(cache_dir.name, max_bytes=600)
+
+        for month in range(1, 6):
+            cache.set(f'{self.base_url}/player/stub/games/2024/{month:02d}', {'games': ['x' * 100]})
+
+        self.assertIsNone(cache.get(f'{self.base_url}/player/stub/games/2024/01'))
+        self.assertIsNotNone(cache.get(f'{self.base_url}/player/stub/games/2024/05'))
+
+    def test_only_finished_months_are_immutable(self):
+        now = datetime(2024, 5, 10, tzinfo=timezone.utc)
+        self.assertTrue(is_archive_immutable('https://x/player/a/games/2024/04', now=now))
+        self.assertFalse(is_archive_immutable('https://x/player/a/games/2024/05', now=now))
+
+
+class OpeningWinRateTests(IsolatedStorageTestCase):
+    """معدل الفوز عمود محسوب في قاعدة البيانات"""
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        for name, games, wins in [('A', 10, 8), ('B', 10, 2), ('C', 10, 5), ('D', 0, 0)]:
+            OpeningStat.objects.create(player=self.player, opening_name=name, eco_code='C50',
+                                       games_played=games, wins=wins)
+
+    def test_win_rate_follows_counters(self):
+        self.assertEqual(OpeningStat.objects.get(opening_name='D').win_rate, 0)
+        OpeningStat.objects.filter(opening_name='C').update(
+            games_played=F('games_played') + 2, wins=F('wins') + 2
+        )
+        self.assertEqual(OpeningStat.objects.get(opening_name='C').win_rate, 58.3)
+
+    def test_openings_analysis_ranks_in_database(self):
+        response = self.client.get(reverse('player_openings', args=[self.player.username]))
+        analysis = response.json()['analysis']
+        self.assertEqual([o['opening_name'] for o in analysis['best_openings']], ['A'])
+        self.assertEqual([o['opening_name'] for o in analysis['worst_openings']], ['D', 'B'])
+        self.assertEqual(analysis['best_openings'][0]['win_rate'], 80.0)
+
+
+class LeaderboardTests(IsolatedStorageTestCase):
+    """لوحة الصدارة المحسوبة مسبقاً وترقيمها بالمؤشر"""
+
+    def setUp(self):
+        super().setUp()
+        rows = [('a', 'DZ', 20, 15), ('b', 'FR', 20, 10), ('c', 'DZ', 30, 15),
+                ('d', 'DZ', 40, 30), ('e', 'DZ', 5, 5)]
+        for username, country, games, wins in rows:
+            player = Player.objects.create(username=username, country=country)
+            LeaderboardEntry.objects.create(player=player, country=country, total_games=games,
+                                            wins=wins, losses=games - wins)
+        refresh_leaderboard_ranks()
+
+    def get(self, **params):
+        return self.client.get(reverse('leaderboard'), params).json()
+
+    def test_time_class_for(self):
+        self.assertEqual(time_class_for('60'), 'bullet')
+        self.assertEqual(time_class_for('120+1'), 'bullet')
+        self.assertEqual(time_class_for('180+2'), 'blitz')
+        self.assertEqual(time_class_for('600'), 'rapid')
+        self.assertEqual(time_class_for('1/86400'), 'daily')
+        self.assertIsNone(time_class_for(''))
+
+    def test_ranks_skip_players_below_min_games(self):
+        ranks = dict(LeaderboardEntry.objects.values_list('player__username', 'rank'))
+        self.assertEqual(ranks, {'d': 1, 'a': 2, 'c': 3, 'b': 4, 'e': None})
+
+    def test_cursor_pages_follow_ranking(self):
+        with self.assertNumQueries(1):
+            first = self.get(limit=2)
+        self.assertEqual([row['username'] for row in first['results']], ['d', 'a'])
+
+        second = self.get(limit=2, cursor=first['next_cursor'])
+        self.assertEqual([row['username'] for row in second['results']], ['c', 'b'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_country_filter(self):
+        data = self.get(country='DZ')
+        self.assertEqual([row['username'] for row in data['results']], ['d', 'a', 'c'])
+        self.assertEqual([row['rank'] for row in data['results']], [1, 2, 3])
+
+    def test_rejects_unknown_time_class(self):
+        self.assertEqual(self.client.get(reverse('leaderboard'), {'time_class': 'x'}).status_code, 400)
+
+    def test_v1_keeps_the_legacy_shape(self):
+        Player.objects.filter(username__in=['b', 'c']).update(current_rating=1800)
+        Player.objects.filter(username='e').update(current_rating=2000)
+        data = self.client.get(reverse('leaderboard_v1')).json()['leaderboards']
+        self.assertEqual([row['username'] for row in data['by_rating']], ['e', 'b', 'c'])
+        self.assertEqual(data['by_wins'][0], {'username': 'd', 'wins': 30, 'win_percentage': 75.0, 'total_games': 40})
+        self.assertEqual([row['username'] for row in data['by_wins']], ['d', 'a', 'c', 'b'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryBudgetTests(IsolatedStorageTestCase):
+    """
+    ميزانية الاستعلامات لكل نقطة نهاية: ثابتة مهما زاد عدد الصفوف،
+    فأي N+1 جديد يُسقط الاختبار
+    """
+
+    # اسم المسار -> (معاملات المسار, أقصى عدد استعلامات)
+    BUDGETS = {
+        'player_list': ((), 1),
+        'player_detail': (('player_0',), 3),
+        'player_openings': (('player_0',), 5),
+        # يشمل بناء لقطة المباريات في أول طلب
+        'player_performance': (('player_0',), 3),
+        'leaderboard': ((), 1),
+        'leaderboard_v1': ((), 2),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.add_players(0, 3)
+
+    def add_players(self, start, count):
+        for i in range(start, start + count):
+            player = Player.objects.create(username=f'player_{i}', country='DZ')
+            PlayerStats.objects.create(player=player, total_games=12, wins=6)
+            LeaderboardEntry.objects.create(player=player, total_games=12, wins=6, country='DZ')
+            for eco in ('B20', 'C50', 'D00'):
+                OpeningStat.objects.create(player=player, opening_name=eco, eco_code=eco,
+                                           games_played=10, wins=3 if eco == 'B20' else 7)
+            Game.objects.bulk_create([
+                Game(player=player, opponent_name=f'opp_{n}', result='1-0', player_color='white',
+                     date_played=date(2024, 1, 1) + timedelta(days=n), time_control='180+2',
+                     opening_name='B20', opening_eco='B20', moves_count=30)
+                for n in range(12)
+            ])
+
+    def count_queries(self, name):
+        args, _ = self.BUDGETS[name]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_endpoints_stay_within_budget(self):
+        for name, (_, budget) in self.BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(self.count_queries(name), budget)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for name in self.BUDGETS:
+            self.count_queries(name)
+        before = {name: self.count_queries(name) for name in self.BUDGETS}
+        self.add_players(3, 5)
+        after = {name: self.count_queries(name) for name in self.BUDGETS}
+        self.assertEqual(before, after)
+
+    def test_player_list_pages_by_cursor(self):
+        first = self.client.get(reverse('player_list'), {'limit': 2}).json()
+        self.assertEqual([p['username'] for p in first['players']], ['player_0', 'player_1'])
+        self.assertEqual(first['players'][0]['total_games'], 12)
+
+        second = self.client.get(reverse('player_list'), {'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([p['username'] for p in second['players']], ['player_2'])
+        self.assertIsNone(second['next_cursor'])
+
+
+class UnavailableCache(BaseCache):
+    """خادم ذاكرة مؤقتة متوقف: كل عملية ترفع ConnectionError"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+
+    def _unavailable(self, *args, **kwargs):
+        raise ConnectionError('cache server is down')
+
+    get = set = add = incr = delete = clear = _unavailable
+
+
+class CachedViewTests(IsolatedStorageTestCase):
+    """تخزين استجابات القراءة وإبطالها عند تغير بيانات اللاعب"""
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        PlayerStats.objects.create(player=self.player, total_games=10, wins=5)
+        self.url = reverse('player_detail', args=[self.player.username])
+
+    def test_repeated_reads_skip_the_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stats_commit_invalidates_cached_response(self):
+        first = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerStats.objects.filter(player=self.player).update(total_games=20)
+            invalidate_player(self.player.username)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()['stats']['total_games'], 20)
+
+    def test_unavailable_cache_falls_through_to_the_view(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'players.tests.UnavailableCache'}}):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['stats']['total_games'], 10)
+            with self.captureOnCommitCallbacks(execute=True):
+                invalidate_player(self.player.username)
+            with mock.patch('analysis.tasks.refresh_player_stats_task.delay') as delay:
+                self.assertTrue(request_stats_refresh(self.player))
+            delay.assert_called_once_with(self.player.id)
+
+
+class RecommendationsTests(IsolatedStorageTestCase):
+    """التوصيات تُقرأ من الإحصاءات المحسوبة ولا تكتب أثناء GET"""
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        OpeningStat.objects.create(player=self.player, opening_name='A', eco_code='C50',
+                                   games_played=10, wins=8)
+        self.url = reverse('player_recommendations', args=[self.player.username])
+
+    def add_game(self):
+        Game.objects.create(player=self.player, opponent_name='x', result='1-0', player_color='white',
+                            date_played=date(2024, 1, 1), opening_name='A', opening_eco='C50')
+
+    @mock.patch('analysis.tasks.refresh_player_stats_task.delay')
+    def test_get_never_writes(self, delay):
+        self.add_game()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url).json()
+        self.assertTrue(all(q['sql'].lstrip().upper().startswith('SELECT') for q in queries))
+        self.assertEqual(data['recommendations']['recommended'][0]['opening_name'], 'A')
+        self.assertFalse(data['stats_fresh'])
+
+    @mock.patch('analysis.tasks.refresh_player_stats_task.delay')
+    def test_refresh_is_scheduled_only_when_games_changed(self, delay):
+        PlayerStats.objects.create(player=self.player, last_analysis=datetime.now(timezone.utc))
+        self.assertTrue(self.client.get(self.url).json()['stats_fresh'])
+        delay.assert_not_called()
+
+        PlayerStats.objects.filter(player=self.player).update(
+            last_analysis=datetime.now(timezone.utc) - timedelta(hours=1)
+        )
+        self.add_game()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        delay.assert_called_once_with(self.player.id)
+
+
+class RepertoireTests(IsolatedStorageTestCase):
+    """شجرة الذخيرة تُبنى تدريجياً عند الإدخال وتُوسَّع عقدة بعقدة"""
+    player_username = 'ahmed_dz'
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('player_repertoire', args=[self.player.username])
+
+    def ingest(self, *games, **kwargs):
+        GameDataProcessor().process_games_batch(self.player, [
+            {'pgn': f'[White "{white}"]\n[Black "{black}"]\n[Result "{result}"]\n'
+                    f'[Date "2024.03.01"]\n[TimeControl "180+2"]\n\n{moves} {result}\n'}
+            for white, black, result, moves in games
+        ], **kwargs)
+
+    def tree(self):
+        return sorted(RepertoireNode.objects.filter(player=self.player).values_list(
+            'color', 'ply', 'move', 'san', 'games', 'wins', 'draws', 'losses'))
+
+    def branch(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_incremental_tree_matches_rebuild(self):
+        self.ingest(('ahmed_dz', 'a', '1-0', '1. e4 e5 2. Nf3 Nc6'),
+                    ('b', 'ahmed_dz', '1-0', '1. e4 c5 2. Nf3'))
+        self.ingest(('ahmed_dz', 'c', '1/2-1/2', '1. e4 e5 2. Bc4'),
+                    ('ahmed_dz', 'd', '0-1', '1. d4 d5'), bulk=False)
+
+        incremental = self.tree()
+        self.assertIn(('white', 1, 'e2e4', 'e4', 2, 1, 1, 0), incremental)
+        self.assertIn(('white', 2, 'e7e5', 'e5', 2, 1, 1, 0), incremental)
+        self.assertIn(('black', 0, '', '', 1, 0, 0, 1), incremental)
+        rebuild_repertoire(self.player)
+        self.assertEqual(self.tree(), incremental)
+
+    def test_tree_expands_lazily(self):
+        self.ingest(('ahmed_dz', 'a', '1-0', '1. e4 e5 2. Nf3'),
+                    ('ahmed_dz', 'b', '0-1', '1. e4 c5'),
+                    ('ahmed_dz', 'c', '1-0', '1. d4'))
+
+        root = self.branch()
+        self.assertEqual(root['node']['games'], 3)
+        self.assertEqual([(c['san'], c['games'], c['has_children']) for c in root['children']],
+                         [('e4', 2, True), ('d4', 1, False)])
+
+        e4 = self.branch(node=root['children'][0]['id'])
+        self.assertEqual([(c['san'], c['wins'], c['losses']) for c in e4['children']],
+                         [('c5', 0, 1), ('e5', 1, 0)])
+
+        self.assertIsNone(self.branch(color='black')['node'])
+        other = RepertoireNode.objects.create(player=Player.objects.create(username='x'), color='white')
+        self.assertEqual(self.client.get(self.url, {'node': other.id}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'color': 'red'}).status_code, 400)
+
+
+class PgnParserTests(SimpleTestCase):
+    """المرور الواحد لـ GameInfoVisitor مقابل بناء شجرة المباراة كما كان قبله"""
+
+    GAMES = [
+        # تعليقات وساعات وخطوط فرعية متداخلة و NAG وتبييت
+        '[White "ahmed_dz"]\n[Black "x"]\n[Result "1-0"]\n[Date "2024.03.05"]\n[WhiteElo "1500"]\n'
+        '[BlackElo "1600"]\n[TimeControl "180+2"]\n[ECO "C50"]\n\n'
+        '1. e4 {[%clk 0:02:59.9]} (1. d4 d5 (1... Nf6)) e5! 2. Nf3 $1 ; تعليق سطر\n'
+        'Nc6 3. Bc4 Bc5 4. O-O Nf6 5. d3 O-O 1-0\n',
+        # ترقية وكش مات
+        '[White "x"]\n[Black "ahmed_dz"]\n[Result "0-1"]\n[Date "2024.03.06"]\n'
+        '[FEN "8/P7/8/8/8/8/5k2/7K w - - 0 1"]\n[SetUp "1"]\n\n1. a8=Q Kg3 2. Qa3+ Kf2 0-1\n',
+        # بلا نقلات
+        '[White "ahmed_dz"]\n[Black "x"]\n[Result "1/2-1/2"]\n\n1/2-1/2\n',
+    ]
+
+    def old_parse(self, pgn_content, username):
+        """مسار ما قبل GameInfoVisitor: شجرة المباراة كاملة ثم رؤوسها ونقلاتها"""
+        game = chess.pgn.read_game(io.StringIO(pgn_content))
+        color = 'white' if username in game.headers.get('White', '') else 'black'
+        return {
+            'player_color': color,
+            'opponent': game.headers['Black' if color == 'white' else 'White'],
+            'result': game.headers.get('Result'),
+            'moves_count': len(list(game.mainline_moves())),
+            'opening_eco': game.headers.get('ECO', '???'),
+        }
+
+    def test_matches_the_old_multi_parse(self):
+        for pgn_content in self.GAMES:
+            with self.subTest(pgn=pgn_content[:40]):
+                info = parse_game_pgn(pgn_content, 'ahmed_dz')
+                self.assertEqual({key: info[key] for key in ('player_color', 'opponent', 'result',
+                                                             'moves_count', 'opening_eco')},
+                                 self.old_parse(pgn_content, 'ahmed_dz'))
+
+    def test_reads_the_game_once(self):
+        with mock.patch('players.pgn_parser.chess.pgn.read_game', wraps=chess.pgn.read_game) as read_game:
+            info = parse_game_pgn(self.GAMES[0], 'ahmed_dz', position_plies=4, line_plies=4,
+                                  eco_table=default_eco_table(), record_moves=True)
+        self.assertEqual(read_game.call_count, 1)
+        self.assertEqual((info['moves_count'], len(info['move_codes']), len(info['line'])), (10, 10, 4))
+        self.assertEqual((info['player_rating'], info['opponent_rating']), (1500, 1600))
+        self.assertEqual(info['clocks'][0], 17990)
+
+    def test_move_count_skips_variations_and_comments(self):
+        for pgn_content, plies in zip(self.GAMES, (10, 4, 0)):
+            with self.subTest(pgn=pgn_content[:40]):
+                visitor = chess.pgn.read_game(io.StringIO(pgn_content), Visitor=GameInfoVisitor)
+                self.assertEqual(visitor.moves_count, plies)
+                self.assertEqual(count_movetext_plies(pgn_content), plies)
+
+    def test_headers_only_does_not_replay_moves(self):
+        visitor = chess.pgn.read_game(io.StringIO(self.GAMES[0]),
+                                      Visitor=lambda: GameInfoVisitor(headers_only=True, position_plies=4))
+        self.assertEqual((visitor.moves_count, visitor.positions), (0, {}))
+        self.assertEqual(visitor.headers['ECO'], 'C50')
+
+        for pgn_content in self.GAMES:
+            with self.subTest(pgn=pgn_content[:40]):
+                full = parse_game_pgn(pgn_content, 'ahmed_dz')
+                headers_only = parse_game_pgn(pgn_content, 'ahmed_dz', headers_only=True)
+                self.assertEqual(headers_only['moves_count'], full['moves_count'])
+                self.assertEqual({key: headers_only[key] for key in ('opponent', 'result', 'date', 'opening_eco')},
+                                 {key: full[key] for key in ('opponent', 'result', 'date', 'opening_eco')})
+
+    def test_malformed_pgn(self):
+        self.assertIsNone(parse_game_pgn('', 'ahmed_dz'))
+        self.assertIsNone(parse_game_pgn('ليس PGN', 'ahmed_dz'))
+        # اللاعب ليس طرفاً في المباراة
+        self.assertIsNone(parse_game_pgn(self.GAMES[0], 'someone_else'))
+
+        # نقلة غير قانونية: يُسجل الخطأ ويتوقف العد عندها كما في GameBuilder
+        illegal = '[White "ahmed_dz"]\n[Black "x"]\n[Result "1-0"]\n\n1. e4 e5 2. Nf3 Qxe4 3. Nc3 1-0\n'
+        visitor = chess.pgn.read_game(io.StringIO(illegal), Visitor=GameInfoVisitor)
+        self.assertEqual(len(visitor.errors), 1)
+        with self.assertLogs('chess.pgn', level='ERROR'):
+            old_count = self.old_parse(illegal, 'ahmed_dz')['moves_count']
+        self.assertEqual(parse_game_pgn(illegal, 'ahmed_dz')['moves_count'], old_count)
+
+
+class EcoClassifierTests(IsolatedStorageTestCase):
+    """تصنيف الافتتاح من النقلات بجدول ECO المرفق"""
+
+    def pgn(self, moves, headers=''):
+        return f'[White "ahmed_dz"]\n[Black "x"]\n[Result "1-0"]\n{headers}\n{moves} 1-0\n'
+
+    def test_classifies_by_position_including_transpositions(self):
+        self.assertEqual(classify_pgn(self.pgn('1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6 6. Be3')),
+                         ('B90', 'Sicilian Defense: Najdorf Variation'))
+        self.assertEqual(classify_pgn(self.pgn('1. Nf3 d5 2. d4 Nf6 3. c4 e6 4. Nc3'))[0], 'D37')
+        self.assertIsNone(classify_pgn(self.pgn('')))
+
+    def test_moves_override_headers_which_remain_a_fallback(self):
+        table = default_eco_table()
+        info = parse_game_pgn(self.pgn('1. e4 c5 2. c3', '[ECO "A00"]\n[Opening "Wrong"]\n'),
+                              'ahmed_dz', eco_table=table)
+        self.assertEqual((info['opening_eco'], info['opening_name']), ('B22', 'Sicilian Defense: Alapin Variation'))
+
+        info = parse_game_pgn(self.pgn('', '[ECO "C50"]\n'), 'ahmed_dz', eco_table=table)
+        self.assertEqual(info['opening_eco'], 'C50')
+
+    def test_more_precise_header_code_is_kept(self):
+        table = default_eco_table()
+        kid = '1. d4 Nf6 2. c4 g6 3. Nc3 Bg7 4. e4 d6 5. Nf3 O-O 6. Be2 e5 7. O-O Nc6 8. d5 Ne7'
+        # الجدول يبلغ E90 فقط، والرأس يحدد E97 داخل العائلة نفسها
+        info = parse_game_pgn(self.pgn(kid, '[ECO "E97"]\n'), 'ahmed_dz', eco_table=table)
+        self.assertEqual((info['opening_eco'], info['opening_name']),
+                         ('E97', "King's Indian Defense: Normal Variation"))
+        self.assertEqual(classify_pgn(self.pgn(kid, '[ECO "E97"]\n[Opening "KID: Aronin-Taimanov"]\n')),
+                         ('E97', 'KID: Aronin-Taimanov'))
+
+        # مباراة توقفت عند 1. e4 c5 والرأس يحدد خطاً أعمق في الجدول
+        info = parse_game_pgn(self.pgn('1. e4 c5', '[ECO "B90"]\n'), 'ahmed_dz', eco_table=table)
+        self.assertEqual(info['opening_eco'], 'B90')
+
+        # رأس أقل دقة من تطابق الجدول لا يغلبه
+        info = parse_game_pgn(self.pgn('1. e4 c5 2. c3', '[ECO "B20"]\n'), 'ahmed_dz', eco_table=table)
+        self.assertEqual(info['opening_eco'], 'B22')
+
+    def test_extract_opening_name_reads_the_game_once(self):
+        api = ChessComAPI()
+        cases = [
+            (self.pgn('1. e4 c5 2. c3', '[ECO "A00"]\n'), ('Sicilian Defense: Alapin Variation', 'B22')),
+            # خط لا يبلغ الجدول: الاحتياط بالرؤوس من المرور نفسه
+            (self.pgn('', '[ECO "C50"]\n[Opening "Italian Game"]\n'), ('Italian Game', 'C50')),
+            ('', ('غير معروف', '???')),
+        ]
+        for pgn_content, expected in cases:
+            with self.subTest(expected=expected):
+                with mock.patch('players.eco.chess.pgn.read_game', wraps=chess.pgn.read_game) as read_game, \
+                        mock.patch('chess.pgn.read_headers') as read_headers:
+                    self.assertEqual(api.extract_opening_name(pgn_content), expected)
+                self.assertEqual(read_game.call_count, 1)
+                read_headers.assert_not_called()
+
+    def test_reclassify_command_updates_games_and_opening_stats(self):
+        player = Player.objects.create(username='ahmed_dz')
+        for opponent, moves in (('a', '1. d4 d5 2. c4 dxc4'), ('b', '1. e4 e6 2. d4 d5 3. e5')):
+            Game(player=player, opponent_name=opponent, result='1-0', player_color='white',
+                 date_played=date(2024, 3, 1), opening_name='غير معروف', opening_eco='???',
+                 pgn_content=self.pgn(moves)).save()
+        OpeningStat.objects.create(player=player, opening_name='قديم', eco_code='???', games_played=2)
+
+        call_command('reclassify_openings', workers=2, batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual(sorted(Game.objects.values_list('opening_eco', flat=True)), ['C02', 'D20'])
+        self.assertEqual(sorted(OpeningStat.objects.values_list('eco_code', 'games_played')),
+                         [('C02', 1), ('D20', 1)])
+
+
+class FetchPlayerDataTests(IsolatedStorageTestCase):
+    def fetch(self, **data):
+        return self.client.post(reverse('fetch_player_data'), {'username': 'ahmed_dz', **data},
+                                content_type='application/json')
+
+    @mock.patch('players.views.ingest_player_games_task.delay')
+    def test_starts_background_ingest(self, delay):
+        delay.return_value = mock.Mock(id='task-1')
+        response = self.fetch(months=2, parallel=True)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['task_id'], 'task-1')
+        self.assertEqual(response.json()['status_url'], '/api/players/task-status/task-1/')
+        delay.assert_called_once_with('ahmed_dz', 2, full=False, parallel=True)
+
+    @mock.patch('players.views.ingest_player_games_task.delay')
+    def test_rejects_invalid_months(self, delay):
+        for months in ('abc', 0, None):
+            self.assertEqual(self.fetch(months=months).status_code, 400)
+        delay.assert_not_called()
+
+    @mock.patch('players.views.AsyncResult')
+    def test_task_status_reports_ingest_progress(self, async_result):
+        async_result.return_value = mock.Mock(state='PROGRESS', info={
+            'current': 1, 'total': 3, 'status': 'جلب الأشهر (1/3) - 40 مباراة',
+            'months_fetched': 1, 'games_processed': 40
+        })
+        data = self.client.get(reverse('task_status', args=['task-1'])).json()
+        self.assertEqual((data['state'], data['current'], data['total']), ('PROGRESS', 1, 3))
+        self.assertEqual((data['months_fetched'], data['games_processed']), (1, 40))
@@ -2,21 +2,55 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Count, Q, Avg
+from django.utils.dateparse import parse_date
 from .models import Player, PlayerStats, OpeningStat
 from games.models import Game
+from games.positions import fen_key, games_reaching_position
 from .serializers import (PlayerSerializer, PlayerStatsSerializer, 
-                         OpeningStatSerializer, GameSerializer)
-from utils.data_helpers import update_player_stats, get_opening_recommendations
+                         OpeningStatSerializer, GameSerializer, LeaderboardEntrySerializer,
+                         RepertoireNodeSerializer)
+from .leaderboard import TIME_CLASSES, leaderboard_page, legacy_leaderboards
+from .history import PERIODS, performance_history
+from .repertoire import repertoire_branch
+from .cache import LEADERBOARD_SCOPE, cached_view, player_scope
+from utils.data_helpers import (update_player_stats, get_opening_recommendations,
+                                player_stats_are_stale)
+from analysis.snapshot import load_player_snapshot, snapshot_aggregates
+from analysis.time_management import load_clock_arrays, time_management_stats
+
+# حجم صفحة قائمة اللاعبين الافتراضي والأقصى
+PLAYER_PAGE_SIZE = 50
+PLAYER_PAGE_MAX = 200
 
 @api_view(['GET'])
 def player_list(request):
-    """عرض قائمة اللاعبين مع الإحصاءات الأساسية"""
-    players = Player.objects.all()
+    """
+    عرض قائمة اللاعبين مع الإحصاءات الأساسية، مقسمة إلى صفحات بالمؤشر
+    
+    المعاملات: cursor (معرف آخر لاعب في الصفحة السابقة)، limit
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', PLAYER_PAGE_SIZE)), 1), PLAYER_PAGE_MAX)
+        cursor = int(request.query_params.get('cursor', 0))
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'معاملات الصفحة غير صالحة'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # صف إضافي لمعرفة وجود صفحة تالية دون count()
+    players = list(
+        Player.objects.select_related('playerstats').filter(id__gt=cursor).order_by('id')[:limit + 1]
+    )
+    has_more = len(players) > limit
+    players = players[:limit]
+    
     serializer = PlayerSerializer(players, many=True)
     return Response({
         'success': True,
         'players': serializer.data,
-        'count': players.count()
+        'count': len(players),
+        'next_cursor': players[-1].id if has_more else None
     })
 
 @api_view(['POST'])
@@ -56,10 +90,11 @@ def add_player(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@cached_view(player_scope)
 def player_detail(request, username):
     """عرض تفاصيل اللاعب الكاملة"""
     try:
-        player = Player.objects.get(username=username)
+        player = Player.objects.select_related('playerstats').get(username=username)
         
         # بيانات اللاعب الأساسية
         player_data = PlayerSerializer(player).data
@@ -72,11 +107,11 @@ def player_detail(request, username):
             stats_data = None
         
         # إحصاءات الافتتاحات
-        openings = OpeningStat.objects.filter(player=player)
+        openings = OpeningStat.objects.filter(player=player).select_related('player')
         openings_data = OpeningStatSerializer(openings, many=True).data
         
         # آخر المباريات
-        recent_games = Game.objects.filter(player=player).order_by('-date_played')[:10]
+        recent_games = Game.objects.filter(player=player).select_related('player').order_by('-date_played')[:10]
         games_data = GameSerializer(recent_games, many=True).data
         
         return Response({
@@ -94,21 +129,23 @@ def player_detail(request, username):
         }, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
+@cached_view(player_scope)
 def player_openings_analysis(request, username):
     """تحليل تفصيلي لافتتاحات اللاعب"""
     try:
         player = Player.objects.get(username=username)
-        openings = OpeningStat.objects.filter(player=player).order_by('-win_rate')
+        openings = OpeningStat.objects.filter(player=player).select_related('player')
+        total_openings = openings.count()
         
-        if not openings.exists():
+        if not total_openings:
             return Response({
                 'success': False,
                 'message': 'لا توجد بيانات افتتاحات لهذا اللاعب'
             })
         
         # تصنيف الافتتاحات
-        best_openings = openings.filter(win_rate__gte=60)[:5]
-        worst_openings = openings.filter(win_rate__lt=40)[:5]
+        best_openings = openings.filter(win_rate__gte=60).order_by('-win_rate')[:5]
+        worst_openings = openings.filter(win_rate__lt=40).order_by('win_rate')[:5]
         most_played = openings.order_by('-games_played')[:5]
         
         return Response({
@@ -118,7 +155,7 @@ def player_openings_analysis(request, username):
                 'best_openings': OpeningStatSerializer(best_openings, many=True).data,
                 'worst_openings': OpeningStatSerializer(worst_openings, many=True).data,
                 'most_played': OpeningStatSerializer(most_played, many=True).data,
-                'total_openings': openings.count()
+                'total_openings': total_openings
             }
         })
         
@@ -128,44 +165,185 @@ def player_openings_analysis(request, username):
             'error': 'اللاعب غير موجود'
         }, status=status.HTTP_404_NOT_FOUND)
 
+def _parse_date_param(value):
+    """YYYY-MM-DD -> date، وValueError إن كانت الصيغة غير صالحة"""
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+@api_view(['GET'])
+@cached_view(player_scope)
+def player_performance_history(request, username):
+    """
+    الأداء عبر الزمن من التجميعات اليومية
+    
+    المعاملات: time_class (all/bullet/blitz/rapid/daily)، period (day/week/month)،
+    from و to بصيغة YYYY-MM-DD
+    """
+    time_class = request.query_params.get('time_class', 'all')
+    period = request.query_params.get('period', 'day')
+    if time_class not in TIME_CLASSES or period not in PERIODS:
+        return Response({
+            'success': False,
+            'error': f'القيم المتاحة: time_class={"/".join(TIME_CLASSES)}، period={"/".join(PERIODS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date_from, date_to = (
+            _parse_date_param(request.query_params.get(name)) for name in ('from', 'to')
+        )
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'صيغة التاريخ يجب أن تكون YYYY-MM-DD'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        player = Player.objects.get(username=username)
+    except Player.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'اللاعب غير موجود'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'player_username': username,
+        'time_class': time_class,
+        'period': period,
+        'history': performance_history(player, time_class, period, date_from, date_to)
+    })
+
+@api_view(['GET'])
+@cached_view(player_scope)
+def player_repertoire(request, username):
+    """
+    فرع من شجرة ذخيرة اللاعب: العقدة وأبناؤها المباشرون مع نتائج كل نقلة،
+    وتُوسَّع الشجرة بطلب node لأي ابن له has_children
+    
+    المعاملات: color (white/black)، node (معرف العقدة، الجذر إن لم يُحدد)
+    """
+    color = request.query_params.get('color', 'white')
+    node_id = request.query_params.get('node', '')
+    if color not in ('white', 'black') or (node_id and not node_id.isdigit()):
+        return Response({
+            'success': False,
+            'error': 'المعاملات المتاحة: color=white/black و node رقم عقدة'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    node_id = int(node_id) if node_id else None
+    
+    try:
+        player = Player.objects.get(username=username)
+    except Player.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'اللاعب غير موجود'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    node, children = repertoire_branch(player, color, node_id)
+    if node is None and node_id is not None:
+        return Response({
+            'success': False,
+            'error': 'العقدة غير موجودة'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'player_username': username,
+        'color': color,
+        'node': RepertoireNodeSerializer(node).data if node else None,
+        'children': RepertoireNodeSerializer(children, many=True).data
+    })
+
+# عدد المباريات المعروضة افتراضياً وحدها الأقصى في بحث الوضعيات
+POSITION_GAMES_LIMIT = 20
+POSITION_GAMES_MAX = 100
+
+@api_view(['GET'])
+@cached_view(player_scope)
+def player_position_games(request, username):
+    """
+    مباريات اللاعب التي بلغت وضعية معينة ونتائجها (فوز/تعادل/خسارة) من فهرس الوضعيات
+    
+    المعاملات: fen (مطلوب)، limit
+    """
+    fen = request.query_params.get('fen', '').strip()
+    try:
+        key = fen_key(fen)
+        limit = min(max(int(request.query_params.get('limit', POSITION_GAMES_LIMIT)), 1), POSITION_GAMES_MAX)
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'يجب تمرير وضعية FEN صالحة وحد limit صحيح'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        player = Player.objects.get(username=username)
+    except Player.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'اللاعب غير موجود'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    result = games_reaching_position(player, key, limit)
+    result['games'] = GameSerializer(result['games'], many=True).data
+    return Response({
+        'success': True,
+        'player_username': username,
+        'fen': fen,
+        **result
+    })
+
+@api_view(['GET'])
+def game_pgn(request, game_id):
+    """نص PGN لمباراة واحدة (يُحمَّل ويُفك ضغطه هنا فقط)"""
+    try:
+        game = Game.objects.select_related('pgn_blob').get(id=game_id)
+    except Game.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'المباراة غير موجودة'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'game_id': game.id,
+        'pgn': game.pgn_content
+    })
+
 @api_view(['GET'])
+@cached_view(player_scope)
 def player_performance_stats(request, username):
     """إحصاءات الأداء المتقدمة"""
     try:
         player = Player.objects.get(username=username)
-        games = Game.objects.filter(player=player)
+        
+        # جميع الأرقام بعمليات متجهة على لقطة المباريات العمودية
+        totals = snapshot_aggregates(load_player_snapshot(player))
         
         # إحصاءات عامة
-        total_games = games.count()
+        total_games = totals['total_games']
         if total_games == 0:
             return Response({
                 'success': False,
                 'error': 'لا توجد مباريات لهذا اللاعب'
             })
         
-        # إحصاءات حسب اللون
-        white_games = games.filter(player_color='white')
-        black_games = games.filter(player_color='black')
-        
-        white_wins = white_games.filter(result='1-0').count()
-        black_wins = black_games.filter(result='0-1').count()
-        
         return Response({
             'success': True,
             'player_username': username,
             'performance': {
                 'total_games': total_games,
+                'wins': totals['wins'],
+                'draws': totals['draws'],
+                'losses': totals['losses'],
+                'average_moves': totals['average_moves'],
                 'color_stats': {
-                    'as_white': {
-                        'games': white_games.count(),
-                        'wins': white_wins,
-                        'win_rate': round((white_wins / white_games.count()) * 100, 1) if white_games.count() > 0 else 0
-                    },
-                    'as_black': {
-                        'games': black_games.count(),
-                        'wins': black_wins,
-                        'win_rate': round((black_wins / black_games.count()) * 100, 1) if black_games.count() > 0 else 0
-                    }
+                    'as_white': totals['white'],
+                    'as_black': totals['black']
                 }
             }
         })
@@ -177,13 +355,47 @@ def player_performance_stats(request, username):
         }, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
-def leaderboard(request):
-    """لوحة الصدارة للاعبين"""
-    # ترتيب حسب التصنيف
-    by_rating = Player.objects.filter(current_rating__isnull=False).order_by('-current_rating')[:10]
+@cached_view(player_scope)
+def player_time_management(request, username):
+    """
+    إدارة الوقت من ساعات [%clk] المخزنة: الوقت لكل مرحلة، ضيق الوقت وسباقات الوقت
     
-    # ترتيب حسب نسبة الفوز
-    players_with_stats = PlayerStats.objects.filter(total_games__gte=10).order_by('-wins')[:10]
+    المعاملات: time_class (all/bullet/blitz/rapid)
+    """
+    time_class = request.query_params.get('time_class', 'all')
+    if time_class not in TIME_CLASSES or time_class == 'daily':
+        return Response({
+            'success': False,
+            'error': 'القيم المتاحة: time_class=all/bullet/blitz/rapid'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        player = Player.objects.get(username=username)
+    except Player.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'اللاعب غير موجود'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    stats = time_management_stats(load_clock_arrays(player, time_class))
+    if stats['games_analyzed'] == 0:
+        return Response({
+            'success': False,
+            'error': 'لا توجد مباريات بساعات مسجلة لهذا اللاعب'
+        })
+    
+    return Response({
+        'success': True,
+        'player_username': username,
+        'time_class': time_class,
+        'time_management': stats
+    })
+
+@api_view(['GET'])
+@cached_view(lambda: LEADERBOARD_SCOPE)
+def leaderboard_v1(request):
+    """لوحة الصدارة بالشكل القديم (leaderboards.by_rating / by_wins) للعملاء الحاليين"""
+    by_rating, by_wins = legacy_leaderboards()
     
     return Response({
         'success': True,
@@ -191,23 +403,75 @@ def leaderboard(request):
             'by_rating': PlayerSerializer(by_rating, many=True).data,
             'by_wins': [
                 {
-                    'username': stat.player.username,
-                    'wins': stat.wins,
-                    'win_percentage': stat.win_percentage,
-                    'total_games': stat.total_games
-                } for stat in players_with_stats
+                    'username': entry.player.username,
+                    'wins': entry.wins,
+                    'win_percentage': entry.win_percentage,
+                    'total_games': entry.total_games
+                } for entry in by_wins
             ]
         }
     })
 
+@api_view(['GET'])
+@cached_view(lambda: LEADERBOARD_SCOPE)
+def leaderboard(request):
+    """
+    لوحة الصدارة حسب نسبة الفوز من الجدول المحسوب مسبقاً (v2)
+    
+    المعاملات: time_class (all/bullet/blitz/rapid/daily)، country، cursor، limit (حتى 100)
+    
+    ترتيب الصفوف يتبع العدادات الحالية دائماً، أما حقل rank فمتسق لاحقاً
+    (يُحدَّث بمهمة refresh_leaderboard_ranks_task بعد كل إدخال)
+    """
+    time_class = request.query_params.get('time_class', 'all')
+    country = request.query_params.get('country') or None
+    cursor = request.query_params.get('cursor') or None
+    
+    if time_class not in TIME_CLASSES:
+        return Response({
+            'success': False,
+            'error': f'الفئة الزمنية غير معروفة، القيم المتاحة: {", ".join(TIME_CLASSES)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 100)
+        entries, next_cursor = leaderboard_page(time_class, country, cursor, limit)
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'معاملات الصفحة غير صالحة'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    next_url = None
+    if next_cursor:
+        params = request.query_params.copy()
+        params['cursor'] = next_cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    
+    return Response({
+        'success': True,
+        'time_class': time_class,
+        'country': country,
+        'results': LeaderboardEntrySerializer(entries, many=True).data,
+        'next_cursor': next_cursor,
+        'next': next_url
+    })
+
 @api_view(['GET'])
 def player_recommendations(request, username):
-    """توصيات تحسين الأداء للاعب"""
+    """توصيات تحسين الأداء للاعب (قراءة فقط من الإحصاءات المحسوبة مسبقاً)"""
     try:
-        player = Player.objects.get(username=username)
+        player = Player.objects.select_related('playerstats').get(username=username)
+        
+        try:
+            stats = player.playerstats
+        except PlayerStats.DoesNotExist:
+            stats = None
         
-        # تحديث الإحصاءات أولاً
-        update_player_stats(player)
+        # لا كتابة أثناء GET: إن تغيرت المباريات منذ آخر تحليل تُجدول إعادة الحساب في الخلفية
+        stale = player_stats_are_stale(player, stats)
+        if stale:
+            request_stats_refresh(player)
         
         # الحصول على التوصيات
         recommendations = get_opening_recommendations(player)
@@ -215,7 +479,9 @@ def player_recommendations(request, username):
         return Response({
             'success': True,
             'player_username': username,
-            'recommendations': recommendations
+            'recommendations': recommendations,
+            'stats_fresh': not stale,
+            'last_analysis': stats.last_analysis if stats else None
         })
         
     except Player.DoesNotExist:
@@ -237,14 +503,19 @@ def analyze_player(request):
     try:
         player = Player.objects.get(username=username)
         
-        # تحديث إحصاءات اللاعب
+        # تحديث أرقام اللاعب فوراً باستعلام واحد، وجدولة إعادة البناء الكاملة
+        # (الافتتاحات، لوحة الصدارة، السجل واللقطة) في الخلفية إن تغيرت المباريات
         stats = update_player_stats(player)
+        refresh_queued = (
+            stats is not None and player_stats_are_stale(player, stats) and request_stats_refresh(player)
+        )
         
         return Response({
             'success': True,
             'message': f'تم تحليل مباريات اللاعب {username} بنجاح',
             'player': PlayerSerializer(player).data,
-            'stats_updated': stats is not None
+            'stats_updated': stats is not None,
+            'full_refresh_queued': refresh_queued
         })
         
     except Player.DoesNotExist:
@@ -257,15 +528,14 @@ def analyze_player(request):
             'success': False,
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-from .chess_api import ChessComAPI
-from analysis.data_processor import GameDataProcessor
-from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 def fetch_player_data(request):
-    """جلب وتحليل بيانات اللاعب من Chess.com"""
+    """جلب وتحليل بيانات اللاعب من Chess.com (في الخلفية عبر Celery)"""
     username = request.data.get('username')
-    months_count = request.data.get('months', 3)  # عدد الأشهر الافتراضي
     
     if not username:
         return Response({
@@ -274,68 +544,40 @@ def fetch_player_data(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # تهيئة الخدمات
-        chess_api = ChessComAPI()
-        data_processor = GameDataProcessor()
-        
-        # التحقق من وجود اللاعب على Chess.com
-        player_info = chess_api.get_player_info(username)
-        if not player_info:
-            return Response({
-                'success': False,
-                'error': f'لم يتم العثور على اللاعب {username} في Chess.com'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # إنشاء أو تحديث سجل اللاعب
-        player, created = Player.objects.get_or_create(
-            username=username,
-            defaults={
-                'full_name': player_info.get('name', ''),
-                'country': player_info.get('country', '').split('/')[-1] if player_info.get('country') else 'DZ',
-                'avatar_url': player_info.get('avatar', '')
-            }
+        months_count = int(request.data.get('months', 3))  # عدد الأشهر الافتراضي
+        if months_count < 1:
+            raise ValueError(months_count)
+    except (TypeError, ValueError):
+        return Response({
+            'success': False,
+            'error': 'عدد الأشهر يجب أن يكون عدداً صحيحاً موجباً'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # الجلب والتحليل والكتابة كلها في مهمة خلفية بدلاً من خيط الطلب
+        task = ingest_player_games_task.delay(
+            username,
+            months_count,
+            full=bool(request.data.get('full', False)),
+            parallel=bool(request.data.get('parallel', False))
         )
         
-        # تحديث التصنيف الحالي
-        stats_data = chess_api.get_player_stats(username)
-        if stats_data and 'chess_rapid' in stats_data:
-            rating_info = stats_data['chess_rapid'].get('last', {})
-            player.current_rating = rating_info.get('rating')
-            player.save()
-        
-        # جلب المباريات
-        logger.info(f"بدء جلب مباريات اللاعب {username} لآخر {months_count} أشهر")
-        games_data = chess_api.get_recent_games(username, months_count)
-        
-        if not games_data:
-            return Response({
-                'success': False,
-                'error': 'لا توجد مباريات متاحة للاعب'
-            })
-        
-        # معالجة المباريات
-        processing_result = data_processor.process_games_batch(player, games_data)
-        
         return Response({
             'success': True,
-            'message': f'تم تحليل بيانات اللاعب {username} بنجاح',
-            'player': PlayerSerializer(player).data,
-            'processing': {
-                'total_fetched': len(games_data),
-                'processed': processing_result['processed'],
-                'skipped': processing_result['skipped'],
-                'new_openings': processing_result['new_openings']
-            }
-        })
+            'message': f'تم بدء جلب بيانات اللاعب {username} في الخلفية',
+            'task_id': task.id,
+            'status_url': f'/api/players/task-status/{task.id}/'
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
-        logger.error(f"خطأ في جلب بيانات اللاعب {username}: {e}")
+        logger.error(f"خطأ في بدء جلب بيانات اللاعب {username}: {e}")
         return Response({
             'success': False,
             'error': f'خطأ في معالجة البيانات: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-from analysis.tasks import analyze_player_background, simulate_chess_analysis
-from celery.result import AsyncResult
+from analysis.tasks import (analyze_player_background, simulate_chess_analysis,
+                            ingest_player_games_task, request_stats_refresh)
+from celery.result import AsyncResult, GroupResult
 from django.http import JsonResponse
 
 @api_view(['POST'])
@@ -387,11 +629,24 @@ def task_status(request, task_id):
                 'total': task_result.info.get('total', 1),
                 'status': task_result.info.get('status', '')
             }
+            for key in ('months_fetched', 'games_processed'):
+                if key in task_result.info:
+                    response[key] = task_result.info[key]
         elif task_result.state == 'SUCCESS':
             response = {
                 'state': task_result.state,
                 'result': task_result.info
             }
+            # جلب موزع على مهام فرعية: التقدم من نتيجة المجموعة
+            group_id = task_result.info.get('group_id') if isinstance(task_result.info, dict) else None
+            group_result = GroupResult.restore(group_id) if group_id else None
+            if group_result is not None:
+                response.update({
+                    'state': 'SUCCESS' if group_result.ready() else 'PROGRESS',
+                    'current': group_result.completed_count(),
+                    'total': len(group_result.results),
+                    'months_fetched': group_result.completed_count()
+                })
         else:  # FAILURE
             response = {
                 'state': task_result.state,
@@ -411,6 +666,7 @@ def create_mock_data(request):
     """إنشاء بيانات وهمية للاختبار باستخدام Celery"""
     username = request.data.get('username')
     game_count = request.data.get('game_count', 30)
+    seed = request.data.get('seed')
     
     if not username:
         return Response({
@@ -422,7 +678,7 @@ def create_mock_data(request):
         player = Player.objects.get(username=username)
         
         # تشغيل مهمة إنشاء البيانات الوهمية
-        task = simulate_chess_analysis.delay(player.id, game_count)
+        task = simulate_chess_analysis.delay(player.id, int(game_count), seed)
         
         return Response({
             'success': True,
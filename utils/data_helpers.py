@@ -1,44 +1,99 @@
 from players.models import Player, PlayerStats, OpeningStat
+from players.cache import invalidate_player
 from games.models import Game
-from django.db.models import Count, Q
+from django.db.models import Avg, Count, Q, Sum
+
+WON_Q = Q(player_color='white', result='1-0') | Q(player_color='black', result='0-1')
+DRAW_Q = Q(result='1/2-1/2')
+
+def get_player_game_aggregates(player):
+    """
+    جميع أرقام مباريات اللاعب في استعلام تجميعي واحد:
+    الإجمالي، الانتصارات/التعادلات/الهزائم حسب اللون، ومتوسط عدد النقلات
+    """
+    white_q = Q(player_color='white')
+    black_q = Q(player_color='black')
+    with_moves_q = Q(moves_count__gt=0)
+    
+    row = Game.objects.filter(player=player).aggregate(
+        total_games=Count('id'),
+        white_games=Count('id', filter=white_q),
+        white_wins=Count('id', filter=white_q & WON_Q),
+        white_draws=Count('id', filter=white_q & DRAW_Q),
+        black_games=Count('id', filter=black_q),
+        black_wins=Count('id', filter=black_q & WON_Q),
+        black_draws=Count('id', filter=black_q & DRAW_Q),
+        total_moves=Sum('moves_count', filter=with_moves_q),
+        games_with_moves=Count('id', filter=with_moves_q),
+        average_moves=Avg('moves_count', filter=with_moves_q)
+    )
+    
+    by_color = {}
+    for color in ('white', 'black'):
+        games = row[f'{color}_games']
+        wins = row[f'{color}_wins']
+        draws = row[f'{color}_draws']
+        by_color[color] = {
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'losses': games - wins - draws,
+            'win_rate': round((wins / games) * 100, 1) if games > 0 else 0
+        }
+    
+    wins = by_color['white']['wins'] + by_color['black']['wins']
+    draws = by_color['white']['draws'] + by_color['black']['draws']
+    
+    return {
+        'total_games': row['total_games'],
+        'wins': wins,
+        'draws': draws,
+        'losses': row['total_games'] - wins - draws,
+        'white': by_color['white'],
+        'black': by_color['black'],
+        'total_moves': row['total_moves'] or 0,
+        'games_with_moves': row['games_with_moves'],
+        'average_moves': round(row['average_moves'] or 0, 1)
+    }
 
 def update_player_stats(player):
-    """تحديث إحصاءات اللاعب بناءً على مبارياته"""
-    games = Game.objects.filter(player=player)
-    total_games = games.count()
+    """
+    تحديث أرقام PlayerStats باستعلام تجميعي واحد. لا يلمس الافتتاحات ولوحة الصدارة
+    والسجل واللقطة ولا last_analysis: إعادة البناء الكاملة تُجدول عبر request_stats_refresh
+    """
+    totals = get_player_game_aggregates(player)
+    total_games = totals['total_games']
     
     if total_games == 0:
         return None
     
-    # حساب النتائج
-    wins = games.filter(
-        Q(player_color='white', result='1-0') | 
-        Q(player_color='black', result='0-1')
-    ).count()
-    
-    draws = games.filter(result='1/2-1/2').count()
-    losses = total_games - wins - draws
-    
     # تحديث أو إنشاء الإحصاءات
-    stats, created = PlayerStats.objects.get_or_create(
+    stats, created = PlayerStats.objects.update_or_create(
         player=player,
         defaults={
             'total_games': total_games,
-            'wins': wins,
-            'losses': losses,
-            'draws': draws,
+            'wins': totals['wins'],
+            'losses': totals['losses'],
+            'draws': totals['draws'],
+            'total_moves': totals['total_moves'],
+            'games_with_moves': totals['games_with_moves'],
+            'average_game_length': (
+                totals['total_moves'] // totals['games_with_moves']
+                if totals['games_with_moves'] else 0
+            ),
         }
     )
-    
-    if not created:
-        stats.total_games = total_games
-        stats.wins = wins
-        stats.losses = losses
-        stats.draws = draws
-        stats.save()
+    invalidate_player(player.username)
     
     return stats
 
+def player_stats_are_stale(player, stats) -> bool:
+    """هل أُضيفت مباريات للاعب بعد آخر تحليل لإحصاءاته؟"""
+    games = Game.objects.filter(player=player)
+    if stats is None or stats.last_analysis is None:
+        return games.exists()
+    return games.filter(created_at__gt=stats.last_analysis).exists()
+
 def get_opening_recommendations(player):
     """توصيات الافتتاحات للاعب"""
     openings = OpeningStat.objects.filter(player=player)
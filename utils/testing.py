@@ -0,0 +1,29 @@
+import tempfile
+from typing import Optional
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from players.models import Player
+
+# ذاكرة محلية معزولة للاختبارات أياً كان REDIS_CACHE_URL في البيئة
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IsolatedStorageTestCase(TestCase):
+    """
+    قاعدة اختبارات تلمس الذاكرة المؤقتة أو لقطات المباريات: ذاكرة محلية فارغة
+    ومجلد GAME_SNAPSHOT_DIR مؤقت يُحذف بعد كل اختبار
+
+    player_username: إن حُدد يُنشأ self.player بهذا الاسم قبل setUp الفئة الفرعية
+    """
+
+    player_username: Optional[str] = None
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.enterContext(self.settings(GAME_SNAPSHOT_DIR=snapshot_dir.name))
+        if self.player_username:
+            self.player = Player.objects.create(username=self.player_username)